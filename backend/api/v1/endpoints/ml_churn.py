@@ -2,15 +2,20 @@
 Endpoint da API para Machine Learning - Previsão de Churn
 """
 from typing import Dict, List, Optional
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Query
 from sqlalchemy.orm import Session
+import asyncio
 import logging
+import time
 
 from database.connection import get_db
-from ml.churn_predictor import ChurnMLService
+from ml.risk_scoring import run_risk_scoring
+from ml.service import get_ml_service, get_training_runner
 from schemas.ml_churn import (
     ChurnPredictionRequest,
     ChurnPredictionResponse,
+    ChurnPredictionBatch,
+    ChurnPredictionBatchResponse,
     ChurnTrainingResponse,
     ChurnInsightsResponse,
     ModelTrainingRequest
@@ -19,31 +24,30 @@ from schemas.ml_churn import (
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-# Instância global do serviço ML
-ml_service = ChurnMLService()
-
 
 @router.post("/train", response_model=ChurnTrainingResponse, summary="Treinar modelos de ML")
 async def train_models(
     request: ModelTrainingRequest,
-    background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db)
+    ml_service=Depends(get_ml_service),
+    runner=Depends(get_training_runner)
 ):
     """
     Treina os modelos de Machine Learning para previsão de churn.
     
+    O treino roda em um processo separado; acompanhe por /train/jobs/{training_id}.
+    
     - **force_retrain**: Força retreinamento mesmo se modelos existirem
     - **validation_split**: Percentual de dados para validação (0.1-0.3)
     """
     try:
         if request.force_retrain or not ml_service.is_trained:
-            # Treinamento em background para não bloquear a API
-            background_tasks.add_task(ml_service.train_from_database, db)
+            job, created = await asyncio.to_thread(runner.start, request.validation_split)
             
             return ChurnTrainingResponse(
-                message="Treinamento iniciado em background",
+                message="Treinamento iniciado em background" if created else "Treinamento já em andamento",
                 status="training",
-                estimated_time="5-10 minutos"
+                estimated_time="5-10 minutos",
+                training_id=job['job_id']
             )
         else:
             return ChurnTrainingResponse(
@@ -58,21 +62,80 @@ async def train_models(
 
 
 @router.get("/train/status", summary="Status do treinamento")
-async def get_training_status():
+async def get_training_status(ml_service=Depends(get_ml_service), runner=Depends(get_training_runner)):
     """
-    Retorna o status atual do treinamento dos modelos.
+    Retorna o status atual do treinamento dos modelos e o último job de treino.
     """
+    latest = runner.latest()
+    last_success = latest if latest and latest['status'] == 'succeeded' else runner.latest('succeeded')
+    
+    if latest and latest['status'] in ('queued', 'running'):
+        status = "training"
+    else:
+        status = "trained" if ml_service.is_trained else "not_trained"
+    
     return {
         "is_trained": ml_service.is_trained,
-        "status": "trained" if ml_service.is_trained else "not_trained",
-        "last_training": "N/A"  # TODO: implementar timestamp do último treinamento
+        "status": status,
+        "last_training": last_success['finished_at'] if last_success else "N/A",
+        "model_version": ml_service.predictor.model_version,
+        "latest_job": latest
     }
 
 
+@router.get("/train/jobs", summary="Jobs de treinamento")
+async def list_training_jobs(
+    limit: int = Query(20, ge=1, le=100, description="Quantidade de jobs retornados"),
+    runner=Depends(get_training_runner)
+):
+    """
+    Lista os jobs de treinamento, do mais recente para o mais antigo.
+    """
+    return {"jobs": runner.list(limit)}
+
+
+@router.get("/train/jobs/{job_id}", summary="Progresso de um job de treinamento")
+async def get_training_job(job_id: str, runner=Depends(get_training_runner)):
+    """
+    Retorna status, etapa atual (extract, features, model:<nome>, ensemble,
+    explainers, save), progresso e, ao final, a versão publicada e as métricas.
+    """
+    job = runner.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job de treinamento {job_id} não encontrado")
+    return job
+
+
+@router.post("/train/jobs/{job_id}/cancel", summary="Cancelar job de treinamento")
+async def cancel_training_job(job_id: str, runner=Depends(get_training_runner)):
+    """
+    Solicita o cancelamento de um job; ele para na próxima etapa ou época do treino.
+    """
+    try:
+        job = runner.cancel(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Job de treinamento {job_id} não encontrado")
+        if not job.get('cancel_requested'):
+            raise HTTPException(status_code=409, detail=f"Job de treinamento {job_id} já encerrado ({job['status']})")
+        
+        return {
+            "message": "Cancelamento solicitado",
+            "job_id": job_id,
+            "status": job['status']
+        }
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Erro ao cancelar job de treinamento {job_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Erro ao cancelar treinamento: {str(e)}")
+
+
 @router.post("/predict", response_model=ChurnPredictionResponse, summary="Prever churn de cliente")
 async def predict_churn(
     request: ChurnPredictionRequest,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    ml_service=Depends(get_ml_service)
 ):
     """
     Faz previsão de churn para um cliente específico.
@@ -108,19 +171,91 @@ async def predict_churn(
         raise HTTPException(status_code=500, detail=f"Erro ao fazer previsão: {str(e)}")
 
 
+@router.post("/predict/batch", response_model=ChurnPredictionBatchResponse, summary="Prever churn em lote")
+async def predict_churn_batch(
+    request: ChurnPredictionBatch,
+    db: Session = Depends(get_db),
+    ml_service=Depends(get_ml_service)
+):
+    """
+    Faz previsão de churn para vários clientes de uma vez.
+    
+    - **cliente_ids**: IDs dos clientes para análise
+    - **include_features**: Inclui importância das features
+    - **include_recommendations**: Inclui recomendações
+    - **chunk_size**: Clientes processados por bloco (uma passada de cada modelo por bloco)
+    """
+    try:
+        if not ml_service.is_trained:
+            raise HTTPException(
+                status_code=400, 
+                detail="Modelos não treinados. Execute /train primeiro."
+            )
+        
+        def predict_batch():
+            # Carga do banco e passadas dos modelos fora do event loop
+            start_time = time.perf_counter()
+            result = ml_service.predict_clients_churn_batch(
+                request.cliente_ids,
+                db,
+                chunk_size=request.chunk_size,
+                include_features=request.include_features,
+                include_recommendations=request.include_recommendations
+            )
+            return result, time.perf_counter() - start_time
+        
+        result, processing_time = await asyncio.to_thread(predict_batch)
+        
+        if "error" in result:
+            raise HTTPException(status_code=400, detail=result["error"])
+        
+        predictions = [
+            ChurnPredictionResponse(
+                cliente_id=str(prediction["cliente_id"]),
+                risk_level=prediction["risk_level"],
+                risk_score=prediction["risk_score"],
+                predictions=prediction["predictions"],
+                features_importance=prediction["features_importance"],
+                recommendations=prediction["recommendations"]
+            )
+            for prediction in result["predictions"]
+        ]
+        
+        return ChurnPredictionBatchResponse(
+            total_processed=len(request.cliente_ids),
+            successful_predictions=len(predictions),
+            failed_predictions=len(result["failed"]),
+            predictions=predictions,
+            processing_time=processing_time
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Erro ao prever churn em lote: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Erro ao fazer previsão em lote: {str(e)}")
+
+
 @router.get("/insights", response_model=ChurnInsightsResponse, summary="Insights gerais de churn")
-async def get_churn_insights(db: Session = Depends(get_db)):
+async def get_churn_insights(
+    live: bool = False,
+    db: Session = Depends(get_db),
+    ml_service=Depends(get_ml_service)
+):
     """
     Retorna insights gerais sobre churn e risco dos clientes.
+    
+    - **live**: Preve o risco de todos os clientes ativos na hora, em vez de ler
+      os scores pré-calculados pelo job noturno
     """
     try:
-        if not ml_service.is_trained:
+        if live and not ml_service.is_trained:
             raise HTTPException(
                 status_code=400, 
                 detail="Modelos não treinados. Execute /train primeiro."
             )
         
-        insights = ml_service.get_churn_insights(db)
+        insights = ml_service.get_churn_insights(db, live=live)
         
         if "error" in insights:
             raise HTTPException(status_code=400, detail=insights["error"])
@@ -136,72 +271,47 @@ async def get_churn_insights(db: Session = Depends(get_db)):
 
 @router.get("/clients/risk-analysis", summary="Análise de risco de todos os clientes")
 async def analyze_all_clients_risk(
-    limit: int = 100,
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
     risk_threshold: float = 0.5,
-    db: Session = Depends(get_db)
+    risk_level: Optional[str] = None,
+    live: bool = False,
+    db: Session = Depends(get_db),
+    ml_service=Depends(get_ml_service)
 ):
     """
-    Analisa o risco de churn de todos os clientes ativos.
+    Analisa o risco de churn dos clientes ativos.
+    
+    Por padrão lê os scores pré-calculados pelo job noturno, ordenados por risco.
     
-    - **limit**: Número máximo de clientes a retornar
+    - **limit**: Tamanho da página (com live=true, número máximo de clientes analisados)
+    - **offset**: Deslocamento da página
     - **risk_threshold**: Threshold para considerar cliente de risco
+    - **risk_level**: Filtra por nível de risco (baixo, medio, alto, critico)
+    - **live**: Preve o risco na hora em vez de ler os scores pré-calculados
     """
     try:
+        if not live:
+            analysis = ml_service.get_stored_risk_analysis(
+                db, limit=limit, offset=offset,
+                risk_threshold=risk_threshold, risk_level=risk_level
+            )
+            if "error" in analysis:
+                raise HTTPException(
+                    status_code=404,
+                    detail=f"{analysis['error']}. Execute /scores/refresh ou use live=true."
+                )
+            return analysis
+        
         if not ml_service.is_trained:
             raise HTTPException(
                 status_code=400, 
                 detail="Modelos não treinados. Execute /train primeiro."
             )
         
-        from models.cliente import Cliente
-        
-        # Busca clientes ativos
-        clientes_ativos = db.query(Cliente).filter(
-            Cliente.status_cliente == "ativo"
-        ).limit(limit).all()
-        
-        risk_analysis = []
-        
-        for cliente in clientes_ativos:
-            try:
-                prediction = ml_service.predict_client_churn(cliente.id, db)
-                
-                if "error" not in prediction:
-                    risk_analysis.append({
-                        "cliente_id": cliente.id,
-                        "nome": cliente.nome_principal,
-                        "risk_level": prediction["risk_level"],
-                        "risk_score": prediction["risk_score"],
-                        "health_score": prediction.get("features", {}).get("health_score_atual", 0),
-                        "dias_vencimento": prediction.get("features", {}).get("dias_vencimento_proximo", 999),
-                        "csat_medio": prediction.get("features", {}).get("csat_medio", 0),
-                        "recommendations": prediction.get("recommendations", [])
-                    })
-            except Exception as e:
-                logger.warning(f"Erro ao analisar cliente {cliente.id}: {str(e)}")
-                continue
-        
-        # Filtra por threshold de risco
-        high_risk_clients = [
-            c for c in risk_analysis 
-            if c["risk_score"] >= risk_threshold
-        ]
-        
-        # Ordena por risco (maior primeiro)
-        high_risk_clients.sort(key=lambda x: x["risk_score"], reverse=True)
-        
-        return {
-            "total_analyzed": len(risk_analysis),
-            "high_risk_count": len(high_risk_clients),
-            "risk_threshold": risk_threshold,
-            "high_risk_clients": high_risk_clients[:50],  # Top 50
-            "risk_distribution": {
-                "baixo": len([c for c in risk_analysis if c["risk_level"] == "baixo"]),
-                "medio": len([c for c in risk_analysis if c["risk_level"] == "medio"]),
-                "alto": len([c for c in risk_analysis if c["risk_level"] == "alto"]),
-                "critico": len([c for c in risk_analysis if c["risk_level"] == "critico"])
-            }
-        }
+        return ml_service.analyze_clients_risk(
+            db, limit=limit, risk_threshold=risk_threshold
+        )
         
     except HTTPException:
         raise
@@ -210,8 +320,29 @@ async def analyze_all_clients_risk(
         raise HTTPException(status_code=500, detail=f"Erro na análise: {str(e)}")
 
 
+@router.post("/scores/refresh", summary="Recalcular scores de risco")
+async def refresh_risk_scores(background_tasks: BackgroundTasks, ml_service=Depends(get_ml_service)):
+    """
+    Recalcula em background os scores de risco de todos os clientes ativos
+    (o mesmo job executado diariamente pelo agendador).
+    """
+    if not ml_service.is_trained:
+        raise HTTPException(
+            status_code=400, 
+            detail="Modelos não treinados. Execute /train primeiro."
+        )
+    
+    background_tasks.add_task(run_risk_scoring, ml_service)
+    
+    return {
+        "message": "Scoring de risco iniciado em background",
+        "status": "scoring",
+        "model_version": ml_service.predictor.model_version
+    }
+
+
 @router.get("/models/info", summary="Informações sobre os modelos")
-async def get_models_info():
+async def get_models_info(ml_service=Depends(get_ml_service)):
     """
     Retorna informações sobre os modelos de ML treinados.
     """
@@ -231,6 +362,13 @@ async def get_models_info():
                     "feature_importance_available": True,
                     "n_features": len(model.coef_[0]) if hasattr(model, 'n_features_in_') else "N/A"
                 }
+            elif hasattr(model, 'n_trees'):
+                models_info[name] = {
+                    "type": "tree_based",
+                    "feature_importance_available": False,
+                    "n_trees": model.n_trees,
+                    "n_features": model.n_features_in_
+                }
             elif name == 'neural_network':
                 models_info[name] = {
                     "type": "neural_network",
@@ -258,23 +396,19 @@ async def get_models_info():
 
 
 @router.post("/models/retrain", summary="Forçar retreinamento dos modelos")
-async def force_retrain_models(
-    background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db)
-):
+async def force_retrain_models(runner=Depends(get_training_runner)):
     """
     Força o retreinamento completo dos modelos de ML.
+    
+    A versão atual continua servindo previsões até a nova ser publicada.
     """
     try:
-        # Remove modelos existentes
-        ml_service.is_trained = False
-        
-        # Inicia treinamento em background
-        background_tasks.add_task(ml_service.train_from_database, db)
+        job, created = await asyncio.to_thread(runner.start)
         
         return {
-            "message": "Retreinamento forçado iniciado",
+            "message": "Retreinamento forçado iniciado" if created else "Treinamento já em andamento",
             "status": "retraining",
+            "training_id": job['job_id'],
             "estimated_time": "5-10 minutos"
         }
         
@@ -283,8 +417,44 @@ async def force_retrain_models(
         raise HTTPException(status_code=500, detail=f"Erro ao retreinar: {str(e)}")
 
 
+@router.get("/models/versions", summary="Versões publicadas dos modelos")
+async def list_model_versions(ml_service=Depends(get_ml_service)):
+    """
+    Lista as versões no registro de modelos, a promovida e a servida por este worker.
+    """
+    try:
+        return ml_service.list_model_versions()
+    
+    except Exception as e:
+        logger.error(f"Erro ao listar versões dos modelos: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Erro ao listar versões: {str(e)}")
+
+
+@router.post("/models/versions/{version}/promote", summary="Promover versão dos modelos")
+async def promote_model_version(version: str, ml_service=Depends(get_ml_service)):
+    """
+    Promove uma versão publicada (ex: rollback) e passa a servi-la neste worker.
+    Os demais workers a carregam na próxima verificação do registro.
+    """
+    try:
+        await asyncio.to_thread(ml_service.promote_version, version)
+        
+        return {
+            "message": f"Versão {version} promovida",
+            "model_version": ml_service.predictor.model_version
+        }
+    
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Versão {version} não encontrada")
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        logger.error(f"Erro ao promover versão {version}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Erro ao promover versão: {str(e)}")
+
+
 @router.get("/health", summary="Health check do sistema ML")
-async def ml_health_check():
+async def ml_health_check(ml_service=Depends(get_ml_service)):
     """
     Verifica a saúde do sistema de Machine Learning.
     """
@@ -315,7 +485,7 @@ async def ml_health_check():
 
 
 @router.get("/cache/stats", summary="Estatísticas do cache")
-async def get_cache_stats():
+async def get_cache_stats(ml_service=Depends(get_ml_service)):
     """
     Retorna estatísticas do sistema de cache de ML.
     """
@@ -353,7 +523,7 @@ async def clear_all_cache():
 
 
 @router.delete("/cache/client/{cliente_id}", summary="Limpar cache de cliente")
-async def clear_client_cache(cliente_id: str):
+async def clear_client_cache(cliente_id: str, ml_service=Depends(get_ml_service)):
     """
     Limpa cache relacionado a um cliente específico.
     """
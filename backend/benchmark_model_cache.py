@@ -0,0 +1,108 @@
+"""
+Micro-benchmark da serialização e do hash das entradas do ModelCache
+
+Compara o formato anterior (pickle de um dicionário com timestamp ISO e hash
+MD5 sobre json.dumps das features) com o codec atual (vetor float32 +
+cabeçalho, msgpack para previsões e hash não criptográfico sobre os bytes).
+
+Uso:
+    python benchmark_model_cache.py [repetições]
+"""
+import sys
+import os
+import json
+import pickle
+import hashlib
+import timeit
+from datetime import datetime
+
+import numpy as np
+
+# Adiciona o diretório backend ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from ml.cache_codec import (
+    FeatureVector, decode_entry, encode_entry, hash_vector, schema_id, to_vector
+)
+
+
+def _feature_names():
+    """Nomes reais das features do modelo (com fallback sintético)"""
+    try:
+        from ml.churn_predictor import ChurnFeatureEngineer
+        return ChurnFeatureEngineer().get_feature_names()
+    except Exception:
+        return [f"feature_{i}" for i in range(40)]
+
+
+def _legacy_encode(data, tags):
+    return pickle.dumps({
+        'data': data,
+        'timestamp': datetime.now().isoformat(),
+        'type': type(data).__name__,
+        'tags': tags
+    })
+
+
+def _legacy_decode(raw):
+    return pickle.loads(raw)['data']
+
+
+def _legacy_hash(features):
+    sorted_features = dict(sorted(features.items()))
+    features_str = json.dumps(sorted_features, sort_keys=True, default=float)
+    return hashlib.md5(features_str.encode()).hexdigest()
+
+
+def _time_us(func, number):
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+
+
+def run_benchmark(number: int = 20000):
+    rng = np.random.default_rng(0)
+    feature_names = _feature_names()
+    features = {name: float(value) for name, value in zip(feature_names, rng.random(len(feature_names)) * 100)}
+    tags = ["client:123e4567-e89b-12d3-a456-426614174000"]
+
+    predictions = {name: float(value) for name, value in zip(
+        ['random_forest', 'xgboost', 'lightgbm', 'neural_network'], rng.random(4)
+    )}
+    predictions['ensemble'] = np.mean(list(predictions.values()))
+    prediction = {
+        'predictions': predictions,
+        'risk_level': 'alto',
+        'risk_score': predictions['ensemble'],
+        'features_importance': dict(list(features.items())[:5]),
+        'recommendations': ['Agendar reunião de alinhamento', 'Revisar SLA de atendimento']
+    }
+
+    vector = FeatureVector(schema_id(feature_names), to_vector(features, feature_names))
+
+    cases = [
+        ("features", features, vector),
+        ("previsão", prediction, prediction),
+    ]
+
+    print(f"{len(feature_names)} features, {number} repetições\n")
+    print(f"{'entrada':<10} {'formato':<8} {'bytes':>7} {'encode µs':>10} {'decode µs':>10}")
+    for label, legacy_data, data in cases:
+        legacy_raw = _legacy_encode(legacy_data, tags)
+        raw = encode_entry(data, tags)
+        rows = [
+            ("pickle", legacy_raw,
+             lambda: _legacy_encode(legacy_data, tags), lambda: _legacy_decode(legacy_raw)),
+            ("codec", raw,
+             lambda: encode_entry(data, tags), lambda: decode_entry(raw)),
+        ]
+        for name, sample, encode, decode in rows:
+            print(f"{label:<10} {name:<8} {len(sample):>7} "
+                  f"{_time_us(encode, number):>10.2f} {_time_us(decode, number):>10.2f}")
+
+    print(f"\n{'hash':<28} {'µs':>8}")
+    print(f"{'json + md5':<28} {_time_us(lambda: _legacy_hash(features), number):>8.2f}")
+    print(f"{'vetor float32 + hash rápido':<28} "
+          f"{_time_us(lambda: hash_vector(to_vector(features, feature_names)), number):>8.2f}")
+
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -0,0 +1,80 @@
+"""
+Benchmark do cold start da API (import de main:app)
+
+Executa `python -X importtime -c "import main"` em processos novos e mostra o
+tempo total de importação, os módulos mais caros (tempo acumulado) e quais
+dependências pesadas de ML foram carregadas no startup - o esperado é que
+nenhuma seja, pois o serviço de ML é criado sob demanda (ml.service).
+
+Uso:
+    python benchmark_startup.py [execuções] [módulos listados]
+"""
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Dependências que não devem ser importadas para subir a API
+HEAVY_MODULES = [
+    'tensorflow', 'keras', 'torch', 'shap', 'optuna', 'xgboost', 'lightgbm',
+    'imblearn', 'firebase_admin', 'sklearn', 'ml.churn_predictor'
+]
+
+_IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def _run_importtime():
+    """Importa main em um processo novo; retorna (segundos, linhas do importtime)"""
+    env = dict(os.environ, LOG_FILE="")
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True
+    )
+    elapsed = time.perf_counter() - start
+
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+
+    modules = []
+    for line in proc.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+    return elapsed, modules
+
+
+def run_benchmark(runs: int = 5, top: int = 15):
+    timings = []
+    modules = []
+    for _ in range(runs):
+        elapsed, modules = _run_importtime()
+        timings.append(elapsed)
+
+    imported = {name for name, _, _, _ in modules}
+    import_total = sum(self_us for _, self_us, _, _ in modules) / 1e6
+
+    print(f"Cold start de main:app ({runs} execuções)")
+    print(f"  processo (mediana): {statistics.median(timings):.2f}s "
+          f"(mín {min(timings):.2f}s, máx {max(timings):.2f}s)")
+    print(f"  imports (última execução): {import_total:.2f}s em {len(modules)} módulos\n")
+
+    print(f"{'módulo':<50} {'acumulado ms':>13}")
+    top_level = [m for m in modules if m[3] == 0]
+    for name, _, cumulative_us, _ in sorted(top_level, key=lambda m: m[2], reverse=True)[:top]:
+        print(f"{name:<50} {cumulative_us / 1000:>13.1f}")
+
+    loaded = [name for name in HEAVY_MODULES if name in imported]
+    print("\nDependências pesadas carregadas no startup: " + (", ".join(loaded) if loaded else "nenhuma"))
+    return loaded
+
+
+if __name__ == "__main__":
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    top = int(sys.argv[2]) if len(sys.argv) > 2 else 15
+    sys.exit(1 if run_benchmark(runs, top) else 0)
@@ -0,0 +1,131 @@
+"""
+Relatório de memória por worker com os modelos de churn carregados
+
+Treina Random Forest, XGBoost e LightGBM (mesmos hiperparâmetros de
+ChurnPredictor) sobre dados sintéticos, publica a versão em um registro
+temporário e sobe N processos que carregam os modelos ao mesmo tempo, como os
+workers do uvicorn. Para cada backend de árvores (ML_TREE_INFERENCE_BACKEND)
+mostra, por worker:
+
+    RSS      memória residente (conta páginas compartilhadas em todos)
+    PSS      páginas compartilhadas divididas entre os processos que as usam
+    Privado  páginas exclusivas do worker
+    Modelos  RSS após carregar os modelos e montar os explicadores SHAP,
+             descontado o RSS após os imports
+
+Uso (Linux, lê /proc/<pid>/smaps_rollup):
+    python benchmark_worker_memory.py [workers] [amostras de treino]
+"""
+import sys
+import os
+import json
+import subprocess
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Adiciona o diretório backend ao path
+sys.path.append(BACKEND_DIR)
+
+_WORKER = r"""
+import json, sys, numpy as np
+
+def memory():
+    values = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ('Rss:', 'Pss:', 'Private_Clean:', 'Private_Dirty:'):
+                values[parts[0][:-1]] = int(parts[1]) / 1024
+    return values
+
+import ml.churn_predictor as churn_predictor
+churn_predictor.ML_TREE_INFERENCE_BACKEND = sys.argv[2]
+before = memory()
+
+predictor = churn_predictor.ChurnPredictor(sys.argv[1])
+X = np.random.RandomState(0).randn(200, len(predictor.feature_names)).astype(np.float32)
+predictor.predict_churn_matrix(list(range(len(X))), X, include_recommendations=False)
+after = memory()
+
+print(json.dumps({'before': before, 'after': after}), flush=True)
+sys.stdin.read()  # mantém o worker vivo até todos medirem
+"""
+
+
+def _publish_models(path: Path, n_samples: int):
+    """Treina os modelos de árvore e publica uma versão no registro em `path`"""
+    import xgboost as xgb
+    import lightgbm as lgb
+    from sklearn.ensemble import RandomForestClassifier
+    from ml.churn_predictor import ChurnPredictor
+
+    path.mkdir()
+    predictor = ChurnPredictor(str(path))  # diretório vazio: nada a carregar
+    n_features = len(predictor.feature_names)
+
+    rs = np.random.RandomState(42)
+    X = rs.randn(n_samples, n_features)
+    y = (X[:, 0] + X[:, 1] * X[:, 2] + rs.randn(n_samples) > 0.5).astype(int)
+    X = predictor.scaler.fit_transform(X)
+
+    predictor.models = {
+        'random_forest': RandomForestClassifier(
+            n_estimators=100, max_depth=10, random_state=42, class_weight='balanced'
+        ).fit(X, y),
+        'xgboost': xgb.XGBClassifier(
+            n_estimators=100, max_depth=6, learning_rate=0.1, random_state=42
+        ).fit(X, y),
+        'lightgbm': lgb.LGBMClassifier(
+            n_estimators=100, max_depth=6, learning_rate=0.1, random_state=42,
+            class_weight='balanced', verbose=-1
+        ).fit(X, y)
+    }
+    predictor.model_version = predictor._compute_model_version()
+    return predictor.save_models(str(path))
+
+
+def _run_workers(path: Path, backend: str, n_workers: int):
+    workers = [
+        subprocess.Popen(
+            [sys.executable, "-c", _WORKER, str(path), backend],
+            cwd=BACKEND_DIR, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL, text=True
+        )
+        for _ in range(n_workers)
+    ]
+    try:
+        # Lê depois que todos carregaram: o PSS reflete o compartilhamento real
+        results = [json.loads(worker.stdout.readline()) for worker in workers]
+    finally:
+        for worker in workers:
+            worker.stdin.close()
+            worker.wait()
+    return results
+
+
+def run_benchmark(n_workers: int = 4, n_samples: int = 20000):
+    with tempfile.TemporaryDirectory() as tmp:
+        version_path = _publish_models(Path(tmp) / "churn", n_samples)
+        size = sum(f.stat().st_size for f in version_path.rglob('*') if f.is_file()) / 2**20
+        print(f"Versão publicada: {version_path.name} ({size:.1f} MB de artefatos)")
+        print(f"{n_workers} workers carregando os modelos ao mesmo tempo\n")
+
+        print(f"{'backend':<8} {'RSS':>9} {'PSS':>9} {'Privado':>9} {'Modelos':>9} {'PSS total':>10}   (MB)")
+        for backend in ('pickle', 'numpy'):
+            results = _run_workers(Path(tmp) / "churn", backend, n_workers)
+            rss = np.mean([r['after']['Rss'] for r in results])
+            pss = np.mean([r['after']['Pss'] for r in results])
+            private = np.mean([r['after']['Private_Clean'] + r['after']['Private_Dirty'] for r in results])
+            models = np.mean([r['after']['Rss'] - r['before']['Rss'] for r in results])
+            total = sum(r['after']['Pss'] for r in results)
+            print(f"{backend:<8} {rss:>9.1f} {pss:>9.1f} {private:>9.1f} {models:>9.1f} {total:>10.1f}")
+
+
+if __name__ == "__main__":
+    n_workers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    n_samples = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    run_benchmark(n_workers, n_samples)
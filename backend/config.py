@@ -107,11 +107,50 @@ MAX_PAGE_SIZE = 100
 # Configurações de cache
 CACHE_TTL = 300  # 5 minutos
 CACHE_MAX_SIZE = 1000
+CACHE_MAX_BYTES = 64 * 1024 * 1024  # 64 MB por processo
+CACHE_STALE_TTL = 300  # entrada vencida ainda servida enquanto é recalculada
+CACHE_LOCK_TIMEOUT = 10  # segundos; lock de recálculo (single-flight) no Redis
 
 # Configurações de ML
 ML_MODEL_PATH = "models/churn"
 ML_TRAINING_BATCH_SIZE = 1000
 ML_PREDICTION_TIMEOUT = 30
+ML_NN_INFERENCE_BACKEND = "numpy"  # "numpy" (pesos .npz) ou "keras" (SavedModel)
+ML_TREE_INFERENCE_BACKEND = "numpy"  # "numpy" (arrays .npy em mmap, compartilhados entre workers) ou "pickle"
+ML_WARMUP_ON_STARTUP = True  # carrega o serviço de ML em background no startup
+ML_MODEL_KEEP_VERSIONS = 5  # versões anteriores mantidas no registro (rollback)
+ML_MODEL_REFRESH_SECONDS = 60  # intervalo para buscar versão promovida por outro worker
+ML_TRAINING_JOBS_DIR = "models/churn/jobs"  # estado dos jobs de treino (JSON por job)
+ML_TRAINING_NICE = 10  # prioridade menor para o processo de treino que para os workers da API
+ML_TRAINING_CANCEL_GRACE_SECONDS = 30  # após o cancelamento, encerra o processo à força
+ML_TRAINING_PARALLEL = True  # treina os modelos base ao mesmo tempo, um processo por modelo
+ML_TRAINING_N_JOBS = 0  # núcleos divididos entre os modelos no treino (0 = todos)
+ML_TEMPORAL_CV_N_JOBS = 0  # processos da validação temporal, um par (modelo, fold) por vez em cada (0 = todos, 1 = sequencial)
+ML_TRAINING_TIME_BUDGET_SECONDS = 1800  # prazo de um treino; ao fim, cada modelo para na próxima iteração (0 = sem prazo)
+ML_BOOSTING_MAX_ROUNDS = 500  # teto de árvores do XGBoost/LightGBM; o early stopping decide quantas usar
+ML_EARLY_STOPPING_ROUNDS = 20  # rodadas sem melhora da AUC de validação antes de parar os boosters
+ML_NN_EARLY_STOPPING_PATIENCE = 10  # épocas sem melhora de val_auc antes de parar a rede neural
+ML_EARLY_STOPPING_HOLDOUT = 0.1  # fração separada no treino final para o early stopping
+ML_TRAINING_CACHE_DIR = "models/churn/training_cache"  # matrizes de treino (.npy em mmap) por snapshot dos dados
+ML_TRAINING_CACHE_KEEP = 3  # snapshots mantidos no cache de matrizes de treino
+ML_ENSEMBLE_WEIGHTING = "auc"  # pesos do ensemble: "uniform", "auc" ou "stacking" (ver ml/ensemble.py)
+ML_HPO_STORAGE = "models/churn/hpo_studies.db"  # estudos de hiperparâmetros (SQLite), retomados ao repetir a busca
+ML_HPO_SAMPLER = "tpe"  # "tpe" ou "random" para espaços com intervalos; grades só de listas usam "grid"
+ML_HPO_PRUNER = "median"  # poda trials após cada fold: "median", "asha" ou "none"
+ML_VALIDATION_STORE_DIR = "models/churn/validation_runs"  # previsões dos folds da validação temporal (.npz por fold)
+ML_VALIDATION_RUNS_KEEP = 5  # execuções de validação concluídas mantidas em disco
+ML_VALIDATION_RUN_GRACE_SECONDS = 86400  # execução não concluída sem escrita por esse tempo é removida
+ML_RESAMPLING_STRATEGY = "smote"  # balanceamento do treino: "smote", "undersample", "class_weight" ou "none"
+ML_RESAMPLING_CACHE_DIR = "models/churn/resampling_cache"  # matrizes balanceadas (.npy em mmap) por fold e estratégia
+ML_RESAMPLING_CACHE_KEEP = 20  # matrizes balanceadas mantidas no cache
+
+# Configurações do scoring noturno de risco de churn
+ML_RISK_SCORING_ENABLED = True
+ML_RISK_SCORING_HOUR = 3  # 3 AM diariamente
+ML_RISK_SCORING_CHUNK_SIZE = 1000
+ML_RISK_SCORING_TOP_FEATURES = 5
+ML_RESCORE_ON_CHANGE = False  # re-pontua clientes após commits que alteram suas features
+ML_RESCORE_DEBOUNCE_SECONDS = 5
 
 # Configurações de notificação
 NOTIFICATION_EMAIL_TEMPLATE = "emails/notification.html"
@@ -7,9 +7,12 @@ from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
 import time
+import asyncio
 import logging
 
-from config import settings, CORS_CONFIG
+from config import (
+    settings, CORS_CONFIG, ML_RISK_SCORING_ENABLED, ML_RESCORE_ON_CHANGE, ML_WARMUP_ON_STARTUP
+)
 from database.connection import init_db, close_db
 from api.v1.api import api_router
 
@@ -33,12 +36,42 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info("Iniciando aplicação HubControl...")
     await init_db()
+    
+    # Serviço de ML (modelos e dependências pesadas) carregado em background;
+    # requisições de ML que chegarem antes aguardam a inicialização
+    warmup_task = None
+    if ML_WARMUP_ON_STARTUP:
+        from ml.service import warm_up_ml_service
+        warmup_task = asyncio.create_task(warm_up_ml_service())
+    
+    # Agenda o scoring noturno de risco de churn
+    scoring_task = None
+    if ML_RISK_SCORING_ENABLED:
+        from ml.risk_scoring import risk_scoring_scheduler
+        scoring_task = asyncio.create_task(risk_scoring_scheduler())
+    
+    # Invalida o cache de churn dos clientes alterados em cada commit
+    from ml.cache_invalidation import ChurnCacheInvalidator
+    rescore_queue = None
+    if ML_RESCORE_ON_CHANGE:
+        from ml.risk_scoring import RescoreQueue
+        rescore_queue = RescoreQueue()
+    cache_invalidator = ChurnCacheInvalidator(
+        on_invalidate=rescore_queue.enqueue if rescore_queue else None
+    )
+    cache_invalidator.register()
+    
     logger.info("Aplicação HubControl iniciada com sucesso!")
     
     yield
     
     # Shutdown
     logger.info("Encerrando aplicação HubControl...")
+    if warmup_task:
+        warmup_task.cancel()
+    if scoring_task:
+        scoring_task.cancel()
+    cache_invalidator.unregister()
     await close_db()
     logger.info("Aplicação HubControl encerrada!")
 
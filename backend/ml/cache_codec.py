@@ -0,0 +1,131 @@
+"""
+Codec binário das entradas do ModelCache
+
+Formato de uma entrada (Redis e tamanho contabilizado no tier em memória):
+
+    b"MC" + versão (1 byte) + msgpack([tags, dados(, válido até)])
+
+O terceiro elemento opcional é o instante (epoch) até o qual a entrada é
+considerada fresca; depois dele ela ainda pode ser servida enquanto é
+recalculada em background (stale-while-revalidate).
+
+Vetores de features são gravados como extensão msgpack com um cabeçalho
+fixo (id do schema de features + número de features) seguido do buffer
+float32 na ordem de `feature_names`. Previsões e métricas usam msgpack puro
+(tipos numpy são convertidos para tipos nativos). Entradas antigas em pickle
+continuam legíveis até expirarem.
+"""
+import struct
+import pickle
+import hashlib
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import msgpack
+import numpy as np
+
+try:
+    import xxhash
+except ImportError:  # pragma: no cover - xxhash é opcional
+    xxhash = None
+
+ENTRY_MAGIC = b"MC"
+ENTRY_VERSION = 1
+
+# Código da extensão msgpack para vetores de features
+FEATURE_VECTOR_EXT = 1
+
+# Cabeçalho do vetor: id do schema (8 bytes) + número de features (uint16)
+_VECTOR_HEADER = struct.Struct("<8sH")
+
+
+class FeatureVector:
+    """Vetor de features float32 na ordem de um schema (lista de nomes)"""
+    
+    __slots__ = ('schema', 'values')
+    
+    def __init__(self, schema: bytes, values: np.ndarray):
+        self.schema = schema
+        self.values = values
+
+
+def fast_hash(data: bytes) -> str:
+    """Hash não criptográfico de 64 bits (xxh3 se disponível, senão blake2b)"""
+    if xxhash is not None:
+        return xxhash.xxh3_64_hexdigest(data)
+    return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+
+@lru_cache(maxsize=32)
+def _schema_id(feature_names: Tuple[str, ...]) -> bytes:
+    return hashlib.blake2b("\x00".join(feature_names).encode(), digest_size=8).digest()
+
+
+def schema_id(feature_names: Sequence[str]) -> bytes:
+    """Identificador de 8 bytes da lista ordenada de nomes de features"""
+    return _schema_id(tuple(feature_names))
+
+
+def to_vector(features: Dict[str, float], feature_names: Sequence[str]) -> np.ndarray:
+    """Vetor float32 das features na ordem de `feature_names` (ausentes = 0)"""
+    return np.fromiter(
+        (features.get(name, 0) for name in feature_names),
+        dtype=np.float32,
+        count=len(feature_names)
+    )
+
+
+def hash_vector(vector: np.ndarray) -> str:
+    """Hash direto sobre os bytes do vetor float32"""
+    return fast_hash(np.ascontiguousarray(vector, dtype=np.float32).tobytes())
+
+
+def encode_feature_vector(vector: FeatureVector) -> bytes:
+    """Cabeçalho + buffer float32 little-endian"""
+    values = np.ascontiguousarray(vector.values, dtype="<f4")
+    return _VECTOR_HEADER.pack(vector.schema, len(values)) + values.tobytes()
+
+
+def decode_feature_vector(raw: bytes) -> FeatureVector:
+    """Inverso de encode_feature_vector (o buffer retornado é somente leitura)"""
+    schema, size = _VECTOR_HEADER.unpack_from(raw)
+    values = np.frombuffer(raw, dtype="<f4", count=size, offset=_VECTOR_HEADER.size)
+    return FeatureVector(schema, values)
+
+
+def _default(obj: Any) -> Any:
+    """Converte tipos não suportados pelo msgpack"""
+    if isinstance(obj, FeatureVector):
+        return msgpack.ExtType(FEATURE_VECTOR_EXT, encode_feature_vector(obj))
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Tipo não serializável no cache: {type(obj).__name__}")
+
+
+def _ext_hook(code: int, data: bytes) -> Any:
+    if code == FEATURE_VECTOR_EXT:
+        return decode_feature_vector(data)
+    return msgpack.ExtType(code, data)
+
+
+def encode_entry(data: Any, tags: Optional[List[str]] = None,
+                 fresh_until: Optional[float] = None) -> bytes:
+    """Serializa uma entrada do cache (dados, tags e validade opcional)"""
+    entry = [tags or [], data]
+    if fresh_until is not None:
+        entry.append(fresh_until)
+    body = msgpack.packb(entry, default=_default, use_bin_type=True)
+    return ENTRY_MAGIC + bytes((ENTRY_VERSION,)) + body
+
+
+def decode_entry(raw: bytes) -> Dict[str, Any]:
+    """Desserializa uma entrada do cache em {'data', 'tags', 'fresh_until'}"""
+    if raw[:2] == ENTRY_MAGIC and raw[2] == ENTRY_VERSION:
+        tags, data, *fresh_until = msgpack.unpackb(raw[3:], ext_hook=_ext_hook, raw=False)
+        return {'data': data, 'tags': tags, 'fresh_until': fresh_until[0] if fresh_until else None}
+
+    # Formato anterior (pickle) ainda presente no Redis até expirar
+    cache_entry = pickle.loads(raw)
+    return {'data': cache_entry['data'], 'tags': cache_entry.get('tags', []), 'fresh_until': None}
@@ -0,0 +1,115 @@
+"""
+Invalidação do cache de churn a partir dos commits do SQLAlchemy
+
+Durante a transação, os flushes de Cliente, Contrato, HealthScoreSnapshot,
+CSATResposta e EventoCS registram os clientes afetados em `session.info`.
+Após o commit, as entradas de features e previsões desses clientes (tag
+`client:{id}`) são removidas em uma única operação e, opcionalmente, os
+clientes são enviados para re-scoring em background. Em rollback da
+transação principal, a lista é descartada.
+
+Operações em massa (query.update/delete, bulk_*) não passam pelo flush e não
+são detectadas; nesses casos use `/ml/churn/cache/client/{id}`.
+"""
+import logging
+from itertools import chain
+from typing import Any, Callable, Dict, Optional, Set
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from .model_cache import model_cache
+
+logger = logging.getLogger(__name__)
+
+# Chave em session.info com os clientes alterados na transação
+SESSION_INFO_KEY = "churn_cache_clientes"
+
+
+def _feature_sources() -> Dict[type, str]:
+    """Modelos que alimentam as features de churn e a coluna com o cliente"""
+    from models.cliente import Cliente
+    from models.contrato import Contrato
+    from models.health_score_snapshot import HealthScoreSnapshot
+    from models.csat_resposta import CSATResposta
+    from models.evento_cs import EventoCS
+    
+    return {
+        Cliente: 'id',
+        Contrato: 'cliente_id',
+        HealthScoreSnapshot: 'id_cliente',
+        CSATResposta: 'id_cliente',
+        EventoCS: 'cliente_id'
+    }
+
+
+class ChurnCacheInvalidator:
+    """
+    Hooks de sessão que invalidam o cache dos clientes alterados após o commit
+    
+    Uso:
+        invalidator = ChurnCacheInvalidator(on_invalidate=rescore_queue.enqueue)
+        invalidator.register()          # todas as sessões
+        invalidator.register(session)   # ou uma sessão / sessionmaker específico
+    """
+    
+    def __init__(self, cache=None, on_invalidate: Optional[Callable[[Set[Any]], None]] = None):
+        """
+        Args:
+            cache: ModelCache a invalidar (padrão: instância global)
+            on_invalidate: Chamado com os IDs invalidados após cada commit
+                (ex: enfileirar re-scoring)
+        """
+        self.cache = cache or model_cache
+        self.on_invalidate = on_invalidate
+        self._sources: Optional[Dict[type, str]] = None
+    
+    def register(self, target: Any = Session):
+        """Instala os hooks no alvo (classe Session, sessionmaker ou sessão)"""
+        event.listen(target, "after_flush", self._after_flush)
+        event.listen(target, "after_commit", self._after_commit)
+        event.listen(target, "after_soft_rollback", self._after_soft_rollback)
+    
+    def unregister(self, target: Any = Session):
+        """Remove os hooks instalados por register"""
+        event.remove(target, "after_flush", self._after_flush)
+        event.remove(target, "after_commit", self._after_commit)
+        event.remove(target, "after_soft_rollback", self._after_soft_rollback)
+    
+    def _after_flush(self, session: Session, flush_context):
+        """Coleta os clientes das linhas inseridas, alteradas ou removidas"""
+        if self._sources is None:
+            self._sources = _feature_sources()
+        
+        cliente_ids = None
+        for instance in chain(session.new, session.dirty, session.deleted):
+            attr = self._sources.get(type(instance))
+            if attr is None:
+                continue
+            
+            # Histórico inclui o valor anterior se a linha mudou de cliente
+            history = inspect(instance).attrs[attr].history
+            if cliente_ids is None:
+                cliente_ids = session.info.setdefault(SESSION_INFO_KEY, set())
+            cliente_ids.update(
+                value for value in chain(history.unchanged, history.added, history.deleted)
+                if value is not None
+            )
+    
+    def _after_commit(self, session: Session):
+        """Invalida em lote os clientes coletados na transação"""
+        cliente_ids = session.info.pop(SESSION_INFO_KEY, None)
+        if not cliente_ids:
+            return
+        
+        try:
+            self.cache.invalidate_clients_cache(list(cliente_ids))
+            if self.on_invalidate:
+                self.on_invalidate(cliente_ids)
+        except Exception as e:
+            logger.error(f"Erro ao invalidar cache após commit: {e}")
+    
+    def _after_soft_rollback(self, session: Session, previous_transaction):
+        """Descarta os clientes coletados se a transação principal foi desfeita"""
+        if previous_transaction.parent is None:
+            session.info.pop(SESSION_INFO_KEY, None)
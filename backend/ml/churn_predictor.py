@@ -3,10 +3,14 @@ Sistema de Machine Learning para Previsão de Churn
 """
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Tuple, Optional
+from typing import Any, Callable, Dict, List, Tuple, Optional
 from datetime import datetime, timedelta
 import joblib
 import pickle
+import json
+import hashlib
+import threading
+import time
 from pathlib import Path
 
 # Machine Learning
@@ -17,28 +21,8 @@ from sklearn.preprocessing import StandardScaler, LabelEncoder
 from sklearn.metrics import classification_report, confusion_matrix, roc_auc_score, roc_curve
 from sklearn.utils.class_weight import compute_class_weight
 
-# XGBoost e LightGBM
-import xgboost as xgb
-import lightgbm as lgb
-
-# Deep Learning
-import tensorflow as tf
-from tensorflow import keras
-from tensorflow.keras import layers
-
-# Otimização de hiperparâmetros
-import optuna
-
-# Interpretabilidade
-import shap
-
-# Tratamento de dados desbalanceados
-from imbalanced_learn.over_sampling import SMOTE
-from imbalanced_learn.under_sampling import RandomUnderSampler
-
-# Firebase
-import firebase_admin
-from firebase_admin import credentials, firestore
+# XGBoost, LightGBM, TensorFlow, imbalanced-learn e Firebase são importados
+# apenas onde usados (treino / carga de modelos): a API sobe sem carregá-los
 
 import logging
 logger = logging.getLogger(__name__)
@@ -48,10 +32,37 @@ from .model_cache import model_cache
 
 # Temporal validation
 from .temporal_validation import TemporalCrossValidator, TemporalModelSelector
+from .prediction_store import FoldPredictionStore
 
 # Explainability
 from .explainability import ExplainabilityService
 
+# Carregamento em lote dos dados do banco
+from .data_loader import ChurnDataLoader
+
+# Inferência da rede neural sem TensorFlow
+from .numpy_network import NumpyDenseNetwork
+
+# Early stopping e prazo do treino de cada modelo base
+from .model_fitting import fit_model
+
+# Florestas em arrays NumPy (mmap compartilhado entre workers)
+from .numpy_trees import NumpyTreeEnsemble
+
+# Versões imutáveis dos artefatos com promoção atômica
+from .model_registry import ModelRegistry
+
+# Ensemble ponderado sobre os modelos base já treinados
+from .ensemble import PrefitSoftVotingEnsemble
+from .resampling import Resampler
+
+from config import (
+    ML_NN_INFERENCE_BACKEND, ML_TREE_INFERENCE_BACKEND, ML_MODEL_KEEP_VERSIONS,
+    ML_TRAINING_PARALLEL, ML_TRAINING_N_JOBS, ML_ENSEMBLE_WEIGHTING,
+    ML_TRAINING_TIME_BUDGET_SECONDS, ML_BOOSTING_MAX_ROUNDS, ML_EARLY_STOPPING_HOLDOUT,
+    ML_TEMPORAL_CV_N_JOBS
+)
+
 
 class ChurnFeatureEngineer:
     """Engenheiro de features para previsão de churn"""
@@ -85,9 +96,346 @@ class ChurnFeatureEngineer:
         
         # Features derivadas e interações
         features.update(self._create_derived_features(features))
-        
+
         return features
-    
+
+    def create_features_batch(self,
+                              clientes,
+                              contratos=None,
+                              health_scores=None,
+                              csat_respostas=None,
+                              eventos=None,
+                              reference_date: Optional[datetime] = None) -> np.ndarray:
+        """
+        Cria a matriz de features para vários clientes de uma só vez
+
+        Equivalente a chamar create_features para cada cliente, mas usando
+        operações agrupadas e vetorizadas sobre tabelas inteiras.
+
+        Args:
+            clientes: Tabela de clientes (colunas de `cliente`, incluindo `id`)
+            contratos: Tabela de contratos (chave `cliente_id`)
+            health_scores: Tabela de health_score_snapshot (chave `id_cliente`)
+            csat_respostas: Tabela de csat_resposta (chave `id_cliente`)
+            eventos: Tabela de evento_cs (chave `cliente_id`)
+            reference_date: Data de referência para cálculos de dias (padrão: agora)
+
+        Returns:
+            Matriz float32 (n_clientes, n_features) na ordem de get_feature_names(),
+            com linhas na mesma ordem da tabela de clientes
+        """
+        clientes = self._to_frame(clientes)
+        now = pd.Timestamp(reference_date or datetime.now())
+        index = pd.Index(clientes['id'].to_numpy() if 'id' in clientes else np.arange(len(clientes)))
+
+        columns = {}
+        columns.update(self._batch_cliente_features(clientes, now))
+        columns.update(self._batch_contrato_features(self._to_frame(contratos), index, now))
+        columns.update(self._batch_health_score_features(self._to_frame(health_scores), index, now))
+        columns.update(self._batch_csat_features(self._to_frame(csat_respostas), index, now))
+        columns.update(self._batch_evento_features(self._to_frame(eventos), index, now))
+        columns.update(self._batch_derived_features(columns))
+
+        X = np.empty((len(clientes), len(self.get_feature_names())), dtype=np.float32)
+        for i, name in enumerate(self.get_feature_names()):
+            X[:, i] = columns[name]
+
+        return X
+
+    @staticmethod
+    def _to_frame(data) -> pd.DataFrame:
+        """Converte tabelas (DataFrame, dict de arrays, array estruturado, lista de dicts)"""
+        if data is None:
+            return pd.DataFrame()
+        if isinstance(data, pd.DataFrame):
+            return data
+        return pd.DataFrame(data)
+
+    @staticmethod
+    def _column(df: pd.DataFrame, name: str, default) -> pd.Series:
+        """Retorna a coluna ou uma série constante quando ela não existe"""
+        if name in df:
+            return df[name]
+        return pd.Series(default, index=df.index)
+
+    @staticmethod
+    def _numeric(series: pd.Series, default: float) -> np.ndarray:
+        """Converte para float preenchendo valores ausentes"""
+        return pd.to_numeric(series, errors='coerce').fillna(default).to_numpy(dtype=np.float64)
+
+    @staticmethod
+    def _truthy(series: pd.Series) -> np.ndarray:
+        """Equivalente vetorizado de bool(valor), tratando ausentes como False"""
+        if series.dtype == object:
+            return series.map(lambda v: bool(v) if v is not None and v == v else False).to_numpy(dtype=bool)
+        return series.fillna(0).astype(bool).to_numpy()
+
+    @staticmethod
+    def _days(later, earlier) -> np.ndarray:
+        """Dias inteiros (floor) entre duas datas; NaN quando alguma está ausente"""
+        delta = pd.Series(later - earlier)
+        return delta.dt.days.to_numpy(dtype=np.float64)
+
+    def _category_codes(self, series: pd.Series, field: str) -> np.ndarray:
+        """Equivalente vetorizado de _encode_categorical"""
+        classes = self._get_label_encoder(field).classes_
+        mapping = {value: code for code, value in enumerate(classes)}
+        return series.map(mapping).fillna(0).to_numpy(dtype=np.float64)
+
+    def _last_two_by_date(self, df: pd.DataFrame, key: str,
+                          date_column: str) -> Tuple[pd.DataFrame, pd.DataFrame, pd.Series]:
+        """
+        Retorna, por cliente, o registro mais recente, o anterior e as datas parseadas
+
+        Ordem decrescente de data; em datas iguais vale a ordem de entrada (o
+        primeiro registro é o mais recente), como max/sorted(reverse=True) no
+        caminho por cliente.
+        """
+        dates = pd.to_datetime(self._column(df, date_column, None), errors='coerce')
+        ordered = df.assign(_data=dates, _ordem=np.arange(len(df))).sort_values(
+            [key, '_data', '_ordem'], ascending=[True, False, True], na_position='last'
+        )
+        position = ordered.groupby(key, sort=False).cumcount().to_numpy()
+        last = ordered[position == 0].set_index(key)
+        previous = ordered[position == 1].set_index(key)
+        return last, previous, dates
+
+    def _batch_cliente_features(self, clientes: pd.DataFrame, now: pd.Timestamp) -> Dict[str, np.ndarray]:
+        """Versão em lote de _extract_cliente_features"""
+        jornada = pd.to_datetime(self._column(clientes, 'jornada_iniciada_em', None), errors='coerce')
+        status = self._column(clientes, 'status_cliente', 'ativo')
+
+        return {
+            'ltv_meses': self._numeric(self._column(clientes, 'ltv_meses', 0), 0),
+            'ltv_valor': self._numeric(self._column(clientes, 'ltv_valor', 0), 0),
+            'dias_jornada': np.nan_to_num(self._days(now, jornada), nan=0),
+            'status_encoded': self._category_codes(status, 'status_cliente')
+        }
+
+    def _batch_contrato_features(self, contratos: pd.DataFrame, index: pd.Index,
+                                 now: pd.Timestamp) -> Dict[str, np.ndarray]:
+        """Versão em lote de _extract_contrato_features"""
+        defaults = {
+            'total_contratos': 0,
+            'contratos_ativos': 0,
+            'contratos_vencidos': 0,
+            'valor_mensal_medio': 0,
+            'ciclo_medio': 0,
+            'dias_vencimento_proximo': 999,
+            'percentual_renovacoes': 0,
+            'auto_renovacao_ativa': 0
+        }
+        if contratos.empty:
+            return {name: np.full(len(index), value, dtype=np.float64) for name, value in defaults.items()}
+
+        status = self._column(contratos, 'status_contrato', None)
+        data_fim = pd.to_datetime(self._column(contratos, 'data_fim', None), errors='coerce')
+
+        grouped = pd.DataFrame({
+            'cliente_id': contratos['cliente_id'].to_numpy(),
+            'ativo': (status == 'ativo').to_numpy(),
+            'vencido': (status == 'vencido').to_numpy(),
+            'valor_mensal': self._numeric(self._column(contratos, 'valor_mensal', 0), 0),
+            'ciclo': np.trunc(self._numeric(self._column(contratos, 'ciclo_atual', 1), 1)),
+            'dias_vencimento': self._days(data_fim, now),
+            'renovacao': self._truthy(self._column(contratos, 'renovacoes', None)),
+            'auto_renovacao': self._truthy(self._column(contratos, 'auto_renovacao', None))
+        }).groupby('cliente_id', sort=False).agg(
+            total_contratos=('ativo', 'size'),
+            contratos_ativos=('ativo', 'sum'),
+            contratos_vencidos=('vencido', 'sum'),
+            valor_mensal_medio=('valor_mensal', 'mean'),
+            ciclo_medio=('ciclo', 'mean'),
+            dias_vencimento_proximo=('dias_vencimento', 'min'),
+            renovacoes=('renovacao', 'sum'),
+            auto_renovacao_ativa=('auto_renovacao', 'sum')
+        ).reindex(index)
+
+        grouped['percentual_renovacoes'] = grouped['renovacoes'] / grouped['total_contratos']
+
+        return {
+            name: grouped[name].fillna(value).to_numpy(dtype=np.float64)
+            for name, value in defaults.items()
+        }
+
+    def _batch_health_score_features(self, health_scores: pd.DataFrame, index: pd.Index,
+                                     now: pd.Timestamp) -> Dict[str, np.ndarray]:
+        """Versão em lote de _extract_health_score_features"""
+        defaults = {
+            'health_score_atual': 50,
+            'health_score_tendencia': 0,
+            'nivel_risco_encoded': 2,
+            'componentes_baixos': 0,
+            'ultima_avaliacao_dias': 999
+        }
+        if health_scores.empty:
+            return {name: np.full(len(index), value, dtype=np.float64) for name, value in defaults.items()}
+
+        last, previous, _ = self._last_two_by_date(health_scores, 'id_cliente', 'data_avaliacao')
+
+        componentes = self._column(last, 'componentes_baixos', 0)
+        if componentes.dtype == object:
+            componentes = componentes.map(lambda v: len(v) if isinstance(v, (list, tuple, set)) else v)
+
+        atual = pd.Series(self._numeric(self._column(last, 'health_score_total', 50), 50), index=last.index)
+        anterior = pd.Series(self._numeric(self._column(previous, 'health_score_total', 50), 50),
+                             index=previous.index)
+
+        features = pd.DataFrame({
+            'health_score_atual': atual,
+            'nivel_risco_encoded': self._category_codes(self._column(last, 'nivel_risco', 'medio'), 'nivel_risco'),
+            'componentes_baixos': self._numeric(componentes, 0),
+            'ultima_avaliacao_dias': self._days(now, last['_data']),
+            'health_score_tendencia': (atual - anterior.reindex(last.index)).fillna(0)
+        }, index=last.index).reindex(index)
+
+        return {
+            name: features[name].fillna(value).to_numpy(dtype=np.float64)
+            for name, value in defaults.items()
+        }
+
+    def _batch_csat_features(self, csat_data: pd.DataFrame, index: pd.Index,
+                             now: pd.Timestamp) -> Dict[str, np.ndarray]:
+        """Versão em lote de _extract_csat_features"""
+        defaults = {
+            'csat_medio': 3,
+            'csat_tendencia': 0,
+            'percentual_positivo': 0,
+            'ultima_avaliacao_csat_dias': 999,
+            'feedback_negativo_count': 0
+        }
+        if csat_data.empty:
+            return {name: np.full(len(index), value, dtype=np.float64) for name, value in defaults.items()}
+
+        avaliacoes = self._numeric(self._column(csat_data, 'avaliacao_call', 3), 3)
+        stats = pd.DataFrame({
+            'id_cliente': csat_data['id_cliente'].to_numpy(),
+            'avaliacao': avaliacoes,
+            'positiva': avaliacoes >= 4,
+            'feedback_negativo': self._truthy(self._column(csat_data, 'tem_feedback_negativo', False))
+        }).groupby('id_cliente', sort=False).agg(
+            csat_medio=('avaliacao', 'mean'),
+            percentual_positivo=('positiva', 'mean'),
+            feedback_negativo_count=('feedback_negativo', 'sum')
+        )
+
+        last, previous, _ = self._last_two_by_date(csat_data, 'id_cliente', 'data_resposta')
+        anterior = pd.Series(self._numeric(self._column(previous, 'avaliacao_call', 3), 3),
+                             index=previous.index)
+
+        stats['ultima_avaliacao_csat_dias'] = pd.Series(self._days(now, last['_data']), index=last.index)
+        stats['csat_tendencia'] = (stats['csat_medio'] - anterior).fillna(0)
+        stats = stats.reindex(index)
+
+        return {
+            name: stats[name].fillna(value).to_numpy(dtype=np.float64)
+            for name, value in defaults.items()
+        }
+
+    def _batch_evento_features(self, eventos: pd.DataFrame, index: pd.Index,
+                               now: pd.Timestamp) -> Dict[str, np.ndarray]:
+        """Versão em lote de _extract_evento_features"""
+        defaults = {
+            'total_eventos': 0,
+            'eventos_ultimos_30_dias': 0,
+            'eventos_atrasados': 0,
+            'eventos_urgentes': 0,
+            'dias_ultima_interacao': 999
+        }
+        if eventos.empty:
+            return {name: np.full(len(index), value, dtype=np.float64) for name, value in defaults.items()}
+
+        stats = pd.DataFrame({
+            'cliente_id': eventos['cliente_id'].to_numpy(),
+            'recente': self._truthy(self._column(eventos, 'is_recente', False)),
+            'atrasado': self._truthy(self._column(eventos, 'is_atrasado', False)),
+            'urgente': self._truthy(self._column(eventos, 'is_urgente', False)),
+            'data_evento': pd.to_datetime(self._column(eventos, 'data_evento', None), errors='coerce').to_numpy()
+        }).groupby('cliente_id', sort=False).agg(
+            total_eventos=('recente', 'size'),
+            eventos_ultimos_30_dias=('recente', 'sum'),
+            eventos_atrasados=('atrasado', 'sum'),
+            eventos_urgentes=('urgente', 'sum'),
+            ultimo_evento=('data_evento', 'max')
+        ).reindex(index)
+
+        stats['dias_ultima_interacao'] = self._days(now, stats['ultimo_evento'])
+
+        return {
+            name: stats[name].fillna(value).to_numpy(dtype=np.float64)
+            for name, value in defaults.items()
+        }
+
+    def _batch_derived_features(self, f: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """Versão vetorizada de _create_derived_features"""
+        derived = {}
+
+        dias_jornada = f['dias_jornada']
+        tem_jornada = dias_jornada > 0
+        derived['ltv_por_dia'] = f['ltv_valor'] / np.maximum(dias_jornada, 1)
+        derived['health_score_normalizado'] = f['health_score_atual'] / 100
+        derived['jornada_anos'] = np.where(tem_jornada, dias_jornada / 365.25, 0)
+        derived['jornada_trimestres'] = np.where(tem_jornada, dias_jornada / 90, 0)
+        derived['maturidade_cliente'] = np.where(tem_jornada, np.minimum(dias_jornada / 1095, 1.0), 0)
+
+        valor_mensal = f['valor_mensal_medio']
+        total_contratos = f['total_contratos']
+        tem_contratos = total_contratos > 0
+        derived['valor_por_contrato'] = np.where(tem_contratos, valor_mensal * total_contratos, 0)
+        derived['densidade_valor'] = np.where(tem_contratos, valor_mensal / np.maximum(total_contratos, 1), 0)
+
+        derived['frequencia_interacao'] = np.where(
+            tem_jornada, f['total_eventos'] / np.maximum(dias_jornada / 30, 1), 0
+        )
+
+        dias_ultima_interacao = f['dias_ultima_interacao']
+        derived['inatividade_alta'] = (dias_ultima_interacao > 60).astype(np.float64)
+        derived['inatividade_critica'] = (dias_ultima_interacao > 120).astype(np.float64)
+
+        health_score = f['health_score_atual']
+        csat_medio = f['csat_medio']
+        derived['saude_relacionamento'] = (health_score / 100 + csat_medio / 5) / 2
+
+        dias_vencimento = f['dias_vencimento_proximo']
+        derived['urgencia_renovacao'] = np.maximum(0, 1 - (dias_vencimento / 90))
+        derived['risco_vencimento'] = (dias_vencimento <= 30).astype(np.float64)
+
+        derived['consistencia_renovacao'] = f['percentual_renovacoes'] * (1 + f['auto_renovacao_ativa'])
+
+        health_tendencia = f['health_score_tendencia']
+        csat_tendencia = f['csat_tendencia']
+        derived['tendencia_positiva'] = ((health_tendencia > 0) & (csat_tendencia >= 0)).astype(np.float64)
+        tendencia_negativa = (health_tendencia < 0) & (csat_tendencia < 0)
+        derived['tendencia_negativa'] = tendencia_negativa.astype(np.float64)
+
+        # Mesmos pesos de _create_derived_features
+        risco_score = (
+            np.select([health_score < 30, health_score < 50, health_score < 70, health_score < 85],
+                      [4, 3, 2, 1], 0)
+            + np.select([dias_vencimento <= 15, dias_vencimento <= 30, dias_vencimento <= 60],
+                        [3, 2, 1], 0)
+            + np.select([csat_medio < 2, csat_medio < 3, csat_medio < 4], [3, 2, 1], 0)
+            + np.select([dias_ultima_interacao > 90, dias_ultima_interacao > 45], [2, 1], 0)
+            + np.where(tendencia_negativa, 2, 0)
+            + np.where(valor_mensal > 5000, 1, 0)
+        )
+        derived['risco_composto'] = np.minimum(risco_score, 15).astype(np.float64)
+        derived['risco_normalizado'] = derived['risco_composto'] / 15
+
+        derived['cliente_alto_valor'] = (valor_mensal > 3000).astype(np.float64)
+        derived['cliente_longo_prazo'] = (dias_jornada > 365).astype(np.float64)
+        derived['cliente_multiplos_contratos'] = (total_contratos > 1).astype(np.float64)
+
+        eventos_ultimos_30_dias = f['eventos_ultimos_30_dias']
+        derived['taxa_feedback_negativo'] = np.where(
+            eventos_ultimos_30_dias > 0,
+            f['feedback_negativo_count'] / np.maximum(eventos_ultimos_30_dias, 1),
+            0
+        )
+        derived['instabilidade_contratual'] = f['contratos_vencidos'] / np.maximum(total_contratos, 1)
+
+        return derived
+
     def _extract_cliente_features(self, cliente: Dict) -> Dict[str, float]:
         """Extrai features básicas do cliente"""
         features = {}
@@ -199,7 +547,9 @@ class ChurnFeatureEngineer:
         
         # Tendência (comparando com avaliação anterior)
         if len(health_scores) > 1:
-            penultima_avaliacao = sorted(health_scores, key=lambda x: x.get('data_avaliacao', ''))[-2]
+            # Segunda da ordem decrescente (estável): em datas iguais, a mesma escolha do lote
+            penultima_avaliacao = sorted(health_scores, key=lambda x: x.get('data_avaliacao', ''),
+                                         reverse=True)[1]
             score_anterior = float(penultima_avaliacao.get('health_score_total', 50))
             features['health_score_tendencia'] = features['health_score_atual'] - score_anterior
         else:
@@ -244,7 +594,7 @@ class ChurnFeatureEngineer:
         
         # Tendência CSAT
         if len(csat_data) > 1:
-            penultima_csat = sorted(csat_data, key=lambda x: x.get('data_resposta', ''))[-2]
+            penultima_csat = sorted(csat_data, key=lambda x: x.get('data_resposta', ''), reverse=True)[1]
             csat_anterior = float(penultima_csat.get('avaliacao_call', 3))
             features['csat_tendencia'] = features['csat_medio'] - csat_anterior
         else:
@@ -417,8 +767,8 @@ class ChurnFeatureEngineer:
         
         return derived
     
-    def _encode_categorical(self, value: str, field: str) -> int:
-        """Codifica valores categóricos"""
+    def _get_label_encoder(self, field: str) -> LabelEncoder:
+        """Retorna o encoder do campo, inicializando as categorias conhecidas"""
         if field not in self.label_encoders:
             self.label_encoders[field] = LabelEncoder()
             # Define as categorias conhecidas
@@ -427,8 +777,14 @@ class ChurnFeatureEngineer:
             elif field == 'nivel_risco':
                 self.label_encoders[field].fit(['baixo', 'medio', 'alto', 'critico'])
         
+        return self.label_encoders[field]
+    
+    def _encode_categorical(self, value: str, field: str) -> int:
+        """Codifica valores categóricos"""
+        encoder = self._get_label_encoder(field)
+        
         try:
-            return self.label_encoders[field].transform([value])[0]
+            return encoder.transform([value])[0]
         except:
             return 0  # Valor padrão se não reconhecido
     
@@ -484,25 +840,144 @@ class ChurnFeatureEngineer:
         ]
 
 
+# Modelos de árvores exportados por NumpyTreeEnsemble
+TREE_MODELS = ('random_forest', 'xgboost', 'lightgbm')
+
+
+def build_neural_network(n_features: int) -> "keras.Model":
+    """Constrói a rede neural (também usada pelos processos de ml.parallel_training)"""
+    from tensorflow import keras
+    from tensorflow.keras import layers
+    
+    model = keras.Sequential([
+        layers.Dense(64, activation='relu', input_shape=(n_features,)),
+        layers.Dropout(0.3),
+        layers.Dense(32, activation='relu'),
+        layers.Dropout(0.2),
+        layers.Dense(16, activation='relu'),
+        layers.Dense(1, activation='sigmoid')
+    ])
+    
+    model.compile(
+        optimizer='adam',
+        loss='binary_crossentropy',
+        metrics=['accuracy', 'auc']
+    )
+    
+    return model
+
+
+def _no_progress(stage: str, **info):
+    """Callback de progresso padrão do treino (não publica nada)"""
+
+
+class ModelBundle:
+    """
+    Artefatos de uma versão dos modelos, servidos em conjunto
+    
+    O ChurnPredictor troca o bundle inteiro em uma única atribuição; cada
+    previsão lê o bundle uma vez e usa só os modelos, o scaler e o feature
+    engineer dele, mesmo que uma nova versão seja carregada no meio.
+    """
+    
+    def __init__(self, models: Dict[str, Any], scaler: StandardScaler,
+                 feature_engineer: ChurnFeatureEngineer, model_version: Optional[str] = None):
+        self.models = models
+        self.scaler = scaler
+        self.feature_engineer = feature_engineer
+        self.model_version = model_version
+        
+        # Explicadores SHAP valem para uma versão dos modelos (ver _get_shap_explainer)
+        self.explainability_service = ExplainabilityService()
+        self.explainers_key = None
+        self.explainers_lock = threading.Lock()
+
+
 class ChurnPredictor:
     """Sistema principal de previsão de churn"""
     
     def __init__(self, model_path: str = None):
-        self.feature_engineer = ChurnFeatureEngineer()
-        self.models = {}
-        self.scaler = StandardScaler()
-        self.feature_names = self.feature_engineer.get_feature_names()
-        self.explainability_service = ExplainabilityService()
+        self._bundle = ModelBundle({}, StandardScaler(), ChurnFeatureEngineer())
+        self.feature_names = self._bundle.feature_engineer.get_feature_names()
         self.temporal_validation_results = None
+        self.training_deadline = None  # prazo do treino em andamento (ver train_models)
+        self.resampler = Resampler()  # balanceamento das classes, com cache (ML_RESAMPLING_STRATEGY)
+        
+        # Serializa cargas de versões; previsões nunca esperam por ele
+        self._load_lock = threading.Lock()
         
-        # Carrega modelos pré-treinados se existirem
+        # Carrega modelos pré-treinados se existirem. Sem versão publicada o
+        # bundle fica vazio: os modelos treináveis (xgboost, lightgbm, Keras)
+        # só são criados pelo treino (train_predictor), não nos workers da API
         if model_path and Path(model_path).exists():
             self.load_models(model_path)
-        else:
-            self._initialize_models()
+    
+    # Atalhos para o bundle servido. Atribuições alteram o bundle atual no
+    # lugar (testes, scripts); novas versões entram por swap_bundle/load_models.
+    
+    @property
+    def bundle(self) -> ModelBundle:
+        return self._bundle
+    
+    @property
+    def models(self) -> Dict[str, Any]:
+        return self._bundle.models
+    
+    @models.setter
+    def models(self, models: Dict[str, Any]):
+        self._bundle.models = models
+    
+    @property
+    def scaler(self) -> StandardScaler:
+        return self._bundle.scaler
+    
+    @scaler.setter
+    def scaler(self, scaler: StandardScaler):
+        self._bundle.scaler = scaler
+    
+    @property
+    def feature_engineer(self) -> ChurnFeatureEngineer:
+        return self._bundle.feature_engineer
+    
+    @feature_engineer.setter
+    def feature_engineer(self, feature_engineer: ChurnFeatureEngineer):
+        self._bundle.feature_engineer = feature_engineer
+    
+    @property
+    def model_version(self) -> Optional[str]:
+        return self._bundle.model_version
+    
+    @model_version.setter
+    def model_version(self, model_version: Optional[str]):
+        self._bundle.model_version = model_version
+    
+    @property
+    def explainability_service(self) -> ExplainabilityService:
+        return self._bundle.explainability_service
+    
+    def swap_bundle(self, bundle: ModelBundle):
+        """
+        Passa a servir outro bundle já carregado (troca atômica)
+        
+        Os explicadores SHAP são preparados antes da troca; previsões em
+        andamento terminam com o bundle anterior.
+        """
+        if bundle.model_version is None:
+            bundle.model_version = self._compute_model_version(bundle)
+        if bundle.explainers_key is None:
+            self._setup_explainability(bundle)
+        
+        previous = self._bundle.model_version
+        self._bundle = bundle
+        
+        if previous != bundle.model_version:
+            logger.info(f"Versão de modelos servida: {previous} -> {bundle.model_version}")
     
     def _initialize_models(self):
         """Inicializa os modelos de ML"""
+        import xgboost as xgb
+        import lightgbm as lgb
+        
         # Random Forest
         self.models['random_forest'] = RandomForestClassifier(
             n_estimators=100,
@@ -513,7 +988,7 @@ class ChurnPredictor:
         
         # XGBoost
         self.models['xgboost'] = xgb.XGBClassifier(
-            n_estimators=100,
+            n_estimators=ML_BOOSTING_MAX_ROUNDS,  # teto; early stopping no treino
             max_depth=6,
             learning_rate=0.1,
             random_state=42,
@@ -522,7 +997,7 @@ class ChurnPredictor:
         
         # LightGBM
         self.models['lightgbm'] = lgb.LGBMClassifier(
-            n_estimators=100,
+            n_estimators=ML_BOOSTING_MAX_ROUNDS,  # teto; early stopping no treino
             max_depth=6,
             learning_rate=0.1,
             random_state=42,
@@ -535,24 +1010,9 @@ class ChurnPredictor:
         # Ensemble será configurado após treinamento
         self.models['ensemble'] = None
     
-    def _build_neural_network(self) -> keras.Model:
+    def _build_neural_network(self) -> "keras.Model":
         """Constrói a rede neural"""
-        model = keras.Sequential([
-            layers.Dense(64, activation='relu', input_shape=(len(self.feature_names),)),
-            layers.Dropout(0.3),
-            layers.Dense(32, activation='relu'),
-            layers.Dropout(0.2),
-            layers.Dense(16, activation='relu'),
-            layers.Dense(1, activation='sigmoid')
-        ])
-        
-        model.compile(
-            optimizer='adam',
-            loss='binary_crossentropy',
-            metrics=['accuracy', 'auc']
-        )
-        
-        return model
+        return build_neural_network(len(self.feature_names))
     
     def prepare_training_data(self, clientes_data: List[Dict]) -> Tuple[np.ndarray, np.ndarray]:
         """Prepara dados de treinamento"""
@@ -585,10 +1045,41 @@ class ChurnPredictor:
         
         return X, y
     
+    def prepare_training_data_batch(self,
+                                    clientes,
+                                    contratos=None,
+                                    health_scores=None,
+                                    csat_respostas=None,
+                                    eventos=None,
+                                    reference_date: Optional[datetime] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Prepara dados de treinamento a partir de tabelas (modo em lote)
+        
+        Mesmo resultado de prepare_training_data, mas recebendo uma tabela por
+        entidade em vez de um dicionário aninhado por cliente.
+        """
+        clientes = self.feature_engineer._to_frame(clientes)
+        
+        X = self.feature_engineer.create_features_batch(
+            clientes, contratos, health_scores, csat_respostas, eventos,
+            reference_date=reference_date
+        )
+        
+        # Label (1 = churn, 0 = não churn)
+        status = self.feature_engineer._column(clientes, 'status_cliente', None)
+        y = (status == 'churn').to_numpy(dtype=int)
+        
+        # Normaliza features
+        X = self.scaler.fit_transform(X)
+        
+        return X, y
+    
     def train_models(self, X: np.ndarray, y: np.ndarray, 
                     validation_split: float = 0.2,
                     use_temporal_validation: bool = False,
-                    temporal_data: pd.DataFrame = None) -> Dict[str, float]:
+                    temporal_data: pd.DataFrame = None,
+                    progress: Optional[Callable[..., None]] = None,
+                    time_budget: Optional[float] = None) -> Dict[str, float]:
         """
         Treina todos os modelos com opção de validação temporal
         
@@ -598,47 +1089,74 @@ class ChurnPredictor:
             validation_split: Percentual para validação (se não usar temporal)
             use_temporal_validation: Se usar validação temporal
             temporal_data: DataFrame com dados temporais (deve ter coluna 'data_referencia')
+            progress: Chamado com o nome de cada etapa (model:<nome>, ensemble,
+                explainers) e a cada época da rede neural; exceções levantadas
+                por ele interrompem o treino (cancelamento)
+            time_budget: Prazo em segundos para o treino dos modelos (padrão:
+                ML_TRAINING_TIME_BUDGET_SECONDS); ao fim, cada modelo para na
+                próxima iteração e mantém o que já treinou
+        
+        Os resultados de cada modelo incluem as iterações usadas
+        (iterations/max_iterations), o motivo da parada (stopped) e o tempo
+        de treino (training_seconds).
+        
+        O treino altera os modelos deste predictor. Para retreinar sem afetar
+        previsões em andamento, treine outra instância e publique o resultado
+        com swap_bundle (ver ChurnMLService.train_from_database).
         """
+        progress = progress or _no_progress
+        
+        time_budget = ML_TRAINING_TIME_BUDGET_SECONDS if time_budget is None else time_budget
+        self.training_deadline = time.time() + time_budget if time_budget else None
+        
         if use_temporal_validation and temporal_data is not None:
-            return self._train_with_temporal_validation(X, y, temporal_data)
+            results = self._train_with_temporal_validation(X, y, temporal_data, progress)
         else:
-            return self._train_with_standard_validation(X, y, validation_split)
+            results = self._train_with_standard_validation(X, y, validation_split, progress)
+        
+        # Identifica a geração de modelos (cache de previsões e scores persistidos)
+        self.model_version = self._compute_model_version()
+        
+        # Explicadores SHAP da nova geração, reutilizados em todas as previsões
+        progress('explainers')
+        self._setup_explainability()
+        
+        return results
     
     def _train_with_standard_validation(self, X: np.ndarray, y: np.ndarray, 
-                                       validation_split: float) -> Dict[str, float]:
+                                       validation_split: float,
+                                       progress: Callable[..., None] = None) -> Dict[str, float]:
         """Treinamento com validação padrão"""
         # Split dos dados
         X_train, X_val, y_train, y_val = train_test_split(
             X, y, test_size=validation_split, random_state=42, stratify=y
         )
         
-        # Tratamento de dados desbalanceados
-        smote = SMOTE(random_state=42)
-        X_train_balanced, y_train_balanced = smote.fit_resample(X_train, y_train)
+        # Tratamento de dados desbalanceados (matriz balanceada reutilizada do cache)
+        balanced = self.resampler.resample(X_train, y_train, fold='standard')
         
         results = {}
+        progress = progress or _no_progress
         
-        # Treina cada modelo
+        # Treina os modelos base (em paralelo, com early stopping em X_val) e avalia cada um
+        fit_info = self._fit_base_models(balanced.X, balanced.y, progress, {
+            'validation_data': (X_val, y_val),
+            'epochs': 50,
+            'batch_size': 32,
+            'verbose': 0
+        }, eval_set=(X_val, y_val), sample_weight=balanced.sample_weight)
+        
+        val_predictions = {}
         for name, model in self.models.items():
             if name == 'ensemble':
                 continue  # Será configurado no final
-                
+            
             if name == 'neural_network':
-                # Treina rede neural
-                history = model.fit(
-                    X_train_balanced, y_train_balanced,
-                    validation_data=(X_val, y_val),
-                    epochs=50,
-                    batch_size=32,
-                    verbose=0
-                )
                 y_pred_proba = model.predict(X_val)
                 if y_pred_proba.ndim > 1:
                     y_pred_proba = y_pred_proba[:, 0]
                 y_pred = (y_pred_proba > 0.5).astype(int)
             else:
-                # Treina modelos tradicionais
-                model.fit(X_train_balanced, y_train_balanced)
                 y_pred = model.predict(X_val)
                 y_pred_proba = model.predict_proba(X_val)[:, 1]
             
@@ -649,28 +1167,46 @@ class ChurnPredictor:
             results[name] = {
                 'accuracy': accuracy,
                 'auc': auc,
-                'training_samples': len(X_train_balanced),
-                'validation_samples': len(X_val)
+                'training_samples': len(balanced.y),
+                'validation_samples': len(X_val),
+                **fit_info.get(name, {}),
+                'resampling': balanced.info
             }
+            val_predictions[name] = y_pred_proba
             
             logger.info(f"Modelo {name}: Accuracy={accuracy:.3f}, AUC={auc:.3f}")
         
-        # Configura ensemble
-        self._setup_ensemble(X_train_balanced, y_train_balanced)
+        # Configura ensemble com pesos aprendidos nas previsões de validação
+        progress('ensemble')
+        self._setup_ensemble(val_predictions, y_val)
+        
+        ensemble_proba = self.models['ensemble'].combine(val_predictions)
+        results['ensemble'] = {
+            'accuracy': np.mean((ensemble_proba > 0.5).astype(int) == y_val),
+            'auc': roc_auc_score(y_val, ensemble_proba),
+            'weights': self.models['ensemble'].weights,
+            'validation_samples': len(X_val)
+        }
         
         return results
     
     def _train_with_temporal_validation(self, X: np.ndarray, y: np.ndarray, 
-                                       temporal_data: pd.DataFrame) -> Dict[str, float]:
+                                       temporal_data: pd.DataFrame,
+                                       progress: Callable[..., None] = None) -> Dict[str, float]:
         """Treinamento com validação temporal"""
         logger.info("Iniciando treinamento com validação temporal")
+        progress = progress or _no_progress
         
         # Cria validador temporal
+        prediction_store = FoldPredictionStore()
         temporal_validator = TemporalCrossValidator(
             train_months=6,    # 6 meses para treino
             validation_months=2,  # 2 meses para validação  
             test_months=1,     # 1 mês para teste
-            step_months=1      # Passo de 1 mês
+            step_months=1,     # Passo de 1 mês
+            n_jobs=ML_TEMPORAL_CV_N_JOBS,
+            prediction_store=prediction_store,  # previsões dos folds em disco
+            resampler=self.resampler  # mesmo balanceamento do treino final, em cache por fold
         )
         
         # Cria splits temporais
@@ -682,15 +1218,18 @@ class ChurnPredictor:
         
         if not splits:
             logger.warning("Sem splits temporais suficientes, usando validação padrão")
-            return self._train_with_standard_validation(X, y, 0.2)
+            return self._train_with_standard_validation(X, y, 0.2, progress)
         
         # Seletor de modelos
         model_selector = TemporalModelSelector(temporal_validator)
         
-        # Treina e avalia cada modelo
+        # Treina e avalia cada modelo (a rede Keras não é clonável pelo scikit-learn
+        # e fica fora da validação temporal; sem previsões out-of-fold, fica
+        # também fora do ensemble, ver _setup_ensemble)
         models_to_test = {name: model for name, model in self.models.items() 
-                         if name != 'ensemble'}
+                         if name != 'ensemble' and hasattr(model, 'get_params')}
         
+        progress('temporal_validation', splits=len(splits))
         comparison_results = model_selector.compare_models(
             models_to_test, X, y, splits
         )
@@ -709,8 +1248,19 @@ class ChurnPredictor:
                 'validation_samples': sum(split['val_size'] for split in splits)
             }
         
+        # Previsões out-of-fold (mesmos folds para todos os modelos) para os pesos do ensemble
+        oof_predictions = {
+            name: np.concatenate([fold['y_pred_proba']
+                                  for fold in temporal_validator.fold_predictions(model_results)])
+            for name, model_results in comparison_results['individual_results'].items()
+        }
+        oof_y = np.concatenate([y[split['val_idx']] for split in splits])
+        prediction_store.complete()  # libera a limpeza das execuções antigas
+        
         # Treina modelos finais com todos os dados
-        self._train_final_models(X, y)
+        fit_info = self._train_final_models(X, y, progress, (oof_predictions, oof_y))
+        for model_name, info in fit_info.items():
+            results.setdefault(model_name, {})['final_fit'] = info
         
         # Salva resultados da validação temporal
         self.temporal_validation_results = comparison_results
@@ -719,163 +1269,338 @@ class ChurnPredictor:
         
         return results
     
-    def _train_final_models(self, X: np.ndarray, y: np.ndarray):
-        """Treina modelos finais com todos os dados"""
+    def _train_final_models(self, X: np.ndarray, y: np.ndarray,
+                            progress: Callable[..., None] = None,
+                            oof: Optional[Tuple[Dict[str, np.ndarray], np.ndarray]] = None
+                            ) -> Dict[str, Dict[str, Any]]:
+        """
+        Treina modelos finais com todos os dados
+        
+        Uma fração (ML_EARLY_STOPPING_HOLDOUT) é separada antes do
+        balanceamento para o early stopping dos boosters e da rede neural.
+        
+        Args:
+            oof: (previsões out-of-fold por modelo, rótulos) da validação temporal,
+                usadas nos pesos do ensemble; sem elas, pesos uniformes
+        
+        Returns:
+            Info do treino de cada modelo (ver ml.model_fitting.fit_model), com
+            a info do balanceamento em 'resampling'
+        """
+        progress = progress or _no_progress
+        
+        # Holdout real (sem amostras sintéticas) para o early stopping
+        X_fit, X_stop, y_fit, y_stop = train_test_split(
+            X, y, test_size=ML_EARLY_STOPPING_HOLDOUT, random_state=42, stratify=y
+        )
+        
         # Balanceamento para treino final
-        smote = SMOTE(random_state=42)
-        X_balanced, y_balanced = smote.fit_resample(X, y)
+        balanced = self.resampler.resample(X_fit, y_fit, fold='final')
         
         # Treina cada modelo com todos os dados
-        for name, model in self.models.items():
-            if name == 'ensemble':
-                continue
-                
-            if name == 'neural_network':
-                # Treina rede neural
-                model.fit(
-                    X_balanced, y_balanced,
-                    epochs=100,  # Mais épocas para treino final
-                    batch_size=32,
-                    verbose=0,
-                    validation_split=0.1
-                )
-            else:
-                # Treina modelos tradicionais
-                model.fit(X_balanced, y_balanced)
+        fit_info = self._fit_base_models(balanced.X, balanced.y, progress, {
+            'epochs': 100,  # Teto de épocas para treino final
+            'batch_size': 32,
+            'verbose': 0,
+            'validation_data': (X_stop, y_stop)
+        }, eval_set=(X_stop, y_stop), sample_weight=balanced.sample_weight)
+        for info in fit_info.values():
+            info['resampling'] = balanced.info
         
         # Configura ensemble final
-        self._setup_ensemble(X_balanced, y_balanced)
+        progress('ensemble')
+        oof_predictions, oof_y = oof or ({}, y)
+        self._setup_ensemble(oof_predictions, oof_y)
         
-        # Configura explicabilidade para todos os modelos
-        self._setup_explainability()
+        return fit_info
     
-    def _setup_ensemble(self, X_train: np.ndarray, y_train: np.ndarray):
-        """Configura o modelo ensemble"""
-        # Usa os melhores modelos para o ensemble
-        best_models = {}
-        for name, model in self.models.items():
-            if name != 'ensemble' and model is not None:
-                # Para neural networks, cria wrapper
-                if name == 'neural_network':
-                    from sklearn.base import BaseEstimator, ClassifierMixin
-                    
-                    class KerasClassifierWrapper(BaseEstimator, ClassifierMixin):
-                        def __init__(self, model):
-                            self.model = model
-                        
-                        def fit(self, X, y):
-                            return self
-                        
-                        def predict_proba(self, X):
-                            preds = self.model.predict(X)
-                            if preds.ndim > 1 and preds.shape[1] == 1:
-                                # Binary classification - create both probabilities
-                                prob_1 = preds.flatten()
-                                prob_0 = 1 - prob_1
-                                return np.column_stack([prob_0, prob_1])
-                            return preds
-                        
-                        def predict(self, X):
-                            return (self.predict_proba(X)[:, 1] > 0.5).astype(int)
-                    
-                    best_models[name] = KerasClassifierWrapper(model)
-                else:
-                    best_models[name] = model
+    def _fit_base_models(self, X: np.ndarray, y: np.ndarray,
+                         progress: Callable[..., None],
+                         nn_fit_kwargs: Dict[str, Any],
+                         eval_set: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+                         sample_weight: Optional[np.ndarray] = None
+                         ) -> Dict[str, Dict[str, Any]]:
+        """
+        Treina os modelos base (todos exceto o ensemble) no lugar
+        
+        Com ML_TRAINING_PARALLEL, cada modelo treina em um processo próprio
+        com sua parte dos núcleos (ver ml.parallel_training); senão, um após
+        o outro neste processo. Nos dois casos o early stopping usa eval_set
+        e o treino respeita o prazo de train_models.
+        
+        Returns:
+            Info do treino de cada modelo (ver ml.model_fitting.fit_model)
+        """
+        base_models = {name: model for name, model in self.models.items()
+                       if name != 'ensemble' and model is not None}
         
-        if len(best_models) > 0:
-            # Ensemble por votação
-            from sklearn.ensemble import VotingClassifier
-            estimators = [(name, model) for name, model in best_models.items()]
-            self.models['ensemble'] = VotingClassifier(estimators=estimators, voting='soft')
+        if ML_TRAINING_PARALLEL and len(base_models) > 1:
+            from .parallel_training import fit_models_parallel
             
-            try:
-                self.models['ensemble'].fit(X_train, y_train)
-            except Exception as e:
-                logger.warning(f"Erro ao treinar ensemble: {e}")
-                # Fallback: usa apenas Random Forest
-                self.models['ensemble'] = self.models.get('random_forest')
+            fitted, fit_info = fit_models_parallel(
+                base_models, X, y,
+                eval_set=eval_set,
+                nn_fit_kwargs=nn_fit_kwargs,
+                deadline=self.training_deadline,
+                progress=None if progress is _no_progress else progress,
+                n_jobs=ML_TRAINING_N_JOBS or None,
+                sample_weight=sample_weight
+            )
+            self.models.update(fitted)
+        else:
+            fit_info = {}
+            for name, model in base_models.items():
+                progress(f"model:{name}")
+                fit_info[name] = fit_model(
+                    name, model, X, y, eval_set=eval_set, deadline=self.training_deadline,
+                    nn_fit_kwargs=nn_fit_kwargs, callbacks=self._epoch_callbacks(name, progress),
+                    sample_weight=sample_weight
+                )
+        
+        for name, info in fit_info.items():
+            logger.info(
+                f"Modelo {name}: {info['iterations']}/{info['max_iterations']} iterações "
+                f"em {info['training_seconds']:.1f}s (parada: {info['stopped'] or 'completo'})"
+            )
+        return fit_info
+    
+    @staticmethod
+    def _epoch_callbacks(name: str, progress: Callable[..., None]) -> list:
+        """Publica o progresso (e permite cancelar) a cada época da rede neural"""
+        if progress is _no_progress:
+            return []
+        
+        from tensorflow import keras
+        return [keras.callbacks.LambdaCallback(
+            on_epoch_end=lambda epoch, logs: progress(f"model:{name}", epoch=epoch + 1)
+        )]
+    
+    def _setup_ensemble(self, val_predictions: Dict[str, np.ndarray], y_val: np.ndarray):
+        """
+        Configura o ensemble sobre os modelos base já treinados
+        
+        Nenhum modelo é treinado de novo: o ensemble só guarda os pesos
+        (ML_ENSEMBLE_WEIGHTING) aprendidos com as previsões de validação.
+        Os pesos são aprendidos sobre os modelos que têm previsão de
+        validação; os demais (a rede neural na validação temporal) ficam fora
+        do ensemble, com peso zero. Sem nenhuma previsão, pesos uniformes.
+        """
+        base_models = [name for name, model in self.models.items()
+                       if name != 'ensemble' and model is not None]
+        predictions = {name: val_predictions[name] for name in base_models if name in val_predictions}
+        
+        try:
+            if predictions:
+                ensemble = PrefitSoftVotingEnsemble.fit(predictions, y_val, ML_ENSEMBLE_WEIGHTING)
+                excluded = sorted(set(base_models) - set(predictions))
+                if excluded:
+                    logger.info(f"Modelos sem previsão de validação fora do ensemble: {excluded}")
+            else:
+                ensemble = PrefitSoftVotingEnsemble({name: 1.0 for name in base_models})
+        except Exception as e:
+            logger.warning(f"Erro ao calcular pesos do ensemble: {e}")
+            ensemble = PrefitSoftVotingEnsemble({name: 1.0 for name in base_models})
+        
+        self.models['ensemble'] = ensemble
+        logger.info(f"Ensemble configurado: {ensemble}")
     
     def predict_churn(self, cliente_data: Dict, contrato_data: List[Dict],
                      health_score_data: List[Dict], csat_data: List[Dict],
                      evento_data: List[Dict]) -> Dict[str, float]:
         """Faz previsão de churn para um cliente"""
         cliente_id = cliente_data.get('id', 'unknown')
+        bundle = self._bundle
         
-        # Verifica cache de features primeiro
-        cached_features = model_cache.get_cached_features(cliente_id)
-        
-        if cached_features is None:
-            # Extrai features se não estiver em cache
-            features = self.feature_engineer.create_features(
+        # Features do cache; em caso de ausência apenas um chamador as calcula
+        features = model_cache.get_or_compute_features(
+            cliente_id,
+            lambda: bundle.feature_engineer.create_features(
                 cliente_data, contrato_data, health_score_data, csat_data, evento_data
-            )
-            # Cache features para próxima vez
-            model_cache.cache_features(cliente_id, features)
-        else:
-            features = cached_features
-            logger.debug(f"Features recuperadas do cache para cliente {cliente_id}")
+            ),
+            self.feature_names
+        )
         
-        # Gera hash das features para cache de predição
-        features_hash = model_cache.create_features_hash(features)
+        # Gera hash do vetor de features para cache de predição (a ordem das
+        # features já faz parte da versão dos modelos)
+        features_hash = model_cache.create_features_hash(features, self.feature_names)
         
-        # Verifica cache de predição
-        cached_prediction = model_cache.get_cached_prediction('ensemble', features_hash)
-        if cached_prediction is not None:
-            logger.debug(f"Predição recuperada do cache para cliente {cliente_id}")
-            return cached_prediction
+        return model_cache.get_or_compute_prediction(
+            'ensemble', features_hash, lambda: self._predict_features(features, bundle),
+            cliente_id=cliente_id, model_version=bundle.model_version
+        )
+    
+    def _predict_features(self, features: Dict[str, float],
+                          bundle: Optional[ModelBundle] = None) -> Dict[str, Any]:
+        """Roda todos os modelos (de um mesmo bundle) sobre as features de um cliente"""
+        bundle = bundle or self._bundle
         
-        # Se não tem cache, faz a predição
+        # float32 como em predict_churn_matrix: mesmo resultado em lote e individual
         feature_vector = [features.get(name, 0) for name in self.feature_names]
-        X = np.array([feature_vector])
+        X = np.array([feature_vector], dtype=np.float32)
         
         # Normaliza
-        X = self.scaler.transform(X)
-        
-        predictions = {}
+        X = bundle.scaler.transform(X)
         
         # Faz previsão com cada modelo
-        for name, model in self.models.items():
-            if model is None:
-                continue
-                
-            try:
-                if name == 'neural_network':
-                    pred_raw = model.predict(X)
-                    if pred_raw.ndim > 1:
-                        pred = pred_raw[0][0]
-                    else:
-                        pred = pred_raw[0]
-                else:
-                    pred_proba = model.predict_proba(X)
-                    if pred_proba.shape[1] > 1:
-                        pred = pred_proba[0][1]  # Probabilidade da classe positiva
-                    else:
-                        pred = pred_proba[0][0]
-                
-                predictions[name] = float(pred)
-            except Exception as e:
-                logger.warning(f"Erro na predição do modelo {name}: {e}")
-                continue
+        predictions = {
+            name: float(pred[0]) for name, pred in self._predict_models(X, bundle).items()
+        }
         
-        # Média das previsões (ensemble)
-        ensemble_pred = np.mean(list(predictions.values()))
+        # Combinação ponderada das previsões (ensemble)
+        ensemble_pred = float(self._combine_predictions(
+            {name: np.array([pred]) for name, pred in predictions.items()}, bundle
+        )[0])
         predictions['ensemble'] = ensemble_pred
         
         # Interpreta o resultado
         risk_level = self._interpret_risk(ensemble_pred)
         
-        result = {
+        return {
             'predictions': predictions,
             'risk_level': risk_level,
             'risk_score': ensemble_pred,
-            'features_importance': self._get_feature_importance(features),
+            'features_importance': self._get_feature_importance(features, X, bundle),
             'recommendations': self._get_recommendations(ensemble_pred, features)
         }
+    
+    def predict_churn_batch(self,
+                            clientes_data: List[Dict],
+                            include_features: bool = True,
+                            include_recommendations: bool = True) -> List[Dict[str, Any]]:
+        """
+        Faz previsão de churn para vários clientes de uma vez
         
-        # Cache o resultado
-        model_cache.cache_model_prediction('ensemble', features_hash, result)
+        As features de todos os clientes são empilhadas em uma única matriz,
+        de forma que cada modelo roda uma só vez para o lote inteiro.
         
-        return result
+        Args:
+            clientes_data: Dicionários de cliente com as chaves 'contratos',
+                'health_scores', 'csat_respostas' e 'eventos_cs'
+            include_features: Se calcula a importância das features (SHAP)
+            include_recommendations: Se gera recomendações
+            
+        Returns:
+            Lista de previsões na mesma ordem de clientes_data
+        """
+        if not clientes_data:
+            return []
+        
+        bundle = self._bundle
+        X = np.array([
+            [
+                bundle.feature_engineer.create_features(
+                    cliente,
+                    cliente.get('contratos', []),
+                    cliente.get('health_scores', []),
+                    cliente.get('csat_respostas', []),
+                    cliente.get('eventos_cs', [])
+                ).get(name, 0)
+                for name in self.feature_names
+            ]
+            for cliente in clientes_data
+        ], dtype=np.float32)
+        
+        return self.predict_churn_matrix(
+            [cliente.get('id') for cliente in clientes_data], X,
+            include_features=include_features,
+            include_recommendations=include_recommendations,
+            bundle=bundle
+        )
+    
+    def predict_churn_matrix(self,
+                             cliente_ids: List[Any],
+                             X_raw: np.ndarray,
+                             include_features: bool = True,
+                             include_recommendations: bool = True,
+                             bundle: Optional[ModelBundle] = None) -> List[Dict[str, Any]]:
+        """
+        Faz previsão de churn a partir de uma matriz de features já calculada
+        
+        Args:
+            cliente_ids: IDs dos clientes, alinhados às linhas de X_raw
+            X_raw: Matriz (n_clientes, n_features) na ordem de feature_names, sem normalização
+            include_features: Se calcula a importância das features (SHAP)
+            include_recommendations: Se gera recomendações
+            bundle: Versão dos modelos a usar (padrão: a servida no momento da chamada)
+            
+        Returns:
+            Lista de previsões na mesma ordem de cliente_ids
+        """
+        bundle = bundle or self._bundle
+        X = bundle.scaler.transform(X_raw)
+        
+        # Uma passada de cada modelo sobre o lote
+        model_predictions = self._predict_models(X, bundle)
+        if not model_predictions:
+            raise ValueError("Nenhum modelo disponível para previsão")
+        
+        # Combinação ponderada das previsões (ensemble)
+        ensemble_pred = self._combine_predictions(model_predictions, bundle)
+        
+        importances = self._get_feature_importance_batch(X, bundle) if include_features else None
+        
+        results = []
+        for i, cliente_id in enumerate(cliente_ids):
+            features = dict(zip(self.feature_names, X_raw[i].tolist()))
+            risk_score = float(ensemble_pred[i])
+            
+            predictions = {name: float(pred[i]) for name, pred in model_predictions.items()}
+            predictions['ensemble'] = risk_score
+            
+            results.append({
+                'cliente_id': cliente_id,
+                'predictions': predictions,
+                'risk_level': self._interpret_risk(risk_score),
+                'risk_score': risk_score,
+                'features_importance': importances[i] if importances is not None else {},
+                'recommendations': (
+                    self._get_recommendations(risk_score, features) if include_recommendations else []
+                ),
+                'features': features
+            })
+        
+        return results
+    
+    def _predict_models(self, X: np.ndarray,
+                        bundle: Optional[ModelBundle] = None) -> Dict[str, np.ndarray]:
+        """
+        Executa cada modelo uma vez sobre a matriz normalizada
+        
+        Returns:
+            {nome_modelo: probabilidades da classe positiva, uma por linha}
+        """
+        predictions = {}
+        
+        for name, model in (bundle or self._bundle).models.items():
+            if model is None or name == 'ensemble':
+                continue  # O ensemble combina as saídas (ver _combine_predictions)
+                
+            try:
+                if name == 'neural_network':
+                    pred = np.asarray(model.predict(X, verbose=0))
+                    if pred.ndim > 1:
+                        pred = pred[:, 0]
+                else:
+                    pred_proba = model.predict_proba(X)
+                    if pred_proba.shape[1] > 1:
+                        pred = pred_proba[:, 1]  # Probabilidade da classe positiva
+                    else:
+                        pred = pred_proba[:, 0]
+                
+                predictions[name] = pred.astype(np.float64)
+            except Exception as e:
+                logger.warning(f"Erro na predição do modelo {name}: {e}")
+                continue
+        
+        return predictions
+    
+    def _combine_predictions(self, predictions: Dict[str, np.ndarray],
+                             bundle: Optional[ModelBundle] = None) -> np.ndarray:
+        """Probabilidade do ensemble; média simples em versões sem pesos salvos"""
+        ensemble = (bundle or self._bundle).models.get('ensemble')
+        if isinstance(ensemble, PrefitSoftVotingEnsemble):
+            return ensemble.combine(predictions)
+        return np.mean(np.vstack(list(predictions.values())), axis=0)
     
     def _interpret_risk(self, probability: float) -> str:
         """Interpreta o nível de risco baseado na probabilidade"""
@@ -888,28 +1613,89 @@ class ChurnPredictor:
         else:
             return "critico"
     
-    def _get_feature_importance(self, features: Dict[str, float]) -> Dict[str, float]:
-        """Retorna a importância das features para o cliente"""
-        # Usa SHAP para interpretabilidade
-        try:
-            explainer = shap.TreeExplainer(self.models['random_forest'])
+    def _get_feature_importance(self, features: Dict[str, float],
+                                X_scaled: Optional[np.ndarray] = None,
+                                bundle: Optional[ModelBundle] = None) -> Dict[str, float]:
+        """
+        Retorna a importância das features para o cliente
+        
+        Args:
+            features: Features do cliente
+            X_scaled: Vetor (1, n_features) já normalizado, se disponível
+            bundle: Versão dos modelos a usar (padrão: a servida)
+        """
+        bundle = bundle or self._bundle
+        if X_scaled is None:
             feature_vector = [features.get(name, 0) for name in self.feature_names]
-            X = np.array([feature_vector])
-            X = self.scaler.transform(X)
-            
+            X_scaled = bundle.scaler.transform(np.array([feature_vector]))
+        
+        return self._get_feature_importance_batch(X_scaled, bundle)[0]
+    
+    def _get_feature_importance_batch(self, X: np.ndarray,
+                                      bundle: Optional[ModelBundle] = None) -> List[Dict[str, float]]:
+        """Importância das features (SHAP) para todas as linhas de uma matriz normalizada"""
+        shap_values = self.compute_shap_values(X, bundle=bundle)
+        if shap_values is None:
+            # Fallback: importância uniforme
+            return [{name: 1.0 for name in self.feature_names} for _ in range(len(X))]
+        
+        magnitudes = np.abs(shap_values)
+        order = np.argsort(-magnitudes, axis=1, kind='stable')
+        
+        return [
+            {self.feature_names[j]: float(magnitudes[i, j]) for j in order[i]}
+            for i in range(len(X))
+        ]
+    
+    def compute_shap_values(self, X: np.ndarray, scaled: bool = True,
+                            bundle: Optional[ModelBundle] = None) -> Optional[np.ndarray]:
+        """
+        Valores SHAP (classe positiva) do Random Forest para uma matriz inteira
+        
+        Uma única chamada ao explicador para todas as linhas, reutilizando o
+        TreeExplainer da versão atual dos modelos.
+        
+        Args:
+            X: Matriz (n_clientes, n_features) na ordem de feature_names
+            scaled: Se X já está normalizada pelo scaler
+            bundle: Versão dos modelos a usar (padrão: a servida)
+        
+        Returns:
+            Matriz (n_clientes, n_features) ou None se não houver explicador
+        """
+        bundle = bundle or self._bundle
+        explainer = self._get_shap_explainer(bundle)
+        if explainer is None:
+            return None
+        
+        if not scaled:
+            X = bundle.scaler.transform(X)
+        
+        try:
             shap_values = explainer.shap_values(X)
-            importance = {}
-            
-            for i, name in enumerate(self.feature_names):
-                importance[name] = float(abs(shap_values[1][0][i]))
-            
-            # Ordena por importância
-            importance = dict(sorted(importance.items(), key=lambda x: x[1], reverse=True))
-            
-            return importance
-        except:
-            # Fallback: importância baseada em correlação
-            return {name: 1.0 for name in self.feature_names}
+        except Exception as e:
+            logger.warning(f"Erro ao calcular valores SHAP: {e}")
+            return None
+        
+        # Classe positiva
+        if isinstance(shap_values, list):
+            shap_values = shap_values[1]
+        elif shap_values.ndim == 3:
+            shap_values = shap_values[:, :, 1]
+        
+        return shap_values
+    
+    def _get_shap_explainer(self, bundle: Optional[ModelBundle] = None):
+        """TreeExplainer do Random Forest, construído uma vez por versão dos modelos"""
+        bundle = bundle or self._bundle
+        key = (bundle.model_version, id(bundle.models.get('random_forest')))
+        if bundle.explainers_key != key:
+            with bundle.explainers_lock:
+                if bundle.explainers_key != key:
+                    self._setup_explainability(bundle)
+        
+        churn_explainer = bundle.explainability_service.explainers.get('random_forest')
+        return churn_explainer.explainer if churn_explainer is not None else None
     
     def _get_recommendations(self, risk_probability: float, features: Dict[str, float]) -> List[str]:
         """Gera recomendações baseadas no risco e features"""
@@ -938,55 +1724,185 @@ class ChurnPredictor:
         
         return recommendations
     
-    def save_models(self, path: str):
-        """Salva os modelos treinados"""
-        Path(path).mkdir(parents=True, exist_ok=True)
+    def save_models(self, path: str, promote: bool = True) -> Path:
+        """
+        Publica os modelos treinados no registro de versões em `path`
         
-        # Salva modelos tradicionais
-        for name, model in self.models.items():
-            if name != 'neural_network':
-                model_path = Path(path) / f"{name}.pkl"
+        Os artefatos vão para um diretório imutável da versão (com manifest e
+        checksums) e só depois a versão é promovida; workers que carregam
+        `path` ao mesmo tempo nunca veem uma versão gravada pela metade.
+        
+        Returns:
+            Diretório da versão publicada
+        """
+        bundle = self._bundle
+        version = bundle.model_version or self._compute_model_version(bundle)
+        
+        registry = ModelRegistry(path)
+        version_path = registry.publish(
+            version,
+            lambda staging_path: self._write_artifacts(bundle, staging_path),
+            metadata={
+                'models': sorted(name for name, model in bundle.models.items() if model is not None),
+                'n_features': len(self.feature_names)
+            },
+            promote=promote
+        )
+        registry.prune(keep=ML_MODEL_KEEP_VERSIONS)
+        
+        logger.info(f"Modelos salvos em: {version_path}")
+        return version_path
+    
+    def _write_artifacts(self, bundle: ModelBundle, path: Path):
+        """Grava os artefatos de um bundle em um diretório"""
+        # Salva modelos tradicionais (pickle para retreino, arrays .npy para inferência em mmap)
+        for name, model in bundle.models.items():
+            if name in ('neural_network', 'ensemble'):
+                continue
+            if name in TREE_MODELS and model is not None:
+                try:
+                    NumpyTreeEnsemble.from_model(model).save(path / f"{name}.trees")
+                except ValueError as e:
+                    logger.warning(f"Modelo {name} sem exportação em arrays: {e}")
+            if not isinstance(model, NumpyTreeEnsemble):
+                model_path = path / f"{name}.pkl"
                 joblib.dump(model, model_path)
         
-        # Salva rede neural
-        nn_path = Path(path) / "neural_network"
-        self.models['neural_network'].save(nn_path)
+        # Salva rede neural (SavedModel para retreino, .npz para inferência em NumPy)
+        nn_model = bundle.models.get('neural_network')
+        if isinstance(nn_model, NumpyDenseNetwork):
+            nn_model.save(path / "neural_network.npz")
+        elif nn_model is not None:
+            nn_model.save(path / "neural_network")
+            NumpyDenseNetwork.from_keras(nn_model).save(path / "neural_network.npz")
+        
+        # Salva pesos do ensemble
+        ensemble = bundle.models.get('ensemble')
+        if isinstance(ensemble, PrefitSoftVotingEnsemble):
+            ensemble.save(path / "ensemble.json")
         
         # Salva scaler e feature names
-        scaler_path = Path(path) / "scaler.pkl"
-        joblib.dump(self.scaler, scaler_path)
+        scaler_path = path / "scaler.pkl"
+        joblib.dump(bundle.scaler, scaler_path)
         
         # Salva feature engineer
-        fe_path = Path(path) / "feature_engineer.pkl"
-        joblib.dump(self.feature_engineer, fe_path)
+        fe_path = path / "feature_engineer.pkl"
+        joblib.dump(bundle.feature_engineer, fe_path)
+        
+        # Salva versão dos modelos
+        if bundle.model_version:
+            (path / "model_version.txt").write_text(bundle.model_version)
         
-        logger.info(f"Modelos salvos em: {path}")
+    def load_models(self, path: str, version: Optional[str] = None):
+        """
+        Carrega uma versão dos modelos e passa a servi-la
     
-    def load_models(self, path: str):
-        """Carrega modelos salvos"""
-        path = Path(path)
+        Args:
+            path: Raiz do registro de modelos (ou diretório no layout antigo)
+            version: Versão a carregar (padrão: a promovida)
+        """
+        with self._load_lock:
+            registry = ModelRegistry(path)
+            artifacts_path = registry.resolve(version) if version or registry.has_versions() else None
+            if artifacts_path is None:
+                # Layout antigo: artefatos direto no diretório
+                artifacts_path = Path(path)
+            
+            bundle = self._read_artifacts(artifacts_path)
+            self.swap_bundle(bundle)
+        
+        logger.info(f"Modelos carregados de: {artifacts_path}")
+    
+    def reload_if_updated(self, path: str) -> bool:
+        """
+        Carrega a versão promovida em `path` se for diferente da servida
+        
+        Returns:
+            True se uma nova versão passou a ser servida
+        """
+        current = ModelRegistry(path).current_version()
+        if current is None or current == self.model_version:
+            return False
         
-        # Carrega modelos tradicionais
-        for name in ['random_forest', 'xgboost', 'lightgbm']:
+        self.load_models(path, current)
+        return True
+    
+    def _read_artifacts(self, path: Path) -> ModelBundle:
+        """Lê os artefatos de um diretório em um novo bundle (sem afetar o servido)"""
+        models = {}
+        
+        # Carrega modelos tradicionais (arrays em mmap dispensam xgboost/lightgbm
+        # e são compartilhados entre os workers pelo page cache)
+        for name in TREE_MODELS:
+            trees_path = path / f"{name}.trees"
             model_path = path / f"{name}.pkl"
-            if model_path.exists():
-                self.models[name] = joblib.load(model_path)
+            if ML_TREE_INFERENCE_BACKEND == "numpy" and trees_path.exists():
+                models[name] = NumpyTreeEnsemble.load(trees_path)
+            elif model_path.exists():
+                models[name] = joblib.load(model_path)
         
-        # Carrega rede neural
+        # Carrega rede neural (pesos .npz dispensam o TensorFlow na inferência)
         nn_path = path / "neural_network"
-        if nn_path.exists():
-            self.models['neural_network'] = keras.models.load_model(nn_path)
+        npz_path = path / "neural_network.npz"
+        if ML_NN_INFERENCE_BACKEND == "numpy" and npz_path.exists():
+            models['neural_network'] = NumpyDenseNetwork.load(npz_path)
+        elif nn_path.exists():
+            from tensorflow import keras
+            models['neural_network'] = keras.models.load_model(nn_path)
+        
+        # Carrega pesos do ensemble (versões antigas usam a média simples)
+        ensemble = PrefitSoftVotingEnsemble.load(path / "ensemble.json")
+        if ensemble is not None:
+            models['ensemble'] = ensemble
         
         # Carrega scaler e feature engineer
         scaler_path = path / "scaler.pkl"
-        if scaler_path.exists():
-            self.scaler = joblib.load(scaler_path)
+        scaler = joblib.load(scaler_path) if scaler_path.exists() else StandardScaler()
         
         fe_path = path / "feature_engineer.pkl"
-        if fe_path.exists():
-            self.feature_engineer = joblib.load(fe_path)
+        feature_engineer = joblib.load(fe_path) if fe_path.exists() else ChurnFeatureEngineer()
+        
+        bundle = ModelBundle(models, scaler, feature_engineer)
+        
+        version_path = path / "model_version.txt"
+        if version_path.exists():
+            bundle.model_version = version_path.read_text().strip()
+        else:
+            bundle.model_version = self._compute_model_version(bundle)
+        
+        return bundle
+        
+    def _compute_model_version(self, bundle: Optional[ModelBundle] = None) -> str:
+        """
+        Versão derivada do conteúdo dos artefatos treinados
         
-        logger.info(f"Modelos carregados de: {path}")
+        Hash dos parâmetros de cada modelo, do scaler e da ordem das features:
+        o mesmo conjunto de artefatos gera sempre a mesma versão, e qualquer
+        retreino gera uma versão nova.
+        """
+        bundle = bundle or self._bundle
+        digest = hashlib.sha256()
+        digest.update(json.dumps(self.feature_names).encode())
+        
+        for name in sorted(bundle.models):
+            model = bundle.models[name]
+            if model is None:
+                continue
+            digest.update(name.encode())
+            if name == 'neural_network':
+                for weights in model.get_weights():
+                    digest.update(np.ascontiguousarray(weights).tobytes())
+            elif isinstance(model, PrefitSoftVotingEnsemble):
+                digest.update(json.dumps(model.to_dict(), sort_keys=True).encode())
+            else:
+                digest.update(pickle.dumps(model, protocol=4))
+        
+        for attr in ('mean_', 'scale_'):
+            values = getattr(bundle.scaler, attr, None)
+            if values is not None:
+                digest.update(np.ascontiguousarray(values).tobytes())
+        
+        return digest.hexdigest()[:16]
     
     def clear_client_cache(self, cliente_id: str):
         """Limpa cache para um cliente específico"""
@@ -997,25 +1913,27 @@ class ChurnPredictor:
         """Obtém estatísticas do sistema de cache"""
         return model_cache.get_cache_stats()
     
-    def _setup_explainability(self):
-        """Configura explicabilidade para todos os modelos"""
+    def _setup_explainability(self, bundle: Optional[ModelBundle] = None):
+        """Configura explicabilidade para todos os modelos do bundle"""
+        bundle = bundle or self._bundle
         try:
             # Mapeia tipos de modelo para explicabilidade
             model_types = {
                 'random_forest': 'tree',
                 'xgboost': 'xgboost', 
                 'lightgbm': 'lightgbm',
-                'neural_network': 'neural',
-                'ensemble': 'tree'  # VotingClassifier é tratado como tree
+                'neural_network': 'neural'
             }
             
-            for model_name, model in self.models.items():
-                if model is not None:
+            for model_name, model in bundle.models.items():
+                # O ensemble só combina as saídas dos modelos base
+                if model is not None and model_name != 'ensemble':
                     model_type = model_types.get(model_name, 'tree')
-                    self.explainability_service.add_model_explainer(
+                    bundle.explainability_service.add_model_explainer(
                         model_name, model, self.feature_names, model_type
                     )
             
+            bundle.explainers_key = (bundle.model_version, id(bundle.models.get('random_forest')))
             logger.info("Sistema de explicabilidade configurado para todos os modelos")
             
         except Exception as e:
@@ -1042,9 +1960,10 @@ class ChurnPredictor:
         Returns:
             Explicação detalhada da previsão
         """
+        bundle = self._bundle
         try:
             # Extrai features
-            features = self.feature_engineer.create_features(
+            features = bundle.feature_engineer.create_features(
                 cliente_data, contrato_data, health_score_data, csat_data, evento_data
             )
             
@@ -1053,7 +1972,7 @@ class ChurnPredictor:
             X = np.array([feature_vector])
             
             # Normaliza
-            X_normalized = self.scaler.transform(X)
+            X_normalized = bundle.scaler.transform(X)
             
             # Faz previsão normal
             normal_prediction = self.predict_churn(
@@ -1061,7 +1980,7 @@ class ChurnPredictor:
             )
             
             # Explica com SHAP
-            explanation = self.explainability_service.explain_prediction(
+            explanation = bundle.explainability_service.explain_prediction(
                 model_name, X_normalized, include_text=True
             )
             
@@ -1100,17 +2019,18 @@ class ChurnPredictor:
         Returns:
             Comparação entre explicações de modelos
         """
+        bundle = self._bundle
         try:
             # Extrai e processa features
-            features = self.feature_engineer.create_features(
+            features = bundle.feature_engineer.create_features(
                 cliente_data, contrato_data, health_score_data, csat_data, evento_data
             )
             
             feature_vector = [features.get(name, 0) for name in self.feature_names]
-            X_normalized = self.scaler.transform(np.array([feature_vector]))
+            X_normalized = bundle.scaler.transform(np.array([feature_vector]))
             
             # Compara explicações entre modelos
-            comparison = self.explainability_service.compare_model_explanations(
+            comparison = bundle.explainability_service.compare_model_explanations(
                 X_normalized, models_to_compare=['random_forest', 'xgboost', 'lightgbm', 'ensemble']
             )
             
@@ -1246,15 +2166,59 @@ class ChurnPredictor:
         return '\n'.join(report)
 
 
+def train_predictor(db_session,
+                    progress: Optional[Callable[..., None]] = None,
+                    validation_split: float = 0.2) -> Tuple[ChurnPredictor, Dict[str, Any]]:
+    """
+    Treina um novo ChurnPredictor com os dados do banco
+    
+    Não publica nem afeta o predictor servido: quem chama decide se salva
+    (save_models) e troca (swap_bundle). Usado por ChurnMLService e pelos
+    jobs de treino em processo separado (ml.training_jobs).
+    
+    A matriz de treino vem do cache por snapshot dos dados
+    (ml.training_data); só é extraída e calculada se os dados mudaram.
+    
+    Args:
+        db_session: Sessão do banco
+        progress: Callback de etapas (extract, features e as de train_models)
+        validation_split: Percentual para validação
+    
+    Returns:
+        (predictor treinado, métricas por modelo)
+    """
+    from .training_data import TrainingMatrixCache
+    
+    progress = progress or _no_progress
+    trainer = ChurnPredictor()
+    trainer._initialize_models()
+    
+    matrix = TrainingMatrixCache().get_or_build(db_session, trainer, progress)
+    
+    results = trainer.train_models(matrix.X, matrix.y, validation_split=validation_split, progress=progress)
+    return trainer, results
+
+
 class ChurnMLService:
     """Serviço de ML para integração com a API"""
     
     def __init__(self, model_path: str = "models/churn"):
+        self.model_path = model_path
         self.predictor = ChurnPredictor(model_path)
-        self.is_trained = False
+        self.data_loader = ChurnDataLoader()
+        
+        # Versão publicada no registro já está pronta para servir
+        self.is_trained = ModelRegistry(model_path).current_version() is not None
+        
+        # Um treino e uma verificação de nova versão por vez
+        self._training_lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
         
         # Firebase
         try:
+            import firebase_admin
+            from firebase_admin import credentials, firestore
+            
             if not firebase_admin._apps:
                 cred = credentials.Certificate("path/to/serviceAccountKey.json")
                 firebase_admin.initialize_app(cred)
@@ -1264,32 +2228,70 @@ class ChurnMLService:
             self.db = None
     
     def train_from_database(self, db_session) -> Dict[str, float]:
-        """Treina modelos com dados do banco"""
-        # Busca dados de clientes
-        from models.cliente import Cliente
-        from models.contrato import Contrato
-        from models.health_score_snapshot import HealthScoreSnapshot
-        from models.csat_resposta import CSATResposta
-        from models.evento_cs import EventoCS
+        """
+        Treina modelos com dados do banco
         
-        clientes = db_session.query(Cliente).all()
+        O treino roda em um ChurnPredictor separado; as previsões continuam
+        com a versão atual até a nova ser publicada no registro e trocada em
+        uma única atribuição. Roda no processo atual; a API usa os jobs de
+        ml.training_jobs, que treinam em um processo separado.
+        """
+        if not self._training_lock.acquire(blocking=False):
+            logger.warning("Treinamento já em andamento - solicitação ignorada")
+            return {}
         
-        # Prepara dados para treinamento
-        training_data = []
-        for cliente in clientes:
-            cliente_dict = cliente.to_dict(include_relationships=True)
-            training_data.append(cliente_dict)
+        try:
+            trainer, results = train_predictor(db_session)
+            
+            # Publica e promove a versão; outros workers a carregam em refresh_models
+            trainer.save_models(self.model_path)
+            self.predictor.swap_bundle(trainer.bundle)
+            self.predictor.temporal_validation_results = trainer.temporal_validation_results
+            self.is_trained = True
+            
+            return results
+        finally:
+            self._training_lock.release()
+    
+    def refresh_models(self) -> bool:
+        """
+        Passa a servir a versão promovida no registro, se mudou
         
-        # Treina modelos
-        X, y = self.predictor.prepare_training_data(training_data)
-        results = self.predictor.train_models(X, y)
+        É assim que workers que não treinaram recebem a nova versão (ver
+        ml.service.get_ml_service). As previsões continuam com a versão atual
+        durante a carga.
         
-        self.is_trained = True
+        Returns:
+            True se uma nova versão foi carregada
+        """
+        if not self._refresh_lock.acquire(blocking=False):
+            return False
         
-        # Salva modelos
-        self.predictor.save_models("models/churn")
+        try:
+            if not self.predictor.reload_if_updated(self.model_path):
+                return False
+            self.is_trained = True
+            return True
+        except Exception as e:
+            logger.error(f"Erro ao carregar nova versão dos modelos: {e}")
+            return False
+        finally:
+            self._refresh_lock.release()
+    
+    def promote_version(self, version: str):
+        """Promove uma versão publicada (ex: rollback) e passa a servi-la"""
+        ModelRegistry(self.model_path).promote(version)
+        self.predictor.load_models(self.model_path, version)
+        self.is_trained = True
         
-        return results
+    def list_model_versions(self) -> Dict[str, Any]:
+        """Versões publicadas no registro e a versão servida por este processo"""
+        registry = ModelRegistry(self.model_path)
+        return {
+            "current_version": registry.current_version(),
+            "serving_version": self.predictor.model_version,
+            "versions": registry.list_versions()
+        }
     
     def predict_client_churn(self, cliente_id: str, db_session) -> Dict[str, any]:
         """Preve churn para um cliente específico"""
@@ -1331,19 +2333,99 @@ class ChurnMLService:
         
         return prediction
     
-    def get_churn_insights(self, db_session) -> Dict[str, any]:
-        """Retorna insights gerais sobre churn"""
+    def predict_clients_churn_batch(self,
+                                    cliente_ids: List[str],
+                                    db_session,
+                                    chunk_size: int = 500,
+                                    include_features: bool = True,
+                                    include_recommendations: bool = True) -> Dict[str, any]:
+        """
+        Preve churn para vários clientes, processando em blocos de chunk_size
+        
+        Cada bloco é carregado com um número fixo de queries (ChurnDataLoader),
+        independente da quantidade de clientes.
+        
+        Returns:
+            {'predictions': [...], 'failed': [ids não encontrados ou com erro]}
+        """
         if not self.is_trained:
             return {"error": "Modelos não treinados"}
         
-        # Busca todos os clientes
+        predictions = []
+        failed = []
+        
+        for start in range(0, len(cliente_ids), chunk_size):
+            chunk = cliente_ids[start:start + chunk_size]
+        
+            tables = self.data_loader.load_tables(db_session, cliente_ids=chunk)
+            found = {str(cliente_id) for cliente_id in tables['clientes']['id']}
+            failed.extend(cliente_id for cliente_id in chunk if str(cliente_id) not in found)
+        
+            try:
+                predictions.extend(self._predict_tables(
+                    tables,
+                    include_features=include_features,
+                    include_recommendations=include_recommendations
+                ))
+            except Exception as e:
+                logger.error(f"Erro na previsão em lote: {e}")
+                failed.extend(tables['clientes']['id'].tolist())
+        
+        return {"predictions": predictions, "failed": failed}
+    
+    def _predict_tables(self,
+                        tables: Dict[str, pd.DataFrame],
+                        include_features: bool = True,
+                        include_recommendations: bool = True,
+                        bundle: Optional[ModelBundle] = None) -> List[Dict[str, Any]]:
+        """Preve churn para as tabelas carregadas por ChurnDataLoader"""
+        clientes = tables['clientes']
+        if clientes.empty:
+            return []
+        
+        bundle = bundle or self.predictor.bundle
+        X = bundle.feature_engineer.create_features_batch(
+            clientes,
+            tables['contratos'],
+            tables['health_scores'],
+            tables['csat_respostas'],
+            tables['eventos']
+        )
+        
+        return self.predictor.predict_churn_matrix(
+            clientes['id'].tolist(), X,
+            include_features=include_features,
+            include_recommendations=include_recommendations,
+            bundle=bundle
+        )
+    
+    def get_churn_insights(self, db_session, live: bool = False) -> Dict[str, any]:
+        """
+        Retorna insights gerais sobre churn
+        
+        Args:
+            db_session: Sessão do banco
+            live: Se True, preve o risco dos clientes ativos na hora; senão usa
+                a tabela churn_risk_score calculada pelo job de scoring
+        """
+        if live and not self.is_trained:
+            return {"error": "Modelos não treinados"}
+        
+        from sqlalchemy import func
         from models.cliente import Cliente
-        clientes = db_session.query(Cliente).all()
+        from models.churn_risk_score import ChurnRiskScore
+        
+        # Contagem por status direto no banco
+        status_counts = dict(
+            db_session.query(Cliente.status_cliente, func.count(Cliente.id))
+            .group_by(Cliente.status_cliente)
+            .all()
+        )
         
         insights = {
-            'total_clientes': len(clientes),
-            'clientes_churn': sum(1 for c in clientes if c.status_cliente == 'churn'),
-            'clientes_ativos': sum(1 for c in clientes if c.status_cliente == 'ativo'),
+            'total_clientes': sum(status_counts.values()),
+            'clientes_churn': status_counts.get('churn', 0),
+            'clientes_ativos': status_counts.get('ativo', 0),
             'taxa_churn_atual': 0,
             'clientes_risco_alto': 0,
             'clientes_risco_medio': 0,
@@ -1356,17 +2438,330 @@ class ChurnMLService:
                 insights['clientes_churn'] / insights['total_clientes']
             ) * 100
         
-        # Analisa risco dos clientes ativos
-        for cliente in clientes:
-            if cliente.status_cliente == 'ativo':
-                prediction = self.predict_client_churn(cliente.id, db_session)
-                if 'risk_level' in prediction:
-                    risk = prediction['risk_level']
-                    if risk == 'alto' or risk == 'critico':
-                        insights['clientes_risco_alto'] += 1
-                    elif risk == 'medio':
-                        insights['clientes_risco_medio'] += 1
-                    else:
-                        insights['clientes_risco_baixo'] += 1
+        if live:
+            # Analisa risco dos clientes ativos (carregados e previstos em lote)
+            tables = self.data_loader.load_tables(db_session, status_cliente='ativo')
+            predictions = self._predict_tables(
+                tables, include_features=False, include_recommendations=False
+            )
+            risk_counts = {}
+            for prediction in predictions:
+                risk = prediction['risk_level']
+                risk_counts[risk] = risk_counts.get(risk, 0) + 1
+        else:
+            # Distribuição de risco a partir dos scores pré-calculados
+            risk_counts = dict(
+                db_session.query(ChurnRiskScore.risk_level, func.count(ChurnRiskScore.id))
+                .group_by(ChurnRiskScore.risk_level)
+                .all()
+            )
+            if not risk_counts:
+                return {"error": "Scores de risco ainda não calculados"}
+        
+        insights['clientes_risco_alto'] = risk_counts.get('alto', 0) + risk_counts.get('critico', 0)
+        insights['clientes_risco_medio'] = risk_counts.get('medio', 0)
+        insights['clientes_risco_baixo'] = risk_counts.get('baixo', 0)
+        
+        return insights
+    
+    def analyze_clients_risk(self, db_session, limit: int = 100,
+                             risk_threshold: float = 0.5) -> Dict[str, any]:
+        """
+        Analisa o risco de churn dos clientes ativos
         
-        return insights 
\ No newline at end of file
+        Args:
+            db_session: Sessão do banco
+            limit: Número máximo de clientes analisados
+            risk_threshold: Score a partir do qual o cliente é considerado de risco
+        """
+        if not self.is_trained:
+            return {"error": "Modelos não treinados"}
+        
+        tables = self.data_loader.load_tables(db_session, status_cliente='ativo', limit=limit)
+        predictions = self._predict_tables(tables, include_features=False)
+        nomes = dict(zip(tables['clientes']['id'].tolist(), tables['clientes']['nome_principal']))
+        
+        risk_analysis = []
+        for prediction in predictions:
+            features = prediction['features']
+            risk_analysis.append({
+                "cliente_id": prediction['cliente_id'],
+                "nome": nomes.get(prediction['cliente_id']),
+                "risk_level": prediction["risk_level"],
+                "risk_score": prediction["risk_score"],
+                "health_score": features.get("health_score_atual", 0),
+                "dias_vencimento": features.get("dias_vencimento_proximo", 999),
+                "csat_medio": features.get("csat_medio", 0),
+                "recommendations": prediction.get("recommendations", [])
+            })
+        
+        # Filtra por threshold de risco e ordena (maior primeiro)
+        high_risk_clients = [
+            c for c in risk_analysis
+            if c["risk_score"] >= risk_threshold
+        ]
+        high_risk_clients.sort(key=lambda x: x["risk_score"], reverse=True)
+        
+        return {
+            "total_analyzed": len(risk_analysis),
+            "high_risk_count": len(high_risk_clients),
+            "risk_threshold": risk_threshold,
+            "high_risk_clients": high_risk_clients[:50],  # Top 50
+            "risk_distribution": {
+                level: sum(1 for c in risk_analysis if c["risk_level"] == level)
+                for level in ("baixo", "medio", "alto", "critico")
+            }
+        }
+    
+    def get_stored_risk_analysis(self, db_session, limit: int = 100, offset: int = 0,
+                                 risk_threshold: float = 0.5,
+                                 risk_level: Optional[str] = None) -> Dict[str, any]:
+        """
+        Lê a análise de risco da tabela churn_risk_score, ordenada e paginada
+        
+        model_version e scored_at são os do scoring completo (a maior geração
+        gravada com um mesmo instante); re-scorings parciais posteriores, que
+        podem usar outra versão, não os alteram.
+        
+        Args:
+            db_session: Sessão do banco
+            limit: Tamanho da página
+            offset: Deslocamento da página
+            risk_threshold: Score mínimo para o cliente entrar na lista
+            risk_level: Filtra por nível de risco (baixo, medio, alto, critico)
+        """
+        from sqlalchemy import func
+        from models.cliente import Cliente
+        from models.churn_risk_score import ChurnRiskScore
+        
+        # Todas as linhas do scoring completo compartilham data_calculo
+        latest = (
+            db_session.query(ChurnRiskScore.model_version, ChurnRiskScore.data_calculo)
+            .group_by(ChurnRiskScore.model_version, ChurnRiskScore.data_calculo)
+            .order_by(func.count(ChurnRiskScore.id).desc(), ChurnRiskScore.data_calculo.desc())
+            .first()
+        )
+        if latest is None:
+            return {"error": "Scores de risco ainda não calculados"}
+        
+        query = (
+            db_session.query(ChurnRiskScore, Cliente.nome_principal)
+            .join(Cliente, Cliente.id == ChurnRiskScore.cliente_id)
+            .filter(ChurnRiskScore.risk_score >= risk_threshold)
+        )
+        if risk_level:
+            query = query.filter(ChurnRiskScore.risk_level == risk_level)
+        
+        high_risk_count = query.count()
+        rows = (
+            query.order_by(ChurnRiskScore.risk_score.desc(), ChurnRiskScore.cliente_id)
+            .offset(offset)
+            .limit(limit)
+            .all()
+        )
+        
+        risk_distribution = dict(
+            db_session.query(ChurnRiskScore.risk_level, func.count(ChurnRiskScore.id))
+            .group_by(ChurnRiskScore.risk_level)
+            .all()
+        )
+        
+        return {
+            "total_analyzed": sum(risk_distribution.values()),
+            "high_risk_count": high_risk_count,
+            "risk_threshold": risk_threshold,
+            "limit": limit,
+            "offset": offset,
+            "model_version": latest.model_version,
+            "scored_at": latest.data_calculo,
+            "high_risk_clients": [
+                {
+                    "cliente_id": score.cliente_id,
+                    "nome": nome,
+                    "risk_level": score.risk_level,
+                    "risk_score": score.risk_score,
+                    "health_score": score.health_score,
+                    "dias_vencimento": score.dias_vencimento,
+                    "csat_medio": score.csat_medio,
+                    "top_features": score.top_features or {},
+                    "recommendations": score.recommendations or []
+                }
+                for score, nome in rows
+            ],
+            "risk_distribution": {
+                level: risk_distribution.get(level, 0)
+                for level in ("baixo", "medio", "alto", "critico")
+            }
+        }
+    
+    def _score_rows(self, db_session, cliente_ids: List, chunk_size: int, top_features: int,
+                    bundle: ModelBundle, scored_at: datetime) -> Tuple[List[Dict], List]:
+        """Linhas de churn_risk_score dos clientes, calculadas em blocos com um mesmo bundle"""
+        model_version = bundle.model_version or "desconhecida"
+        rows = []
+        failed = []
+        for start in range(0, len(cliente_ids), chunk_size):
+            chunk = cliente_ids[start:start + chunk_size]
+            tables = self.data_loader.load_tables(db_session, cliente_ids=chunk)
+        
+            try:
+                predictions = self._predict_tables(tables, bundle=bundle)
+            except Exception as e:
+                logger.error(f"Erro no scoring do bloco {start}-{start + len(chunk)}: {e}")
+                failed.extend(chunk)
+                continue
+        
+            for prediction in predictions:
+                features = prediction['features']
+                rows.append({
+                    'cliente_id': prediction['cliente_id'],
+                    'risk_score': prediction['risk_score'],
+                    'risk_level': prediction['risk_level'],
+                    'top_features': dict(list(prediction['features_importance'].items())[:top_features]),
+                    'recommendations': prediction['recommendations'],
+                    'health_score': features.get('health_score_atual'),
+                    'dias_vencimento': int(features.get('dias_vencimento_proximo', 999)),
+                    'csat_medio': features.get('csat_medio'),
+                    'model_version': model_version,
+                    'data_calculo': scored_at
+                })
+        
+        return rows, failed
+    
+    @staticmethod
+    def _delete_scores(db_session, cliente_ids: List, chunk_size: int):
+        """Remove os scores dos clientes, em blocos (IN limitado por chunk_size)"""
+        from models.churn_risk_score import ChurnRiskScore
+        
+        cliente_ids = list(cliente_ids)
+        for start in range(0, len(cliente_ids), chunk_size):
+            db_session.query(ChurnRiskScore).filter(
+                ChurnRiskScore.cliente_id.in_(cliente_ids[start:start + chunk_size])
+            ).delete(synchronize_session=False)
+    
+    def score_active_clients(self, db_session, chunk_size: int = 1000,
+                             top_features: int = 5) -> Dict[str, any]:
+        """
+        Calcula o risco de todos os clientes ativos e regrava churn_risk_score
+        
+        Os scores anteriores são substituídos na mesma transação, de modo que
+        as leituras veem sempre um conjunto completo de uma única geração de modelos.
+        Clientes de blocos que falharam mantêm o score anterior até a próxima rodada.
+        
+        Args:
+            db_session: Sessão do banco
+            chunk_size: Clientes carregados e previstos por bloco
+            top_features: Quantidade de features mais relevantes guardadas por cliente
+        
+        Returns:
+            {'model_version', 'total_scored', 'failed', 'duration_seconds'}
+        """
+        if not self.is_trained:
+            return {"error": "Modelos não treinados"}
+        
+        from models.cliente import Cliente
+        from models.churn_risk_score import ChurnRiskScore
+        
+        start_time = datetime.now()
+        
+        # Uma só versão dos modelos para todo o job, mesmo que outra seja promovida
+        bundle = self.predictor.bundle
+        model_version = bundle.model_version or "desconhecida"
+        
+        cliente_ids = [
+            cliente_id for (cliente_id,) in
+            db_session.query(Cliente.id).filter(Cliente.status_cliente == 'ativo').order_by(Cliente.id).all()
+        ]
+        
+        rows, failed = self._score_rows(
+            db_session, cliente_ids, chunk_size, top_features, bundle, start_time
+        )
+        
+        # Substitui os scores em uma única transação
+        try:
+            if failed:
+                # Preserva o score anterior dos clientes cujo bloco falhou
+                mantidos = set(failed)
+                substituidos = [
+                    cliente_id for (cliente_id,) in db_session.query(ChurnRiskScore.cliente_id).all()
+                    if cliente_id not in mantidos
+                ]
+                self._delete_scores(db_session, substituidos, chunk_size)
+            else:
+                db_session.query(ChurnRiskScore).delete(synchronize_session=False)
+            db_session.bulk_insert_mappings(ChurnRiskScore, rows)
+            db_session.commit()
+        except Exception:
+            db_session.rollback()
+            raise
+        
+        duration = (datetime.now() - start_time).total_seconds()
+        logger.info(
+            f"Scoring de risco concluído: {len(rows)} clientes, {len(failed)} falhas, "
+            f"modelo {model_version}, {duration:.1f}s"
+        )
+        
+        return {
+            "model_version": model_version,
+            "total_scored": len(rows),
+            "failed": failed,
+            "duration_seconds": duration
+        }
+    
+    def rescore_clients(self, db_session, cliente_ids: List, chunk_size: int = 1000,
+                        top_features: int = 5) -> Dict[str, any]:
+        """
+        Recalcula churn_risk_score apenas dos clientes informados
+        
+        Usado após alterações nos dados de entrada dos clientes. Clientes que
+        deixaram de estar ativos têm o score removido. Carga, previsão e as
+        consultas por ID rodam em blocos de chunk_size, como no scoring completo.
+        
+        Args:
+            db_session: Sessão do banco
+            cliente_ids: Clientes alterados
+            chunk_size: Clientes carregados e previstos por bloco
+            top_features: Quantidade de features mais relevantes guardadas por cliente
+        
+        Returns:
+            {'model_version', 'total_scored', 'failed'}
+        """
+        if not self.is_trained:
+            return {"error": "Modelos não treinados"}
+        
+        from models.cliente import Cliente
+        from models.churn_risk_score import ChurnRiskScore
+        
+        bundle = self.predictor.bundle
+        model_version = bundle.model_version or "desconhecida"
+        cliente_ids = list(cliente_ids)
+        
+        ativos = [
+            cliente_id
+            for start in range(0, len(cliente_ids), chunk_size)
+            for (cliente_id,) in
+            db_session.query(Cliente.id)
+            .filter(Cliente.id.in_(cliente_ids[start:start + chunk_size]), Cliente.status_cliente == 'ativo')
+            .all()
+        ]
+        rows, failed = self._score_rows(
+            db_session, ativos, chunk_size, top_features, bundle, datetime.now()
+        )
+        
+        # Mantém o score anterior dos clientes cujo recálculo falhou
+        mantidos = set(failed)
+        substituidos = [cliente_id for cliente_id in cliente_ids if cliente_id not in mantidos]
+        
+        try:
+            self._delete_scores(db_session, substituidos, chunk_size)
+            db_session.bulk_insert_mappings(ChurnRiskScore, rows)
+            db_session.commit()
+        except Exception:
+            db_session.rollback()
+            raise
+        
+        return {
+            "model_version": model_version,
+            "total_scored": len(rows),
+            "failed": failed
+        }
@@ -0,0 +1,176 @@
+"""
+Carregamento em lote dos dados usados nas features de churn
+"""
+import pandas as pd
+from typing import Dict, List, Optional, Any
+from datetime import datetime
+import logging
+
+from sqlalchemy import exists
+
+logger = logging.getLogger(__name__)
+
+
+# Componentes avaliados no Health Score (1-5); <= 2 conta como componente baixo
+HEALTH_SCORE_COMPONENTES = [
+    'aprofundar_processos', 'interesse_genuino', 'comunicacao_ativa',
+    'clareza_objetivos', 'aceita_sugestoes', 'condicoes_financeiras',
+    'equipe_estrutura', 'maturidade_processos', 'delega_confianca', 'relacionamento'
+]
+
+
+class ChurnDataLoader:
+    """
+    Carrega clientes e relacionamentos em um número constante de queries
+
+    Em vez de buscar contratos, health scores, CSAT e eventos cliente a
+    cliente (e chamar to_dict em cada linha), faz uma query por tabela,
+    filtrando por lista de IDs (IN) ou por subquery de clientes, e devolve
+    uma tabela por entidade no formato esperado por
+    ChurnFeatureEngineer.create_features_batch.
+    """
+
+    def load_tables(self,
+                    db_session,
+                    cliente_ids: Optional[List[Any]] = None,
+                    status_cliente: Optional[str] = None,
+                    limit: Optional[int] = None,
+                    reference_date: Optional[datetime] = None) -> Dict[str, pd.DataFrame]:
+        """
+        Carrega as tabelas de um conjunto de clientes (5 queries no total)
+
+        Args:
+            db_session: Sessão SQLAlchemy
+            cliente_ids: IDs dos clientes (None = todos)
+            status_cliente: Filtra clientes por status (ex: 'ativo')
+            limit: Número máximo de clientes
+            reference_date: Data de referência dos indicadores de eventos (padrão: agora)
+
+        Returns:
+            {'clientes', 'contratos', 'health_scores', 'csat_respostas', 'eventos'}
+        """
+        from models.cliente import Cliente
+
+        query = db_session.query(
+            Cliente.id,
+            Cliente.nome_principal,
+            Cliente.status_cliente,
+            Cliente.jornada_iniciada_em,
+            Cliente.ltv_meses,
+            Cliente.ltv_valor,
+            Cliente.data_ultima_atualizacao
+        )
+        if cliente_ids is not None:
+            query = query.filter(Cliente.id.in_(cliente_ids))
+        if status_cliente is not None:
+            query = query.filter(Cliente.status_cliente == status_cliente)
+        if limit is not None:
+            query = query.order_by(Cliente.id).limit(limit)
+
+        clientes = self._to_frame(query)
+
+        # Com lista explícita ou limite, filtra relacionamentos pelos IDs
+        # já carregados; senão usa a própria query de clientes como subquery
+        if cliente_ids is not None or limit is not None:
+            client_filter = clientes['id'].tolist()
+        else:
+            client_filter = query.with_entities(Cliente.id).scalar_subquery()
+
+        return {
+            'clientes': clientes,
+            'contratos': self._load_contratos(db_session, client_filter),
+            'health_scores': self._load_health_scores(db_session, client_filter),
+            'csat_respostas': self._load_csat_respostas(db_session, client_filter),
+            'eventos': self._load_eventos(db_session, client_filter, now=reference_date)
+        }
+
+    @staticmethod
+    def _to_frame(query) -> pd.DataFrame:
+        """Executa a query e devolve um DataFrame com os nomes das colunas"""
+        columns = [description['name'] for description in query.column_descriptions]
+        return pd.DataFrame.from_records(query.all(), columns=columns)
+
+    def _load_contratos(self, db_session, client_filter) -> pd.DataFrame:
+        """Contratos dos clientes, com indicador de renovação"""
+        from models.contrato import Contrato
+        from models.renovacao import Renovacao
+
+        tem_renovacao = exists().where(Renovacao.contrato_id == Contrato.id)
+
+        query = db_session.query(
+            Contrato.cliente_id,
+            Contrato.status_contrato,
+            Contrato.valor_mensal,
+            Contrato.ciclo_atual,
+            Contrato.data_fim,
+            Contrato.auto_renovacao,
+            tem_renovacao.label('renovacoes')
+        ).filter(Contrato.cliente_id.in_(client_filter))
+
+        return self._to_frame(query)
+
+    def _load_health_scores(self, db_session, client_filter) -> pd.DataFrame:
+        """Snapshots de Health Score, com a contagem de componentes baixos"""
+        from models.health_score_snapshot import HealthScoreSnapshot
+
+        query = db_session.query(
+            HealthScoreSnapshot.id_cliente,
+            HealthScoreSnapshot.data_avaliacao,
+            HealthScoreSnapshot.health_score_total,
+            HealthScoreSnapshot.nivel_risco,
+            *[getattr(HealthScoreSnapshot, nome) for nome in HEALTH_SCORE_COMPONENTES]
+        ).filter(HealthScoreSnapshot.id_cliente.in_(client_filter))
+
+        frame = self._to_frame(query)
+
+        # Mesmo critério de HealthScoreSnapshot.componentes_baixos
+        componentes = frame[HEALTH_SCORE_COMPONENTES].apply(pd.to_numeric, errors='coerce')
+        frame['componentes_baixos'] = (componentes <= 2).sum(axis=1)
+
+        return frame.drop(columns=HEALTH_SCORE_COMPONENTES)
+
+    def _load_csat_respostas(self, db_session, client_filter) -> pd.DataFrame:
+        """Respostas CSAT, com o indicador de feedback negativo"""
+        from models.csat_resposta import CSATResposta
+
+        query = db_session.query(
+            CSATResposta.id_cliente,
+            CSATResposta.data_resposta,
+            CSATResposta.avaliacao_call,
+            CSATResposta.o_que_falta,
+            CSATResposta.comentarios_gerais
+        ).filter(CSATResposta.id_cliente.in_(client_filter))
+
+        frame = self._to_frame(query)
+
+        # Mesmo critério de CSATResposta.tem_feedback_negativo
+        avaliacao = pd.to_numeric(frame['avaliacao_call'], errors='coerce')
+        o_que_falta = frame['o_que_falta'].fillna('').astype(str).str.len() > 0
+        comentarios = frame['comentarios_gerais'].fillna('').astype(str).str.strip().str.len() > 0
+        frame['tem_feedback_negativo'] = (avaliacao <= 2) | o_que_falta | comentarios
+
+        return frame.drop(columns=['o_que_falta', 'comentarios_gerais'])
+
+    def _load_eventos(self, db_session, client_filter,
+                      now: Optional[datetime] = None) -> pd.DataFrame:
+        """Eventos CS, com os indicadores de atraso e urgência"""
+        from models.evento_cs import EventoCS
+
+        query = db_session.query(
+            EventoCS.cliente_id,
+            EventoCS.data_evento,
+            EventoCS.status
+        ).filter(EventoCS.cliente_id.in_(client_filter))
+
+        frame = self._to_frame(query)
+
+        # Mesmos critérios de EventoCS.is_atrasado e EventoCS.is_urgente
+        now = pd.Timestamp(now or datetime.now())
+        data_evento = pd.to_datetime(frame['data_evento'], errors='coerce')
+        encerrado = frame['status'].isin(['realizado', 'cancelado'])
+        dias_para_evento = (data_evento - now).dt.days
+
+        frame['is_atrasado'] = data_evento.notna() & ~encerrado & (data_evento < now)
+        frame['is_urgente'] = (dias_para_evento >= 0) & (dias_para_evento <= 3)
+
+        return frame
@@ -0,0 +1,111 @@
+"""
+Ensemble pré-treinado dos modelos de churn
+
+O ensemble não treina nada: combina as probabilidades que os modelos base
+(já treinados) produzem em uma média ponderada. Só os pesos fazem parte do
+ensemble, então ele é salvo como JSON e servido sem os modelos embutidos
+(ChurnPredictor roda cada modelo uma vez e combina as saídas).
+
+Pesos (ML_ENSEMBLE_WEIGHTING):
+    uniform   média simples, como a previsão fazia antes
+    auc       proporcionais ao ganho de AUC sobre o acaso (AUC - 0.5)
+    stacking  mínimos quadrados não negativos sobre as previsões de validação
+              (holdout ou out-of-fold da validação temporal)
+"""
+import json
+import logging
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+WEIGHTING_METHODS = ('uniform', 'auc', 'stacking')
+
+# Piso dos pesos por AUC: modelo no nível do acaso ainda entra com peso mínimo
+MIN_AUC_GAIN = 1e-3
+
+
+class PrefitSoftVotingEnsemble:
+    """Votação suave ponderada sobre modelos já treinados"""
+
+    def __init__(self, weights: Dict[str, float], method: str = 'uniform'):
+        total = sum(weights.values())
+        if not weights or total <= 0:
+            raise ValueError("Ensemble sem pesos positivos")
+        self.weights = {name: float(weight) / total for name, weight in sorted(weights.items())}
+        self.method = method
+
+    @classmethod
+    def fit(cls, predictions: Dict[str, np.ndarray], y: np.ndarray,
+            method: str = 'auc') -> "PrefitSoftVotingEnsemble":
+        """
+        Aprende os pesos a partir de previsões fora da amostra de treino
+
+        Args:
+            predictions: {modelo: probabilidades da classe positiva em y}
+            y: Rótulos verdadeiros das mesmas linhas
+            method: 'uniform', 'auc' ou 'stacking'
+        """
+        if method not in WEIGHTING_METHODS:
+            raise ValueError(f"Método de pesos desconhecido: {method}")
+
+        names = sorted(predictions)
+        if method == 'uniform' or len(np.unique(y)) < 2:
+            return cls({name: 1.0 for name in names}, 'uniform')
+
+        if method == 'stacking':
+            from scipy.optimize import nnls
+
+            P = np.column_stack([np.asarray(predictions[name], dtype=np.float64) for name in names])
+            weights, _ = nnls(P, np.asarray(y, dtype=np.float64))
+            if weights.sum() > 0:
+                return cls(dict(zip(names, weights)), 'stacking')
+            logger.warning("Stacking sem pesos positivos; usando pesos por AUC")
+
+        from sklearn.metrics import roc_auc_score
+        return cls.from_scores({name: roc_auc_score(y, predictions[name]) for name in names})
+
+    @classmethod
+    def from_scores(cls, auc_scores: Dict[str, float]) -> "PrefitSoftVotingEnsemble":
+        """Pesos proporcionais a AUC - 0.5 de cada modelo"""
+        return cls(
+            {name: max(float(auc) - 0.5, MIN_AUC_GAIN) for name, auc in auc_scores.items()},
+            'auc'
+        )
+
+    def combine(self, predictions: Dict[str, np.ndarray]) -> np.ndarray:
+        """
+        Combina as probabilidades dos modelos
+
+        Modelos sem previsão (falha ou ausentes na versão) ficam de fora e os
+        pesos dos demais são renormalizados; modelos sem peso são ignorados.
+        """
+        names = [name for name in self.weights if name in predictions]
+        if not names:
+            return np.mean(np.vstack(list(predictions.values())), axis=0)
+
+        weights = np.array([self.weights[name] for name in names])
+        if weights.sum() <= 0:
+            weights = np.ones(len(names))
+        stacked = np.vstack([np.asarray(predictions[name], dtype=np.float64) for name in names])
+        return (weights / weights.sum()) @ stacked
+
+    def to_dict(self) -> Dict[str, object]:
+        return {'method': self.method, 'weights': self.weights}
+
+    def save(self, path: Union[str, Path]):
+        Path(path).write_text(json.dumps(self.to_dict(), indent=2))
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> Optional["PrefitSoftVotingEnsemble"]:
+        path = Path(path)
+        if not path.exists():
+            return None
+        data = json.loads(path.read_text())
+        return cls(data['weights'], data.get('method', 'uniform'))
+
+    def __repr__(self) -> str:
+        weights = ', '.join(f"{name}={weight:.3f}" for name, weight in self.weights.items())
+        return f"PrefitSoftVotingEnsemble({self.method}: {weights})"
@@ -5,7 +5,6 @@ Utiliza SHAP e outras técnicas para interpretar previsões
 import numpy as np
 import pandas as pd
 from typing import Dict, List, Any, Tuple, Optional
-import shap
 from sklearn.inspection import permutation_importance
 import logging
 
@@ -38,8 +37,12 @@ class ChurnExplainer:
     def _initialize_shap_explainer(self):
         """Inicializa o explicador SHAP apropriado"""
         try:
+            import shap
+            
             if self.model_type in ['tree', 'forest', 'xgboost', 'lightgbm']:
-                self.explainer = shap.TreeExplainer(self.model)
+                # Florestas em NumPy (ml.numpy_trees) informam as árvores no formato do SHAP
+                tree_model = self.model.to_shap() if hasattr(self.model, 'to_shap') else self.model
+                self.explainer = shap.TreeExplainer(tree_model)
                 logger.info("Inicializado TreeExplainer")
                 
             elif self.model_type == 'linear':
@@ -167,6 +170,7 @@ class ChurnExplainer:
                 # Inicializa KernelExplainer para redes neurais
                 try:
                     # Usa amostra pequena do background para eficiência
+                    import shap
                     bg_sample = background_data[:100] if len(background_data) > 100 else background_data
                     self.explainer = shap.KernelExplainer(self.model.predict_proba, bg_sample)
                     logger.info("KernelExplainer inicializado para rede neural")
@@ -0,0 +1,358 @@
+"""
+Busca de hiperparâmetros com validação temporal
+
+Cada trial do Optuna treina o modelo fold a fold (na ordem do tempo) e
+reporta a métrica de cada fold; o pruner (mediana ou ASHA) interrompe trials
+que já estão perdendo depois dos primeiros folds, em vez de completar a
+validação temporal de toda combinação.
+
+O estudo fica em um arquivo SQLite local (ML_HPO_STORAGE), identificado por
+modelo, espaço de busca, métrica e splits: rodar a mesma busca de novo retoma
+o estudo e executa só os trials que faltam. Com n_jobs != 1 vários processos
+(contexto spawn, X e y em memória compartilhada) executam trials do mesmo
+estudo ao mesmo tempo, coordenados pelo SQLite.
+
+Espaço de busca (param_space):
+    lista               valores categóricos, como em ParameterGrid
+    (low, high)         inteiro ou float uniforme
+    (low, high, 'log')  inteiro ou float em escala logarítmica
+"""
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+
+from config import ML_HPO_STORAGE, ML_HPO_SAMPLER, ML_HPO_PRUNER
+
+logger = logging.getLogger(__name__)
+
+SAMPLERS = ('tpe', 'random', 'grid')
+PRUNERS = ('median', 'asha', 'none')
+
+# Segundos de espera pelo lock do SQLite com vários processos gravando trials
+SQLITE_TIMEOUT = 60
+
+# Trial sem heartbeat por esse tempo (processo morto) é marcado como falho e refeito
+HEARTBEAT_SECONDS = 30
+HEARTBEAT_GRACE_SECONDS = 120
+
+FOLD_METRICS = ('accuracy', 'precision', 'recall', 'f1', 'auc', 'churn_rate_val')
+
+
+def _storage(path: Union[str, Path]):
+    import optuna
+    from optuna.storages import RDBStorage, RetryFailedTrialCallback
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return RDBStorage(
+        url=f"sqlite:///{path}",
+        engine_kwargs={'connect_args': {'timeout': SQLITE_TIMEOUT}},
+        heartbeat_interval=HEARTBEAT_SECONDS,
+        grace_period=HEARTBEAT_GRACE_SECONDS,
+        failed_trial_callback=RetryFailedTrialCallback(max_retry=1)
+    )
+
+
+def _sampler(name: str, param_space: Dict[str, Any], seed: Optional[int]):
+    import optuna
+
+    if name == 'grid':
+        if any(not isinstance(values, list) for values in param_space.values()):
+            raise ValueError("Sampler 'grid' aceita apenas listas de valores")
+        return optuna.samplers.GridSampler(param_space, seed=seed)
+    if name == 'random':
+        return optuna.samplers.RandomSampler(seed=seed)
+    if name == 'tpe':
+        return optuna.samplers.TPESampler(seed=seed)
+    raise ValueError(f"Sampler desconhecido: {name}")
+
+
+def _pruner(name: str):
+    import optuna
+
+    if name == 'median':
+        return optuna.pruners.MedianPruner(n_startup_trials=5, n_warmup_steps=0)
+    if name == 'asha':
+        return optuna.pruners.SuccessiveHalvingPruner()
+    if name == 'none':
+        return optuna.pruners.NopPruner()
+    raise ValueError(f"Pruner desconhecido: {name}")
+
+
+def _suggest(trial, param_space: Dict[str, Any]) -> Dict[str, Any]:
+    params = {}
+    for name, values in param_space.items():
+        if isinstance(values, tuple):
+            low, high, *scale = values
+            log = scale == ['log']
+            if isinstance(low, int) and isinstance(high, int):
+                params[name] = trial.suggest_int(name, low, high, log=log)
+            else:
+                params[name] = trial.suggest_float(name, low, high, log=log)
+        else:
+            params[name] = trial.suggest_categorical(name, list(values))
+    return params
+
+
+def _finished(study) -> int:
+    from optuna.trial import TrialState
+    return len(study.get_trials(deepcopy=False, states=(TrialState.COMPLETE, TrialState.PRUNED)))
+
+
+def _optimize(study, model, X: np.ndarray, y: np.ndarray, splits: List[Dict[str, Any]],
+              param_space: Dict[str, Any], scoring: str, fit_params: Dict,
+              n_trials: int, timeout: Optional[float], store=None, resampler=None):
+    """Executa trials do estudo até o total de trials concluídos chegar a n_trials"""
+    import optuna
+    from optuna.study import MaxTrialsCallback
+    from optuna.trial import TrialState
+    from sklearn.base import clone
+    from .temporal_validation import _validate_fold
+
+    def objective(trial):
+        params = _suggest(trial, param_space)
+        model_trial = clone(model).set_params(**params)
+        key = store.key_for(params) if store is not None else None
+        trial.set_user_attr('prediction_key', key)
+
+        fold_metrics = []
+        for step, split in enumerate(splits):
+            metrics, predictions = _validate_fold(model_trial, X, y, split, fit_params, resampler)
+            if store is not None:
+                store.put(key, metrics['fold_id'], predictions, params=params)
+            fold_metrics.append({'fold_id': int(metrics['fold_id']),
+                                 **{name: float(metrics[name]) for name in FOLD_METRICS}})
+            trial.set_user_attr('fold_metrics', fold_metrics)
+
+            # Mesmo fold em todos os trials: o pruner compara trials no mesmo passo
+            trial.report(fold_metrics[-1][scoring], step)
+            if step < len(splits) - 1 and trial.should_prune():
+                raise optuna.TrialPruned()
+
+        return float(np.mean([fold[scoring] for fold in fold_metrics]))
+
+    if _finished(study) >= n_trials:
+        return
+    study.optimize(
+        objective, timeout=timeout,
+        callbacks=[MaxTrialsCallback(n_trials, states=(TrialState.COMPLETE, TrialState.PRUNED))]
+    )
+
+
+def _search_worker(worker: int, storage_path: str, study_name: str, sampler: str,
+                   pruner: str, seed: Optional[int], model, X_spec, y_spec, splits, param_space,
+                   scoring: str, fit_params: Dict, n_trials: int,
+                   timeout: Optional[float], threads: int, store=None, resampler=None):
+    """Processo do pool: executa trials do estudo compartilhado"""
+    import optuna
+    from threadpoolctl import threadpool_limits
+    from ml.parallel_training import SharedArray
+
+    optuna.logging.set_verbosity(optuna.logging.WARNING)
+    if 'n_jobs' in model.get_params():
+        model.set_params(n_jobs=threads)
+
+    study = optuna.load_study(
+        study_name=study_name, storage=_storage(storage_path),
+        # Sementes diferentes por processo para não sortearem os mesmos parâmetros
+        sampler=_sampler(sampler, param_space, None if seed is None else seed + worker),
+        pruner=_pruner(pruner)
+    )
+
+    shm_X, X = SharedArray.attach(X_spec)
+    shm_y, y = SharedArray.attach(y_spec)
+    try:
+        with threadpool_limits(limits=threads):
+            _optimize(study, model, X, y, splits, param_space, scoring, fit_params,
+                      n_trials, timeout, store, resampler)
+    finally:
+        del X, y
+        shm_X.close()
+        shm_y.close()
+
+
+class TemporalHyperparameterSearch:
+    """
+    Busca de hiperparâmetros com pruning por fold e estudo persistente
+
+    Uso:
+        search = TemporalHyperparameterSearch(n_jobs=4)
+        result = search.run(model, {'max_depth': [3, 6, 9], 'learning_rate': (0.01, 0.3, 'log')},
+                            X, y, splits, n_trials=40)
+    """
+
+    def __init__(self, storage_path: Union[str, Path] = ML_HPO_STORAGE,
+                 sampler: Optional[str] = None, pruner: str = ML_HPO_PRUNER,
+                 n_jobs: int = 1, seed: Optional[int] = 42):
+        """
+        Args:
+            storage_path: Arquivo SQLite dos estudos
+            sampler: 'tpe', 'random' ou 'grid' (padrão: 'grid' se o espaço só
+                tiver listas, como o antigo ParameterGrid, senão ML_HPO_SAMPLER)
+            pruner: 'median', 'asha' ou 'none'
+            n_jobs: Processos com trials em paralelo
+            seed: Semente do sampler
+        """
+        if sampler is not None and sampler not in SAMPLERS:
+            raise ValueError(f"Sampler desconhecido: {sampler}")
+        if pruner not in PRUNERS:
+            raise ValueError(f"Pruner desconhecido: {pruner}")
+        self.storage_path = Path(storage_path)
+        self.sampler = sampler
+        self.pruner = pruner
+        self.n_jobs = n_jobs
+        self.seed = seed
+
+    @staticmethod
+    def study_name(model, param_space: Dict[str, Any], X: np.ndarray, y: np.ndarray,
+                   splits: List[Dict[str, Any]], scoring: str) -> str:
+        """
+        Nome estável do estudo: a mesma busca retoma o mesmo estudo
+
+        Inclui os parâmetros fixos do estimador e a impressão digital dos
+        dados, para que uma busca sobre outros dados ou outra configuração
+        do modelo nunca retome um estudo antigo.
+        """
+        from sklearn.base import clone
+        from .resampling import fingerprint
+
+        key = json.dumps({
+            'model': type(model).__name__,
+            'params': clone(model).get_params(deep=False),
+            'space': param_space,
+            'scoring': scoring,
+            'data': fingerprint(np.asarray(X), np.asarray(y)),
+            'folds': [[len(split['train_idx']), len(split['val_idx'])] for split in splits]
+        }, sort_keys=True, default=str)
+        return f"{type(model).__name__}-{hashlib.sha256(key.encode()).hexdigest()[:12]}"
+
+    def run(self, model, param_space: Dict[str, Any], X: np.ndarray, y: np.ndarray,
+            splits: List[Dict[str, Any]], scoring: str = 'auc',
+            n_trials: Optional[int] = None, timeout: Optional[float] = None,
+            fit_params: Optional[Dict] = None,
+            study_name: Optional[str] = None,
+            prediction_store=None,
+            resampler=None) -> Dict[str, Any]:
+        """
+        Executa (ou retoma) a busca
+
+        Args:
+            model: Estimador scikit-learn base
+            param_space: Espaço de busca (ver docstring do módulo)
+            X, y: Dados
+            splits: Splits temporais (os folds são avaliados nessa ordem)
+            scoring: Métrica do fold a maximizar
+            n_trials: Total de trials concluídos ou podados do estudo
+                (padrão: tamanho da grade, se o espaço só tiver listas)
+            timeout: Segundos desta execução; o estudo pode ser retomado depois
+            fit_params: Parâmetros para fit
+            study_name: Nome do estudo (padrão: derivado da busca)
+            prediction_store: FoldPredictionStore para as previsões de cada
+                (parâmetros, fold); só as métricas ficam nos resultados
+            resampler: Resampler do treino de cada fold; a matriz balanceada
+                de um fold é calculada uma vez e reutilizada por todos os trials
+
+        Returns:
+            Melhores parâmetros, score e todos os trials
+        """
+        import optuna
+        from .temporal_validation import _resolve_workers
+
+        if n_trials is None:
+            if any(not isinstance(values, list) for values in param_space.values()):
+                raise ValueError("n_trials é obrigatório com intervalos no espaço de busca")
+            n_trials = int(np.prod([len(values) for values in param_space.values()]))
+
+        # Grade só de listas: busca exaustiva, cada combinação uma vez
+        grid_only = all(isinstance(values, list) for values in param_space.values())
+        sampler = self.sampler or ('grid' if grid_only else ML_HPO_SAMPLER)
+
+        fit_params = fit_params or {}
+        study_name = study_name or self.study_name(model, param_space, X, y, splits, scoring)
+        study = optuna.create_study(
+            study_name=study_name, storage=_storage(self.storage_path),
+            direction='maximize', load_if_exists=True,
+            sampler=_sampler(sampler, param_space, self.seed),
+            pruner=_pruner(self.pruner)
+        )
+
+        already = _finished(study)
+        if already:
+            logger.info(f"Retomando estudo {study_name}: {already}/{n_trials} trials concluídos")
+
+        n_workers = _resolve_workers(self.n_jobs, max(n_trials - already, 0))
+        if n_workers > 1:
+            self._run_parallel(study_name, sampler, model, X, y, splits, param_space, scoring,
+                               fit_params, n_trials, timeout, n_workers, prediction_store, resampler)
+        else:
+            _optimize(study, model, X, y, splits, param_space, scoring, fit_params,
+                      n_trials, timeout, prediction_store, resampler)
+
+        return self._summarize(optuna.load_study(study_name=study_name, storage=_storage(self.storage_path)),
+                               scoring)
+
+    def _run_parallel(self, study_name, sampler, model, X, y, splits, param_space, scoring,
+                      fit_params, n_trials, timeout, n_workers: int, prediction_store=None,
+                      resampler=None):
+        from concurrent.futures import ProcessPoolExecutor
+        from multiprocessing import get_context
+        from .parallel_training import SharedArray
+
+        threads = max(1, (os.cpu_count() or 1) // n_workers)
+        shared_X, shared_y = SharedArray(X), SharedArray(y)
+        try:
+            with ProcessPoolExecutor(max_workers=n_workers, mp_context=get_context('spawn')) as executor:
+                futures = [
+                    executor.submit(
+                        _search_worker, worker, str(self.storage_path), study_name,
+                        sampler, self.pruner, self.seed, model, shared_X.spec, shared_y.spec,
+                        splits, param_space, scoring, fit_params, n_trials, timeout, threads,
+                        prediction_store, resampler
+                    )
+                    for worker in range(n_workers)
+                ]
+                logger.info(f"Busca de hiperparâmetros {study_name}: {n_workers} processos")
+                for future in futures:
+                    future.result()
+        finally:
+            shared_X.close()
+            shared_y.close()
+
+    @staticmethod
+    def _summarize(study, scoring: str) -> Dict[str, Any]:
+        from optuna.trial import TrialState
+        from .temporal_validation import TemporalCrossValidator
+
+        validator = TemporalCrossValidator()
+        all_results = []
+        for trial in study.get_trials(deepcopy=False, states=(TrialState.COMPLETE, TrialState.PRUNED)):
+            folds = trial.user_attrs.get('fold_metrics', [])
+            scores = [fold[scoring] for fold in folds]
+            all_results.append({
+                'params': trial.params,
+                'score': trial.value if trial.state == TrialState.COMPLETE else float(np.mean(scores or [0])),
+                'score_std': float(np.std(scores)) if scores else 0.0,
+                'stability': validator._analyze_temporal_stability(folds) if folds else {},
+                'pruned': trial.state == TrialState.PRUNED,
+                'folds_evaluated': len(folds),
+                'fold_metrics': folds,
+                'prediction_key': trial.user_attrs.get('prediction_key')
+            })
+
+        # Trials completos primeiro: um podado com média parcial alta não é o melhor
+        all_results.sort(key=lambda r: (not r['pruned'], r['score']), reverse=True)
+        completed = [r for r in all_results if not r['pruned']]
+
+        return {
+            'best_params': completed[0]['params'] if completed else None,
+            'best_score': completed[0]['score'] if completed else -np.inf,
+            'all_results': all_results,
+            'n_combinations_tested': len(all_results),
+            'n_pruned': len(all_results) - len(completed),
+            'study_name': study.study_name
+        }
@@ -4,27 +4,220 @@ Sistema de Cache para Modelos de Machine Learning
 import json
 import pickle
 import logging
-from typing import Dict, Any, Optional, List
+from typing import Callable, Dict, Any, Optional, List, Tuple
 from datetime import datetime, timedelta
 from pathlib import Path
 import redis
 from redis import Redis
 import hashlib
+import threading
+import time
+import uuid
+from collections import OrderedDict
 import numpy as np
 
+from config import CACHE_TTL, CACHE_MAX_SIZE, CACHE_MAX_BYTES, CACHE_STALE_TTL, CACHE_LOCK_TIMEOUT
+from .cache_codec import (
+    FeatureVector, decode_entry, encode_entry, hash_vector, schema_id, to_vector
+)
+
 logger = logging.getLogger(__name__)
 
+# Canal Redis em que cada invalidação é publicada para os demais workers
+INVALIDATION_CHANNEL = "ml_cache:invalidations"
+
+
+class LRUCache:
+    """
+    Cache LRU em memória, limitado por número de entradas e por bytes
+    
+    Cada entrada guarda o objeto já desserializado, o tamanho estimado
+    (bytes serializados), o instante de expiração, as tags usadas para
+    invalidação em grupo e, opcionalmente, até quando ela é considerada
+    fresca (epoch; após isso é servida como "stale").
+    """
+    
+    def __init__(self, max_entries: int = CACHE_MAX_SIZE, max_bytes: int = CACHE_MAX_BYTES,
+                 ttl: int = CACHE_TTL):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._tags: Dict[str, set] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+    
+    def get(self, key: str) -> Optional[Any]:
+        """Retorna o valor e o marca como usado recentemente (None se ausente/expirado)"""
+        entry = self.get_entry(key)
+        return entry[0] if entry is not None else None
+    
+    def get_entry(self, key: str) -> Optional[Tuple[Any, Optional[float]]]:
+        """Como get, mas retorna (valor, válido até)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            
+            value, size, expires_at, _, fresh_until = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value, fresh_until
+    
+    def set(self, key: str, value: Any, size: int, ttl: Optional[int] = None,
+            tags: Optional[List[str]] = None, fresh_until: Optional[float] = None) -> bool:
+        """Armazena o valor, removendo as entradas menos usadas se passar dos limites"""
+        if size > self.max_bytes:
+            return False
+        
+        tags = tuple(tags or ())
+        
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            
+            self._entries[key] = (value, size, time.monotonic() + (ttl or self.ttl), tags, fresh_until)
+            self._bytes += size
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+        
+        return True
+    
+    def delete(self, key: str) -> bool:
+        """Remove uma entrada"""
+        with self._lock:
+            if key not in self._entries:
+                return False
+            self._remove(key)
+            return True
+    
+    def delete_tags(self, tags: List[str]) -> int:
+        """Remove todas as entradas marcadas com alguma das tags"""
+        with self._lock:
+            keys = set()
+            for tag in tags:
+                keys.update(self._tags.get(tag, ()))
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+    
+    def keys(self) -> List[str]:
+        """Chaves atuais (cópia)"""
+        with self._lock:
+            return list(self._entries.keys())
+    
+    def clear(self):
+        """Remove todas as entradas"""
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+            self._bytes = 0
+    
+    def _remove(self, key: str):
+        _, size, _, tags, _ = self._entries.pop(key)
+        self._bytes -= size
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Estatísticas do tier em memória"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'tags': len(self._tags),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
+
+
+# Remove o lock somente se o token ainda for o do chamador
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class _InflightCall:
+    """Cálculo em andamento de uma chave (resultado compartilhado com quem aguarda)"""
+    
+    __slots__ = ('event', 'result', 'error')
+    
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
 
 class ModelCache:
-    """Sistema de cache inteligente para modelos ML"""
+    """
+    Sistema de cache inteligente para modelos ML
+    
+    Dois níveis: LRU em memória no processo (rápido, limitado e com TTL curto)
+    na frente do Redis (compartilhado entre workers). Acertos no Redis são
+    promovidos para a memória.
+    
+    Entradas de features e previsões são registradas nas tags `client:{id}` e
+    `model:{versão}` (no Redis, um SET por tag), permitindo invalidar um cliente
+    ou uma geração de modelos sem varrer o keyspace.
+    
+    `get_or_compute` evita o efeito manada quando uma chave vence: apenas um
+    chamador por processo (e, com Redis, por cluster, via lock curto) calcula o
+    valor enquanto os demais aguardam o resultado. Entradas vencidas há menos
+    de `stale_ttl` segundos são servidas enquanto o recálculo roda em background.
     
-    def __init__(self, redis_url: str = "redis://localhost:6379", ttl: int = 86400):
+    Invalidações (tags ou limpeza total) são publicadas em INVALIDATION_CHANNEL;
+    cada instância assina o canal em uma thread e remove as mesmas entradas do
+    seu nível em memória, de modo que os outros workers não sirvam dados
+    invalidados. Se a assinatura cair, a defasagem fica limitada a `local_ttl`,
+    e o nível em memória é esvaziado ao reconectar (mensagens perdidas).
+    """
+    
+    def __init__(self, redis_url: str = "redis://localhost:6379", ttl: int = 86400,
+                 local_max_entries: int = CACHE_MAX_SIZE, local_max_bytes: int = CACHE_MAX_BYTES,
+                 local_ttl: int = CACHE_TTL, stale_ttl: int = CACHE_STALE_TTL,
+                 lock_timeout: int = CACHE_LOCK_TIMEOUT):
         """
         Inicializa o cache de modelos
         
         Args:
             redis_url: URL de conexão Redis
             ttl: Time to live em segundos (padrão: 24 horas)
+            local_max_entries: Máximo de entradas no cache em memória
+            local_max_bytes: Máximo de bytes no cache em memória
+            local_ttl: TTL do cache em memória quando há Redis (segundos)
+            stale_ttl: Janela em que uma entrada vencida ainda é servida (segundos)
+            lock_timeout: Espera máxima pelo cálculo de outro chamador (segundos)
         """
         self.ttl = ttl
         self.redis_client: Optional[Redis] = None
@@ -38,45 +231,314 @@ class ModelCache:
             logger.warning(f"Redis não disponível, usando cache em memória: {e}")
             self.redis_client = None
         
-        # Cache em memória como fallback
-        self._memory_cache: Dict[str, Dict[str, Any]] = {}
+        # Nível 1: LRU em memória. Sem Redis é o único nível e usa o TTL completo;
+        # com Redis o TTL curto limita a defasagem entre workers
+        self.local_ttl = local_ttl
+        self._memory_cache = LRUCache(
+            max_entries=local_max_entries,
+            max_bytes=local_max_bytes,
+            ttl=local_ttl
+        )
+        
+        # Estatísticas do nível Redis (por processo)
+        self._redis_stats = {'hits': 0, 'misses': 0, 'errors': 0, 'bytes_read': 0, 'bytes_written': 0}
+        
+        # Última versão de modelos vista (para despejo das gerações antigas)
+        self._model_version: Optional[str] = None
+        self._model_version_lock = threading.Lock()
+        
+        # Single-flight: cálculos em andamento neste processo, por chave
+        self.stale_ttl = stale_ttl
+        self.lock_timeout = lock_timeout
+        self._inflight: Dict[str, "_InflightCall"] = {}
+        self._inflight_lock = threading.Lock()
+        
+        # Invalidações entre workers: identifica as mensagens desta instância
+        self._instance_id = uuid.uuid4().hex
+        if self.redis_client:
+            threading.Thread(target=self._listen_invalidations, daemon=True).start()
     
     def _get_cache_key(self, prefix: str, identifier: str) -> str:
         """Gera chave de cache consistente"""
-        hash_obj = hashlib.md5(identifier.encode())
+        hash_obj = hashlib.md5(str(identifier).encode())
         return f"ml_cache:{prefix}:{hash_obj.hexdigest()}"
     
-    def _serialize_data(self, data: Any) -> bytes:
-        """Serializa dados para cache"""
-        import numpy as np
-        if isinstance(data, (np.ndarray, np.number)):
-            # Converte numpy para lista/float para JSON
-            if isinstance(data, np.ndarray):
-                data = data.tolist()
-            else:
-                data = float(data)
+    def _prediction_key(self, model_name: str, features_hash: str,
+                        model_version: Optional[str] = None) -> str:
+        """Chave da previsão; inclui a versão dos modelos, que muda a cada treino"""
+        self._track_model_version(model_version)
+        return self._get_cache_key("prediction", f"{model_name}:{model_version or ''}:{features_hash}")
+    
+    def _track_model_version(self, model_version: Optional[str]):
+        """
+        Registra a versão de modelos em uso e despeja a geração anterior
         
-        return pickle.dumps({
-            'data': data,
-            'timestamp': datetime.now().isoformat(),
-            'type': type(data).__name__
-        })
+        A troca é detectada na primeira previsão com a nova versão; a remoção
+        das previsões antigas (tag `model:{versão}`) roda em background, sem
+        bloquear a requisição. Com Redis, a versão corrente é compartilhada via
+        GETSET para que apenas um worker faça o despejo.
+        """
+        if not model_version or model_version == self._model_version:
+            return
+        
+        with self._model_version_lock:
+            if model_version == self._model_version:
+                return
+            previous = self._model_version
+            self._model_version = model_version
+        
+        if self.redis_client:
+            try:
+                shared = self.redis_client.getset("ml_cache:model_version", model_version)
+                previous = shared.decode() if shared else None
+            except Exception as e:
+                logger.warning(f"Erro ao registrar versão de modelos no Redis: {e}")
+        
+        if previous and previous != model_version:
+            logger.info(f"Nova versão de modelos {model_version}; despejando previsões de {previous}")
+            threading.Thread(
+                target=self.invalidate_model_cache, args=(previous,), daemon=True
+            ).start()
+    
+    def _get_tag_key(self, tag: str) -> str:
+        """Chave do SET Redis com as chaves marcadas pela tag"""
+        return f"ml_cache:tag:{tag}"
+    
+    @staticmethod
+    def _entry_tags(cliente_id: Optional[str] = None, model_version: Optional[str] = None) -> List[str]:
+        """Tags de uma entrada de features/previsão"""
+        tags = []
+        if cliente_id is not None:
+            tags.append(f"client:{cliente_id}")
+        if model_version:
+            tags.append(f"model:{model_version}")
+        return tags
+    
+    def _serialize_data(self, data: Any, tags: Optional[List[str]] = None,
+                        fresh_until: Optional[float] = None) -> bytes:
+        """Serializa dados para cache (ver ml.cache_codec)"""
+        return encode_entry(data, tags, fresh_until)
     
     def _deserialize_data(self, raw_data: bytes) -> Any:
         """Deserializa dados do cache"""
-        cache_entry = pickle.loads(raw_data)
-        return cache_entry['data']
+        return decode_entry(raw_data)['data']
     
-    def _is_expired(self, cache_entry: Dict[str, Any]) -> bool:
-        """Verifica se entrada do cache expirou"""
-        if 'timestamp' not in cache_entry:
-            return True
+    def _deserialize_entry(self, raw_data: bytes) -> Dict[str, Any]:
+        """Deserializa a entrada completa (dados e tags)"""
+        return decode_entry(raw_data)
+    
+    def _get(self, cache_key: str) -> Optional[Any]:
+        """Busca no cache em memória e, se ausente, no Redis (promovendo o acerto)"""
+        entry = self._get_entry(cache_key)
+        return entry[0] if entry is not None else None
+    
+    def _get_entry(self, cache_key: str) -> Optional[Tuple[Any, Optional[float]]]:
+        """Como _get, mas retorna (valor, válido até)"""
+        entry = self._memory_cache.get_entry(cache_key)
+        if entry is not None or not self.redis_client:
+            return entry
+        
+        try:
+            with self.redis_client.pipeline() as pipe:
+                pipe.get(cache_key)
+                pipe.ttl(cache_key)
+                raw_data, remaining_ttl = pipe.execute()
+        except Exception as e:
+            self._redis_stats['errors'] += 1
+            logger.error(f"Erro ao ler do Redis: {e}")
+            return None
+        
+        if raw_data is None:
+            self._redis_stats['misses'] += 1
+            return None
+        
+        self._redis_stats['hits'] += 1
+        self._redis_stats['bytes_read'] += len(raw_data)
+        
+        entry = self._deserialize_entry(raw_data)
+        
+        # Promove para a memória sem ultrapassar o TTL restante no Redis
+        local_ttl = min(self.local_ttl, remaining_ttl) if remaining_ttl and remaining_ttl > 0 else self.local_ttl
+        self._memory_cache.set(
+            cache_key, entry['data'], len(raw_data), local_ttl, entry['tags'], entry['fresh_until']
+        )
+        
+        return entry['data'], entry['fresh_until']
+    
+    def _set(self, cache_key: str, value: Any, ttl: Optional[int] = None,
+             tags: Optional[List[str]] = None, stale_ttl: int = 0) -> bool:
+        """
+        Grava nos dois níveis, registrando a chave nas tags
+        
+        Com `stale_ttl`, a entrada permanece armazenada por ttl + stale_ttl,
+        mas é considerada fresca apenas durante `ttl`.
+        """
+        ttl = ttl or self.ttl
+        tags = tags or []
+        fresh_until = time.time() + ttl if stale_ttl else None
+        ttl += stale_ttl
+        serialized = self._serialize_data(value, tags, fresh_until)
+        
+        if self.redis_client:
+            try:
+                with self.redis_client.pipeline() as pipe:
+                    pipe.setex(cache_key, ttl, serialized)
+                    for tag in tags:
+                        tag_key = self._get_tag_key(tag)
+                        pipe.sadd(tag_key, cache_key)
+                        # O SET vive tanto quanto a entrada mais recente
+                        pipe.expire(tag_key, ttl)
+                    pipe.execute()
+                self._redis_stats['bytes_written'] += len(serialized)
+            except Exception:
+                self._redis_stats['errors'] += 1
+                raise
+            local_ttl = min(ttl, self.local_ttl)
+        else:
+            local_ttl = ttl
+        
+        self._memory_cache.set(cache_key, value, len(serialized), local_ttl, tags, fresh_until)
+        return True
+    
+    def get_or_compute(self, cache_key: str, compute: Callable[[], Any],
+                       ttl: Optional[int] = None, tags: Optional[List[str]] = None,
+                       stale_ttl: Optional[int] = None) -> Any:
+        """
+        Retorna o valor cacheado ou o calcula uma única vez (single-flight)
+        
+        Chamadores concorrentes da mesma chave aguardam o cálculo em andamento
+        em vez de repeti-lo. Uma entrada vencida há menos de `stale_ttl`
+        segundos é retornada imediatamente e recalculada em background.
+        
+        Args:
+            cache_key: Chave do cache
+            compute: Função sem argumentos que calcula o valor
+            ttl: Tempo em que o valor é considerado fresco (padrão: self.ttl)
+            tags: Tags da entrada
+            stale_ttl: Janela de stale-while-revalidate (padrão: self.stale_ttl)
+        
+        Returns:
+            Valor cacheado ou calculado (None não é cacheado)
+        """
+        stale_ttl = self.stale_ttl if stale_ttl is None else stale_ttl
+        
+        try:
+            entry = self._get_entry(cache_key)
+        except Exception as e:
+            logger.error(f"Erro ao ler do cache: {e}")
+            entry = None
+        
+        if entry is not None:
+            value, fresh_until = entry
+            if fresh_until is not None and fresh_until <= time.time():
+                self._refresh_async(cache_key, compute, ttl, tags, stale_ttl)
+            return value
+        
+        return self._single_flight(cache_key, compute, ttl, tags, stale_ttl)
+    
+    def _single_flight(self, cache_key: str, compute: Callable[[], Any], ttl: Optional[int],
+                       tags: Optional[List[str]], stale_ttl: int, wait: bool = True) -> Any:
+        """Executa o cálculo uma vez por chave neste processo; os demais aguardam"""
+        with self._inflight_lock:
+            call = self._inflight.get(cache_key)
+            leader = call is None
+            if leader:
+                call = self._inflight[cache_key] = _InflightCall()
+        
+        if not leader:
+            if not wait:
+                return None
+            if call.event.wait(self.lock_timeout):
+                if call.error is not None:
+                    raise call.error
+                return call.result
+            # O cálculo em andamento demorou demais: calcula por conta própria
+            return compute()
+        
+        try:
+            call.result = self._compute_locked(cache_key, compute, ttl, tags, stale_ttl, wait)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            call.event.set()
+            with self._inflight_lock:
+                self._inflight.pop(cache_key, None)
+    
+    def _compute_locked(self, cache_key: str, compute: Callable[[], Any], ttl: Optional[int],
+                        tags: Optional[List[str]], stale_ttl: int, wait: bool) -> Any:
+        """Calcula e grava o valor sob o lock do Redis (se houver)"""
+        lock_key = None
+        
+        if self.redis_client:
+            lock_key = self._get_lock_key(cache_key)
+            token = uuid.uuid4().hex
+            try:
+                acquired = self.redis_client.set(lock_key, token, nx=True, ex=self.lock_timeout)
+            except Exception as e:
+                logger.warning(f"Erro ao obter lock de cálculo no Redis: {e}")
+                acquired, lock_key = True, None
+            
+            if not acquired:
+                if not wait:
+                    return None
+                # Outro worker está calculando: aguarda o resultado no cache
+                deadline = time.monotonic() + self.lock_timeout
+                while time.monotonic() < deadline:
+                    time.sleep(0.05)
+                    entry = self._get_entry(cache_key)
+                    if entry is not None and (entry[1] is None or entry[1] > time.time()):
+                        return entry[0]
+                    try:
+                        if not self.redis_client.exists(lock_key):
+                            break
+                    except Exception:
+                        break
+                lock_key = None
+        
+        try:
+            value = compute()
+            if value is not None:
+                try:
+                    self._set(cache_key, value, ttl, tags, stale_ttl)
+                except Exception as e:
+                    logger.error(f"Erro ao gravar no cache: {e}")
+            return value
+        finally:
+            if lock_key:
+                self._release_lock(lock_key, token)
+    
+    def _refresh_async(self, cache_key: str, compute: Callable[[], Any], ttl: Optional[int],
+                       tags: Optional[List[str]], stale_ttl: int):
+        """Recalcula uma entrada vencida em background (se ninguém já o faz)"""
+        if cache_key in self._inflight:
+            return
         
-        cached_time = datetime.fromisoformat(cache_entry['timestamp'])
-        return datetime.now() - cached_time > timedelta(seconds=self.ttl)
+        def refresh():
+            try:
+                self._single_flight(cache_key, compute, ttl, tags, stale_ttl, wait=False)
+            except Exception as e:
+                logger.error(f"Erro ao recalcular entrada do cache {cache_key}: {e}")
+        
+        threading.Thread(target=refresh, daemon=True).start()
+    
+    def _get_lock_key(self, cache_key: str) -> str:
+        """Chave do lock de cálculo de uma entrada"""
+        return f"ml_cache:lock:{cache_key}"
+    
+    def _release_lock(self, lock_key: str, token: str):
+        """Libera o lock apenas se ainda pertencer a este chamador"""
+        try:
+            self.redis_client.eval(_RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+        except Exception as e:
+            # O lock expira sozinho em lock_timeout
+            logger.warning(f"Erro ao liberar lock de cálculo: {e}")
     
-    def cache_model_prediction(self, model_name: str, features_hash: str, 
-                              prediction: Dict[str, Any]) -> bool:
+    def cache_model_prediction(self, model_name: str, features_hash: str,
+                              prediction: Dict[str, Any],
+                              cliente_id: Optional[str] = None,
+                              model_version: Optional[str] = None) -> bool:
         """
         Armazena previsão de modelo no cache
         
@@ -84,123 +546,147 @@ class ModelCache:
             model_name: Nome do modelo
             features_hash: Hash das features usadas
             prediction: Resultado da previsão
+            cliente_id: Cliente da previsão (tag `client:{id}`)
+            model_version: Versão dos modelos (parte da chave e tag `model:{versão}`)
         
         Returns:
             True se armazenado com sucesso
         """
-        cache_key = self._get_cache_key("prediction", f"{model_name}:{features_hash}")
+        cache_key = self._prediction_key(model_name, features_hash, model_version)
         
         try:
-            if self.redis_client:
-                serialized = self._serialize_data(prediction)
-                self.redis_client.setex(cache_key, self.ttl, serialized)
-            else:
-                # Fallback: cache em memória
-                self._memory_cache[cache_key] = {
-                    'data': prediction,
-                    'timestamp': datetime.now().isoformat()
-                }
-            
+            self._set(cache_key, prediction, tags=self._entry_tags(cliente_id, model_version))
             logger.debug(f"Previsão cacheada: {cache_key}")
             return True
-            
+        
         except Exception as e:
             logger.error(f"Erro ao cachear previsão: {e}")
             return False
     
-    def get_cached_prediction(self, model_name: str, features_hash: str) -> Optional[Dict[str, Any]]:
+    def get_cached_prediction(self, model_name: str, features_hash: str,
+                              model_version: Optional[str] = None) -> Optional[Dict[str, Any]]:
         """
         Recupera previsão do cache
         
         Args:
             model_name: Nome do modelo
             features_hash: Hash das features
-            
+            model_version: Versão dos modelos que gerou a previsão
+        
         Returns:
             Previsão cacheada ou None
         """
-        cache_key = self._get_cache_key("prediction", f"{model_name}:{features_hash}")
+        cache_key = self._prediction_key(model_name, features_hash, model_version)
         
         try:
-            if self.redis_client:
-                raw_data = self.redis_client.get(cache_key)
-                if raw_data:
-                    return self._deserialize_data(raw_data)
-            else:
-                # Fallback: cache em memória
-                if cache_key in self._memory_cache:
-                    entry = self._memory_cache[cache_key]
-                    if not self._is_expired(entry):
-                        return entry['data']
-                    else:
-                        del self._memory_cache[cache_key]
-            
-            return None
-            
+            return self._get(cache_key)
+        
         except Exception as e:
             logger.error(f"Erro ao recuperar previsão do cache: {e}")
             return None
     
-    def cache_features(self, cliente_id: str, features: Dict[str, float]) -> bool:
+    def cache_features(self, cliente_id: str, features: Dict[str, float],
+                       feature_names: Optional[List[str]] = None) -> bool:
         """
         Armazena features processadas no cache
         
         Args:
             cliente_id: ID do cliente
             features: Features calculadas
-            
+            feature_names: Ordem das features; se informada, grava o vetor
+                float32 compacto em vez do dicionário
+        
         Returns:
             True se armazenado com sucesso
         """
         cache_key = self._get_cache_key("features", cliente_id)
         
         try:
-            if self.redis_client:
-                serialized = self._serialize_data(features)
-                self.redis_client.setex(cache_key, self.ttl, serialized)
-            else:
-                self._memory_cache[cache_key] = {
-                    'data': features,
-                    'timestamp': datetime.now().isoformat()
-                }
-            
-            return True
-            
+            if feature_names is not None:
+                features = FeatureVector(schema_id(feature_names), to_vector(features, feature_names))
+            return self._set(cache_key, features, tags=self._entry_tags(cliente_id))
+        
         except Exception as e:
             logger.error(f"Erro ao cachear features: {e}")
             return False
     
-    def get_cached_features(self, cliente_id: str) -> Optional[Dict[str, float]]:
+    def get_cached_features(self, cliente_id: str,
+                            feature_names: Optional[List[str]] = None) -> Optional[Dict[str, float]]:
         """
         Recupera features do cache
         
         Args:
             cliente_id: ID do cliente
-            
+            feature_names: Ordem das features usada na gravação do vetor
+        
         Returns:
-            Features cacheadas ou None
+            Features cacheadas ou None (também se o vetor foi gravado com
+            outra lista de features)
         """
         cache_key = self._get_cache_key("features", cliente_id)
         
         try:
-            if self.redis_client:
-                raw_data = self.redis_client.get(cache_key)
-                if raw_data:
-                    return self._deserialize_data(raw_data)
-            else:
-                if cache_key in self._memory_cache:
-                    entry = self._memory_cache[cache_key]
-                    if not self._is_expired(entry):
-                        return entry['data']
-                    else:
-                        del self._memory_cache[cache_key]
-            
-            return None
-            
+            cached = self._get(cache_key)
+            if not isinstance(cached, FeatureVector):
+                return cached
+            if feature_names is None or cached.schema != schema_id(feature_names):
+                return None
+            return dict(zip(feature_names, cached.values.tolist()))
+        
         except Exception as e:
             logger.error(f"Erro ao recuperar features do cache: {e}")
             return None
     
+    def get_or_compute_features(self, cliente_id: str, compute: Callable[[], Dict[str, float]],
+                                feature_names: List[str]) -> Dict[str, float]:
+        """
+        Features do cliente a partir do cache ou calculadas uma única vez
+        
+        Args:
+            cliente_id: ID do cliente
+            compute: Função que calcula o dicionário de features
+            feature_names: Ordem das features do vetor cacheado
+        
+        Returns:
+            Features (valores float32, iguais em acerto e em cálculo)
+        """
+        cache_key = self._get_cache_key("features", cliente_id)
+        schema = schema_id(feature_names)
+        
+        def compute_vector():
+            return FeatureVector(schema, to_vector(compute(), feature_names))
+        
+        cached = self.get_or_compute(cache_key, compute_vector, tags=self._entry_tags(cliente_id))
+        if isinstance(cached, FeatureVector) and cached.schema == schema:
+            return dict(zip(feature_names, cached.values.tolist()))
+        
+        # Entrada gravada com outra lista de features: recalcula e sobrescreve
+        features = compute()
+        self.cache_features(cliente_id, features, feature_names)
+        return features
+    
+    def get_or_compute_prediction(self, model_name: str, features_hash: str,
+                                  compute: Callable[[], Dict[str, Any]],
+                                  cliente_id: Optional[str] = None,
+                                  model_version: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Previsão a partir do cache ou calculada uma única vez
+        
+        Args:
+            model_name: Nome do modelo
+            features_hash: Hash das features
+            compute: Função que calcula a previsão
+            cliente_id: Cliente da previsão (tag `client:{id}`)
+            model_version: Versão dos modelos (parte da chave e tag `model:{versão}`)
+        
+        Returns:
+            Previsão
+        """
+        cache_key = self._prediction_key(model_name, features_hash, model_version)
+        return self.get_or_compute(
+            cache_key, compute, tags=self._entry_tags(cliente_id, model_version)
+        )
+    
     def cache_model_metrics(self, model_name: str, metrics: Dict[str, float]) -> bool:
         """
         Armazena métricas de modelo no cache
@@ -208,25 +694,16 @@ class ModelCache:
         Args:
             model_name: Nome do modelo
             metrics: Métricas do modelo
-            
+        
         Returns:
             True se armazenado com sucesso
         """
         cache_key = self._get_cache_key("metrics", model_name)
         
         try:
-            if self.redis_client:
-                serialized = self._serialize_data(metrics)
-                # Métricas têm TTL maior (7 dias)
-                self.redis_client.setex(cache_key, 7 * 24 * 3600, serialized)
-            else:
-                self._memory_cache[cache_key] = {
-                    'data': metrics,
-                    'timestamp': datetime.now().isoformat()
-                }
-            
-            return True
-            
+            # Métricas têm TTL maior (7 dias)
+            return self._set(cache_key, metrics, ttl=7 * 24 * 3600)
+        
         except Exception as e:
             logger.error(f"Erro ao cachear métricas: {e}")
             return False
@@ -237,70 +714,159 @@ class ModelCache:
         
         Args:
             model_name: Nome do modelo
-            
+        
         Returns:
             Métricas cacheadas ou None
         """
         cache_key = self._get_cache_key("metrics", model_name)
         
         try:
-            if self.redis_client:
-                raw_data = self.redis_client.get(cache_key)
-                if raw_data:
-                    return self._deserialize_data(raw_data)
-            else:
-                if cache_key in self._memory_cache:
-                    entry = self._memory_cache[cache_key]
-                    # Para métricas, TTL de 7 dias
-                    if datetime.now() - datetime.fromisoformat(entry['timestamp']) < timedelta(days=7):
-                        return entry['data']
-                    else:
-                        del self._memory_cache[cache_key]
-            
-            return None
-            
+            return self._get(cache_key)
+        
         except Exception as e:
             logger.error(f"Erro ao recuperar métricas do cache: {e}")
             return None
     
+    def invalidate_tags(self, tags: List[str]) -> int:
+        """
+        Remove todas as entradas registradas nas tags informadas
+        
+        No Redis, lê os SETs das tags e apaga as chaves em um pipeline, sem
+        varrer o keyspace (custo proporcional às entradas das tags).
+        
+        Args:
+            tags: Tags a invalidar (ex: ["client:123", "model:abc"])
+        
+        Returns:
+            Número de chaves removidas
+        """
+        removed = self._memory_cache.delete_tags(tags)
+        
+        if self.redis_client:
+            tag_keys = [self._get_tag_key(tag) for tag in tags]
+        
+            with self.redis_client.pipeline() as pipe:
+                for tag_key in tag_keys:
+                    pipe.smembers(tag_key)
+                members = set().union(*pipe.execute())
+        
+            with self.redis_client.pipeline() as pipe:
+                member_list = list(members)
+                for start in range(0, len(member_list), 500):
+                    pipe.delete(*member_list[start:start + 500])
+                pipe.delete(*tag_keys)
+                pipe.execute()
+        
+            removed = max(removed, len(members))
+            self._publish_invalidation(tags=list(tags))
+        
+        return removed
+    
+    def _publish_invalidation(self, tags: Optional[List[str]] = None):
+        """Avisa os demais workers da invalidação (tags, ou tudo se None)"""
+        message = json.dumps({'origin': self._instance_id, 'tags': tags})
+        try:
+            self.redis_client.publish(INVALIDATION_CHANNEL, message)
+        except Exception as e:
+            logger.warning(f"Erro ao publicar invalidação do cache: {e}")
+    
+    def _apply_invalidation(self, raw_message) -> int:
+        """Aplica no nível em memória uma invalidação publicada por outra instância"""
+        message = json.loads(raw_message)
+        if message.get('origin') == self._instance_id:
+            return 0
+        if message.get('tags') is None:
+            removed = len(self._memory_cache)
+            self._memory_cache.clear()
+            return removed
+        return self._memory_cache.delete_tags(message['tags'])
+    
+    def _listen_invalidations(self):
+        """Assina INVALIDATION_CHANNEL (thread daemon), reconectando após falhas"""
+        subscribed_before = False
+        while True:
+            try:
+                pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(INVALIDATION_CHANNEL)
+                if subscribed_before:
+                    # Invalidações podem ter sido perdidas enquanto desconectado
+                    self._memory_cache.clear()
+                subscribed_before = True
+                for message in pubsub.listen():
+                    if message.get('type') != 'message':
+                        continue
+                    try:
+                        self._apply_invalidation(message['data'])
+                    except (ValueError, KeyError, TypeError) as e:
+                        logger.warning(f"Mensagem de invalidação inválida: {e}")
+            except Exception as e:
+                logger.warning(f"Assinatura de invalidações do cache interrompida: {e}")
+                time.sleep(1)
+    
     def invalidate_client_cache(self, cliente_id: str) -> bool:
         """
         Invalida cache relacionado a um cliente específico
         
         Args:
             cliente_id: ID do cliente
-            
+        
         Returns:
             True se invalidado com sucesso
         """
         try:
-            patterns_to_clear = [
-                f"features:{cliente_id}",
-                f"prediction:*:{cliente_id}*"
-            ]
-            
-            if self.redis_client:
-                for pattern in patterns_to_clear:
-                    cache_key = self._get_cache_key("*", pattern)
-                    keys = self.redis_client.keys(cache_key.replace("*", ""))
-                    if keys:
-                        self.redis_client.delete(*keys)
-            else:
-                # Para cache em memória, remove chaves que contenham o cliente_id
-                keys_to_remove = [
-                    k for k in self._memory_cache.keys() 
-                    if cliente_id in k
-                ]
-                for key in keys_to_remove:
-                    del self._memory_cache[key]
-            
-            logger.info(f"Cache invalidado para cliente: {cliente_id}")
+            removed = self.invalidate_tags([f"client:{cliente_id}"])
+        
+            logger.info(f"Cache invalidado para cliente: {cliente_id} ({removed} entradas)")
             return True
-            
+        
+        except Exception as e:
+            logger.error(f"Erro ao invalidar cache: {e}")
+            return False
+    
+    def invalidate_clients_cache(self, cliente_ids: List[str]) -> bool:
+        """
+        Invalida o cache de vários clientes em uma única operação
+        
+        Args:
+            cliente_ids: IDs dos clientes
+        
+        Returns:
+            True se invalidado com sucesso
+        """
+        try:
+            removed = self.invalidate_tags([f"client:{cliente_id}" for cliente_id in cliente_ids])
+        
+            logger.info(f"Cache invalidado para {len(cliente_ids)} clientes ({removed} entradas)")
+            return True
+        
+        except Exception as e:
+            logger.error(f"Erro ao invalidar cache: {e}")
+            return False
+    
+    def invalidate_model_cache(self, model_version: str) -> bool:
+        """
+        Invalida as previsões de uma versão de modelos
+        
+        Args:
+            model_version: Versão dos modelos
+        
+        Returns:
+            True se invalidado com sucesso
+        """
+        try:
+            removed = self.invalidate_tags([f"model:{model_version}"])
+        
+            logger.info(f"Cache invalidado para modelo: {model_version} ({removed} entradas)")
+            return True
+        
         except Exception as e:
             logger.error(f"Erro ao invalidar cache: {e}")
             return False
     
+    def _scan_keys(self, pattern: str = "ml_cache:*"):
+        """Itera as chaves do Redis com SCAN (não bloqueia o servidor como KEYS)"""
+        return self.redis_client.scan_iter(match=pattern, count=1000)
+    
     def clear_all_cache(self) -> bool:
         """
         Limpa todo o cache ML
@@ -310,15 +876,21 @@ class ModelCache:
         """
         try:
             if self.redis_client:
-                keys = self.redis_client.keys("ml_cache:*")
-                if keys:
-                    self.redis_client.delete(*keys)
-            else:
-                self._memory_cache.clear()
-            
+                batch = []
+                for key in self._scan_keys():
+                    batch.append(key)
+                    if len(batch) >= 500:
+                        self.redis_client.delete(*batch)
+                        batch = []
+                if batch:
+                    self.redis_client.delete(*batch)
+                self._publish_invalidation()
+        
+            self._memory_cache.clear()
+        
             logger.info("Cache ML limpo completamente")
             return True
-            
+        
         except Exception as e:
             logger.error(f"Erro ao limpar cache: {e}")
             return False
@@ -328,34 +900,50 @@ class ModelCache:
         Obtém estatísticas do cache
         
         Returns:
-            Estatísticas do cache
+            Estatísticas do cache (gerais e por nível)
         """
         try:
+            memory_stats = self._memory_cache.get_stats()
+        
             stats = {
                 'cache_type': 'redis' if self.redis_client else 'memory',
                 'ttl_seconds': self.ttl,
-                'connected': True
+                'connected': True,
+                'tiers': {'memory': memory_stats}
             }
-            
+        
             if self.redis_client:
-                # Estatísticas do Redis
+                # Estatísticas do Redis (contagem via SCAN)
                 info = self.redis_client.info()
-                ml_keys = self.redis_client.keys("ml_cache:*")
-                
+                total_keys = 0
+                total_tags = 0
+                for key in self._scan_keys():
+                    if key.startswith(b"ml_cache:tag:"):
+                        total_tags += 1
+                    else:
+                        total_keys += 1
+        
                 stats.update({
-                    'total_ml_keys': len(ml_keys),
+                    'total_ml_keys': total_keys,
                     'memory_usage': info.get('used_memory_human', 'N/A'),
                     'connected_clients': info.get('connected_clients', 0)
                 })
+                stats['tiers']['redis'] = {
+                    **self._redis_stats,
+                    'entries': total_keys,
+                    'tags': total_tags,
+                    'bytes': info.get('used_memory', 0),
+                    'evictions': info.get('evicted_keys', 0)
+                }
             else:
                 # Estatísticas do cache em memória
                 stats.update({
-                    'total_ml_keys': len(self._memory_cache),
-                    'memory_usage': f"{len(str(self._memory_cache))} chars"
+                    'total_ml_keys': memory_stats['entries'],
+                    'memory_usage': f"{memory_stats['bytes']} bytes"
                 })
-            
+        
             return stats
-            
+        
         except Exception as e:
             logger.error(f"Erro ao obter estatísticas: {e}")
             return {
@@ -364,20 +952,21 @@ class ModelCache:
                 'error': str(e)
             }
     
-    def create_features_hash(self, features: Dict[str, float]) -> str:
+    def create_features_hash(self, features: Dict[str, float],
+                             feature_names: Optional[List[str]] = None) -> str:
         """
         Cria hash único para um conjunto de features
         
         Args:
             features: Dicionário de features
+            feature_names: Ordem das features (padrão: nomes ordenados)
             
         Returns:
-            Hash MD5 das features
+            Hash não criptográfico (64 bits) do vetor float32 das features
         """
-        # Ordena as features para hash consistente
-        sorted_features = dict(sorted(features.items()))
-        features_str = json.dumps(sorted_features, sort_keys=True)
-        return hashlib.md5(features_str.encode()).hexdigest()
+        if feature_names is None:
+            feature_names = sorted(features)
+        return hash_vector(to_vector(features, feature_names))
 
 
 # Instância global do cache
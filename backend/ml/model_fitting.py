@@ -0,0 +1,208 @@
+"""
+Treino de um modelo base com early stopping e prazo
+
+Usado tanto no treino sequencial (ChurnPredictor) quanto nos processos de
+ml.parallel_training, para que os dois caminhos parem pelos mesmos critérios:
+
+    xgboost / lightgbm   early stopping pela AUC no conjunto de validação
+                         (ML_EARLY_STOPPING_ROUNDS rodadas sem melhora)
+    neural_network       EarlyStopping do Keras em val_auc, com os melhores pesos
+    random_forest        árvores adicionadas em blocos (warm_start), o que
+                         permite parar entre blocos quando o prazo acaba
+
+O prazo (`deadline`, em time.time()) vale para o treino inteiro: ao ser
+atingido cada modelo para na próxima iteração, época ou bloco, mantendo o que
+já treinou. Cada chamada retorna as iterações usadas, o motivo da parada e o
+tempo gasto.
+"""
+import math
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config import ML_EARLY_STOPPING_ROUNDS, ML_NN_EARLY_STOPPING_PATIENCE
+
+# Blocos de árvores do Random Forest entre verificações do prazo
+FOREST_CHUNKS = 10
+
+
+def expired(deadline: Optional[float]) -> bool:
+    return deadline is not None and time.time() >= deadline
+
+
+def fit_model(name: str, model, X: np.ndarray, y: np.ndarray,
+              eval_set: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+              deadline: Optional[float] = None,
+              nn_fit_kwargs: Optional[Dict[str, Any]] = None,
+              callbacks: Optional[List[Any]] = None,
+              sample_weight: Optional[np.ndarray] = None) -> Dict[str, Any]:
+    """
+    Treina um modelo base no lugar
+
+    Args:
+        name: Nome do modelo em ChurnPredictor.models
+        model: Estimador (ou rede Keras) ainda não treinado
+        X, y: Dados de treino
+        eval_set: (X_val, y_val) para early stopping dos boosters
+        deadline: Instante (time.time()) em que o treino deve parar
+        nn_fit_kwargs: Argumentos de fit da rede neural (épocas, validação...)
+        callbacks: Callbacks Keras adicionais (progresso por época)
+        sample_weight: Pesos por amostra (balanceamento 'class_weight', ver
+            ml.resampling); ignorados por modelos que já usam class_weight
+
+    Returns:
+        {'iterations', 'max_iterations', 'stopped', 'training_seconds'}; stopped
+        é 'early_stopping', 'time_budget' ou None
+    """
+    from .resampling import sample_weight_for
+
+    start = time.perf_counter()
+    weights = {}
+    if sample_weight_for(model, sample_weight) is not None:
+        weights = {'sample_weight': sample_weight}
+
+    if name == 'neural_network':
+        info = _fit_neural_network(model, X, y, deadline, {**(nn_fit_kwargs or {}), **weights},
+                                   callbacks or [])
+    elif name == 'xgboost':
+        info = _fit_xgboost(model, X, y, eval_set, deadline, weights)
+    elif name == 'lightgbm':
+        info = _fit_lightgbm(model, X, y, eval_set, deadline, weights)
+    elif hasattr(model, 'warm_start') and hasattr(model, 'n_estimators'):
+        info = _fit_forest(model, X, y, deadline, weights)
+    else:
+        model.fit(X, y, **weights)
+        info = {'iterations': None, 'max_iterations': None, 'stopped': None}
+
+    info['training_seconds'] = round(time.perf_counter() - start, 3)
+    return info
+
+
+def _stop_reason(iterations: int, max_iterations: int, deadline: Optional[float],
+                 early_stopped: bool) -> Optional[str]:
+    if iterations >= max_iterations:
+        return None
+    if early_stopped:
+        return 'early_stopping'
+    return 'time_budget' if expired(deadline) else None
+
+
+def _fit_xgboost(model, X, y, eval_set, deadline, weights) -> Dict[str, Any]:
+    import xgboost as xgb
+
+    class DeadlineCallback(xgb.callback.TrainingCallback):
+        def after_iteration(self, booster, epoch, evals_log):
+            return expired(deadline)
+
+    original = model.get_params()
+    overrides = {'callbacks': [DeadlineCallback()]}
+    fit_kwargs = {}
+    if eval_set is not None:
+        overrides.update(early_stopping_rounds=ML_EARLY_STOPPING_ROUNDS, eval_metric='auc')
+        fit_kwargs = {'eval_set': [eval_set], 'verbose': False}
+
+    model.set_params(**overrides)
+    try:
+        model.fit(X, y, **fit_kwargs, **weights)
+    finally:
+        # O modelo salvo não guarda callbacks nem exige conjunto de validação
+        model.set_params(**{key: original[key] for key in overrides})
+
+    booster = model.get_booster()
+    rounds = booster.num_boosted_rounds()
+    best_iteration = booster.attr('best_iteration')
+    iterations = int(best_iteration) + 1 if best_iteration is not None else rounds
+    max_iterations = original['n_estimators']
+    return {
+        'iterations': iterations,
+        'max_iterations': max_iterations,
+        'stopped': _stop_reason(rounds, max_iterations, deadline,
+                                eval_set is not None and not expired(deadline))
+    }
+
+
+def _fit_lightgbm(model, X, y, eval_set, deadline, weights) -> Dict[str, Any]:
+    import lightgbm as lgb
+
+    def deadline_callback(env):
+        if expired(deadline):
+            raise lgb.callback.EarlyStopException(env.iteration, env.evaluation_result_list or [])
+
+    callbacks = [deadline_callback]
+    fit_kwargs = {}
+    if eval_set is not None:
+        callbacks.insert(0, lgb.early_stopping(ML_EARLY_STOPPING_ROUNDS, verbose=False))
+        fit_kwargs = {'eval_set': [eval_set], 'eval_metric': 'auc'}
+
+    model.fit(X, y, callbacks=callbacks, **fit_kwargs, **weights)
+
+    rounds = model.booster_.current_iteration()
+    iterations = model.best_iteration_ or rounds
+    max_iterations = model.get_params()['n_estimators']
+    return {
+        'iterations': iterations,
+        'max_iterations': max_iterations,
+        'stopped': _stop_reason(rounds, max_iterations, deadline,
+                                eval_set is not None and not expired(deadline))
+    }
+
+
+def _fit_forest(model, X, y, deadline, weights) -> Dict[str, Any]:
+    """
+    Random Forest em blocos; mesmo resultado de um fit único com o mesmo random_state
+
+    O primeiro bloco é treinado sem warm_start, descartando árvores de um
+    treino anterior. O modelo mantém n_estimators e warm_start originais (um
+    novo treino volta a usar o teto completo); as árvores realmente
+    treinadas ficam só na info retornada.
+    """
+    max_iterations = model.n_estimators
+    warm_start = model.warm_start
+    chunk = max(1, math.ceil(max_iterations / FOREST_CHUNKS))
+
+    n_trees = 0
+    try:
+        while n_trees < max_iterations:
+            n_trees = min(n_trees + chunk, max_iterations)
+            model.set_params(n_estimators=n_trees, warm_start=n_trees > chunk)
+            model.fit(X, y, **weights)
+            if expired(deadline):
+                break
+    finally:
+        model.set_params(n_estimators=max_iterations, warm_start=warm_start)
+
+    return {
+        'iterations': n_trees,
+        'max_iterations': max_iterations,
+        'stopped': _stop_reason(n_trees, max_iterations, deadline, False)
+    }
+
+
+def _fit_neural_network(model, X, y, deadline, fit_kwargs, callbacks) -> Dict[str, Any]:
+    from tensorflow import keras
+
+    class DeadlineCallback(keras.callbacks.Callback):
+        def on_epoch_end(self, epoch, logs=None):
+            if expired(deadline):
+                self.model.stop_training = True
+
+    callbacks = list(callbacks) + [DeadlineCallback()]
+    early_stopping = None
+    if 'validation_data' in fit_kwargs or fit_kwargs.get('validation_split'):
+        early_stopping = keras.callbacks.EarlyStopping(
+            monitor='val_auc', mode='max', patience=ML_NN_EARLY_STOPPING_PATIENCE,
+            restore_best_weights=True
+        )
+        callbacks.append(early_stopping)
+
+    history = model.fit(X, y, callbacks=callbacks, **fit_kwargs)
+
+    epochs = len(history.epoch)
+    max_epochs = fit_kwargs.get('epochs', 1)
+    return {
+        'iterations': epochs,
+        'max_iterations': max_epochs,
+        'stopped': _stop_reason(epochs, max_epochs, deadline,
+                                early_stopping is not None and early_stopping.stopped_epoch > 0)
+    }
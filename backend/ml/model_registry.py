@@ -0,0 +1,264 @@
+"""
+Registro versionado dos artefatos de churn
+
+Cada treino é gravado em um diretório imutável `versions/<versão>`, com um
+manifest.json que lista os arquivos, seus tamanhos e SHA-256. A versão servida
+é indicada pelo arquivo CURRENT, trocado com os.replace: quem lê o ponteiro vê
+a versão anterior ou a nova, nunca artefatos de gerações diferentes misturados.
+
+Layout:
+    models/churn/
+        CURRENT                   versão promovida (ex: "3f2a9c1d0e4b5a67")
+        versions/
+            3f2a9c1d0e4b5a67/
+                manifest.json
+                random_forest.pkl, scaler.pkl, neural_network.npz, ...
+
+Diretórios no layout antigo (artefatos direto em models/churn, sem CURRENT)
+continuam sendo carregados por ChurnPredictor.load_models.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = "manifest.json"
+CURRENT_FILE = "CURRENT"
+VERSIONS_DIR = "versions"
+
+# Diretórios de publicação mais antigos que isso são restos de falhas
+STALE_STAGING_SECONDS = 24 * 3600
+
+
+def _file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _fsync_dir(path: Path):
+    """Persiste entradas de diretório (rename/replace) no disco, onde suportado"""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class ModelRegistry:
+    """
+    Publicação, promoção e leitura de versões de modelos em um diretório
+    
+    Uso:
+        registry = ModelRegistry("models/churn")
+        registry.publish(version, lambda staging_dir: salvar_artefatos(staging_dir))
+        path = registry.resolve()   # diretório da versão promovida, verificado
+    """
+    
+    def __init__(self, root: Union[str, Path]):
+        self.root = Path(root)
+        self.versions_dir = self.root / VERSIONS_DIR
+        self.current_file = self.root / CURRENT_FILE
+    
+    def version_path(self, version: str) -> Path:
+        if not version or '/' in version or '\\' in version or version.startswith('.'):
+            raise ValueError(f"Versão de modelos inválida: {version!r}")
+        return self.versions_dir / version
+    
+    def has_versions(self) -> bool:
+        return self.current_file.exists()
+    
+    def current_version(self) -> Optional[str]:
+        """Versão promovida, ou None se o registro ainda não tem versões"""
+        try:
+            return self.current_file.read_text().strip() or None
+        except FileNotFoundError:
+            return None
+    
+    def publish(self,
+                version: str,
+                write_artifacts: Callable[[Path], None],
+                metadata: Optional[Dict[str, Any]] = None,
+                promote: bool = True) -> Path:
+        """
+        Grava uma nova versão e, opcionalmente, a promove
+        
+        Os artefatos são escritos em um diretório temporário dentro de
+        versions/ e renomeados para o nome da versão só depois do manifest,
+        de modo que versions/<versão> sempre contém uma versão completa.
+        
+        Args:
+            version: Identificador da versão (ChurnPredictor.model_version)
+            write_artifacts: Grava os artefatos no diretório recebido
+            metadata: Informações extras registradas no manifest
+            promote: Se aponta CURRENT para a nova versão
+        
+        Returns:
+            Diretório da versão publicada
+        """
+        target = self.version_path(version)
+        if target.exists():
+            # Mesmo conteúdo (a versão é um hash dos artefatos): nada a gravar
+            logger.info(f"Versão de modelos {version} já publicada")
+        else:
+            self.versions_dir.mkdir(parents=True, exist_ok=True)
+            staging = self.versions_dir / f".staging-{version}-{uuid.uuid4().hex[:8]}"
+            staging.mkdir()
+            try:
+                write_artifacts(staging)
+                self._write_manifest(staging, version, metadata or {})
+                _fsync_dir(staging)
+                try:
+                    os.rename(staging, target)
+                except OSError:
+                    if not target.exists():
+                        raise
+                    # Outro processo publicou a mesma versão primeiro
+                    shutil.rmtree(staging, ignore_errors=True)
+                _fsync_dir(self.versions_dir)
+            except Exception:
+                shutil.rmtree(staging, ignore_errors=True)
+                raise
+            logger.info(f"Versão de modelos {version} publicada em {target}")
+        
+        if promote:
+            self.promote(version)
+        
+        return target
+    
+    def promote(self, version: str):
+        """Aponta CURRENT para uma versão publicada (troca atômica)"""
+        self.verify(version)
+        
+        tmp = self.root / f".{CURRENT_FILE}.{uuid.uuid4().hex[:8]}"
+        with open(tmp, 'w') as f:
+            f.write(version)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.current_file)
+        _fsync_dir(self.root)
+        
+        logger.info(f"Versão de modelos {version} promovida")
+    
+    def resolve(self, version: Optional[str] = None, verify: bool = True) -> Optional[Path]:
+        """
+        Diretório de uma versão (padrão: a promovida)
+        
+        Returns:
+            Caminho da versão, ou None se não há versão promovida
+        
+        Raises:
+            FileNotFoundError / ValueError: versão inexistente ou corrompida
+        """
+        version = version or self.current_version()
+        if version is None:
+            return None
+        
+        if verify:
+            self.verify(version)
+        elif not self.version_path(version).exists():
+            raise FileNotFoundError(f"Versão de modelos {version} não encontrada")
+        
+        return self.version_path(version)
+    
+    def read_manifest(self, version: str) -> Dict[str, Any]:
+        manifest_path = self.version_path(version) / MANIFEST_FILE
+        if not manifest_path.exists():
+            raise FileNotFoundError(f"Versão de modelos {version} não encontrada")
+        return json.loads(manifest_path.read_text())
+    
+    def verify(self, version: str):
+        """Confere tamanho e SHA-256 de cada artefato contra o manifest"""
+        path = self.version_path(version)
+        manifest = self.read_manifest(version)
+        
+        for name, info in manifest['files'].items():
+            file_path = path / name
+            if not file_path.exists():
+                raise ValueError(f"Versão {version}: artefato ausente {name}")
+            if file_path.stat().st_size != info['size'] or _file_sha256(file_path) != info['sha256']:
+                raise ValueError(f"Versão {version}: checksum divergente em {name}")
+    
+    def list_versions(self) -> List[Dict[str, Any]]:
+        """Manifests das versões publicadas, da mais recente para a mais antiga"""
+        if not self.versions_dir.exists():
+            return []
+        
+        current = self.current_version()
+        versions = []
+        for path in self.versions_dir.iterdir():
+            if path.name.startswith('.') or not (path / MANIFEST_FILE).exists():
+                continue
+            manifest = json.loads((path / MANIFEST_FILE).read_text())
+            manifest['current'] = manifest['version'] == current
+            versions.append(manifest)
+        
+        return sorted(versions, key=lambda m: m['created_at'], reverse=True)
+    
+    def prune(self, keep: int = 5) -> List[str]:
+        """
+        Remove as versões mais antigas, mantendo `keep` além da promovida
+        
+        Processos que ainda servem uma versão removida não são afetados: os
+        modelos já estão em memória.
+        """
+        current = self.current_version()
+        removed = []
+        
+        kept = 0
+        for manifest in self.list_versions():
+            if manifest['version'] == current:
+                continue
+            if kept < keep:
+                kept += 1
+                continue
+            shutil.rmtree(self.version_path(manifest['version']), ignore_errors=True)
+            removed.append(manifest['version'])
+        
+        # Restos de publicações interrompidas (não as que estão em andamento)
+        if self.versions_dir.exists():
+            cutoff = time.time() - STALE_STAGING_SECONDS
+            for path in self.versions_dir.glob('.staging-*'):
+                if path.stat().st_mtime < cutoff:
+                    shutil.rmtree(path, ignore_errors=True)
+        
+        if removed:
+            logger.info(f"Versões de modelos removidas: {', '.join(removed)}")
+        return removed
+    
+    def _write_manifest(self, path: Path, version: str, metadata: Dict[str, Any]):
+        files = {}
+        for file_path in sorted(p for p in path.rglob('*') if p.is_file()):
+            # fsync antes do rename: o manifest só descreve dados já em disco
+            with open(file_path, 'rb') as f:
+                os.fsync(f.fileno())
+            files[file_path.relative_to(path).as_posix()] = {
+                'size': file_path.stat().st_size,
+                'sha256': _file_sha256(file_path)
+            }
+        
+        manifest = {
+            'version': version,
+            'created_at': datetime.now().isoformat(),
+            'files': files,
+            **metadata
+        }
+        with open(path / MANIFEST_FILE, 'w') as f:
+            json.dump(manifest, f, indent=2, default=str)
+            f.flush()
+            os.fsync(f.fileno())
@@ -0,0 +1,105 @@
+"""
+Inferência da rede neural de churn em NumPy puro
+
+A rede de ChurnPredictor._build_neural_network é uma pilha de camadas densas
+(64-32-16-1); para servir previsões basta multiplicar matrizes. Os pesos são
+exportados para um .npz em save_models e carregados sem TensorFlow.
+"""
+from pathlib import Path
+from typing import List, Tuple, Union
+
+import numpy as np
+
+
+def _relu(x: np.ndarray) -> np.ndarray:
+    return np.maximum(x, 0, out=x)
+
+
+def _sigmoid(x: np.ndarray) -> np.ndarray:
+    # Forma estável para valores negativos grandes
+    out = np.empty_like(x)
+    positive = x >= 0
+    out[positive] = 1.0 / (1.0 + np.exp(-x[positive]))
+    exp_x = np.exp(x[~positive])
+    out[~positive] = exp_x / (1.0 + exp_x)
+    return out
+
+
+ACTIVATIONS = {
+    'relu': _relu,
+    'sigmoid': _sigmoid,
+    'tanh': np.tanh,
+    'linear': lambda x: x
+}
+
+
+class NumpyDenseNetwork:
+    """
+    Forward pass de uma rede Sequential de camadas Dense
+    
+    Dropout só atua no treino e é ignorado. A interface segue a do modelo
+    Keras nos pontos usados pelo ChurnPredictor: predict(X, verbose=0)
+    retorna (n, 1) e get_weights() retorna kernels e biases na mesma ordem
+    (a versão dos modelos não depende do backend de inferência).
+    """
+    
+    def __init__(self, layers: List[Tuple[np.ndarray, np.ndarray, str]]):
+        """
+        Args:
+            layers: (kernel, bias, ativação) de cada camada densa, em ordem
+        """
+        for _, _, activation in layers:
+            if activation not in ACTIVATIONS:
+                raise ValueError(f"Ativação não suportada: {activation}")
+        
+        self.layers = [
+            (np.ascontiguousarray(kernel, dtype=np.float32),
+             np.ascontiguousarray(bias, dtype=np.float32),
+             activation)
+            for kernel, bias, activation in layers
+        ]
+    
+    @classmethod
+    def from_keras(cls, model) -> "NumpyDenseNetwork":
+        """Extrai os pesos das camadas Dense de um modelo Keras treinado"""
+        layers = []
+        for layer in model.layers:
+            config = layer.get_config()
+            if 'units' not in config:
+                # Dropout e afins não têm pesos nem efeito na inferência
+                continue
+            kernel, bias = layer.get_weights()
+            layers.append((kernel, bias, config.get('activation', 'linear')))
+        return cls(layers)
+    
+    def save(self, path: Union[str, Path]):
+        """Grava os pesos em um arquivo .npz"""
+        arrays = {'activations': np.array([activation for _, _, activation in self.layers])}
+        for i, (kernel, bias, _) in enumerate(self.layers):
+            arrays[f'kernel_{i}'] = kernel
+            arrays[f'bias_{i}'] = bias
+        np.savez(path, **arrays)
+    
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "NumpyDenseNetwork":
+        """Carrega os pesos gravados por save"""
+        with np.load(path, allow_pickle=False) as data:
+            activations = [str(activation) for activation in data['activations']]
+            return cls([
+                (data[f'kernel_{i}'], data[f'bias_{i}'], activation)
+                for i, activation in enumerate(activations)
+            ])
+    
+    def predict(self, X: np.ndarray, verbose: int = 0) -> np.ndarray:
+        """Probabilidades (n, 1), como Model.predict"""
+        out = np.asarray(X, dtype=np.float32)
+        for kernel, bias, activation in self.layers:
+            out = ACTIVATIONS[activation](out @ kernel + bias)
+        return out
+    
+    def get_weights(self) -> List[np.ndarray]:
+        """Kernels e biases na ordem de Model.get_weights"""
+        weights = []
+        for kernel, bias, _ in self.layers:
+            weights.extend([kernel, bias])
+        return weights
@@ -0,0 +1,343 @@
+"""
+Inferência das florestas de churn (Random Forest, XGBoost, LightGBM) em NumPy
+
+As árvores de cada modelo são exportadas para arrays planos (nós de todas as
+árvores concatenados) gravados como .npy. Na carga os arrays são abertos com
+mmap_mode='r': os workers do uvicorn compartilham uma única cópia no page
+cache em vez de cada um desserializar o pickle do modelo, e não é preciso
+importar xgboost / lightgbm para servir previsões.
+
+Todas as divisões são normalizadas para `x <= limiar` vai à esquerda; valores
+ausentes (NaN) seguem o filho padrão do nó.
+"""
+import json
+import math
+from pathlib import Path
+from typing import Any, Dict, List, Union
+
+import numpy as np
+
+# Arrays por nó, gravados como <nome>.npy
+NODE_ARRAYS = ('feature', 'threshold', 'left', 'right', 'default', 'value', 'cover')
+META_FILE = "meta.json"
+
+
+class _TreeBuilder:
+    """Acumula nós de várias árvores nos arrays planos"""
+
+    def __init__(self):
+        self.columns = {name: [] for name in NODE_ARRAYS}
+        self.roots = []
+
+    def add_tree(self, nodes: List[Dict[str, Any]]):
+        """
+        Args:
+            nodes: Nós da árvore, raiz primeiro; filhos referenciados pelo
+                índice na lista (folhas com left = right = -1)
+        """
+        offset = len(self.columns['feature'])
+        self.roots.append(offset)
+
+        for i, node in enumerate(nodes):
+            leaf = node['left'] < 0
+            self.columns['feature'].append(0 if leaf else node['feature'])
+            self.columns['threshold'].append(np.inf if leaf else node['threshold'])
+            # Folhas apontam para si mesmas: a descida pode rodar um número fixo de passos
+            self.columns['left'].append(offset + (i if leaf else node['left']))
+            self.columns['right'].append(offset + (i if leaf else node['right']))
+            self.columns['default'].append(offset + (i if leaf else node['default']))
+            self.columns['value'].append(node.get('value', 0.0))
+            self.columns['cover'].append(node['cover'])
+
+        # Valor dos nós internos: média dos filhos ponderada pela cobertura
+        # (usado pelo SHAP como valor esperado)
+        value = self.columns['value']
+        cover = self.columns['cover']
+        for i in reversed(range(len(nodes))):
+            if nodes[i]['left'] >= 0:
+                left, right = offset + nodes[i]['left'], offset + nodes[i]['right']
+                total = cover[left] + cover[right]
+                value[offset + i] = (
+                    (value[left] * cover[left] + value[right] * cover[right]) / total
+                    if total > 0 else (value[left] + value[right]) / 2
+                )
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        return {
+            'feature': np.asarray(self.columns['feature'], dtype=np.int32),
+            'threshold': np.asarray(self.columns['threshold'], dtype=np.float64),
+            'left': np.asarray(self.columns['left'], dtype=np.int32),
+            'right': np.asarray(self.columns['right'], dtype=np.int32),
+            'default': np.asarray(self.columns['default'], dtype=np.int32),
+            'value': np.asarray(self.columns['value'], dtype=np.float64),
+            'cover': np.asarray(self.columns['cover'], dtype=np.float64),
+            'roots': np.asarray(self.roots, dtype=np.int32)
+        }
+
+
+def _tree_depth(nodes: List[Dict[str, Any]]) -> int:
+    depth = [0] * len(nodes)
+    for i, node in enumerate(nodes):
+        if node['left'] >= 0:
+            depth[node['left']] = depth[node['right']] = depth[i] + 1
+    return max(depth)
+
+
+class NumpyTreeEnsemble:
+    """
+    Floresta de árvores binárias avaliada em NumPy
+
+    aggregation='mean': média das folhas (probabilidade, Random Forest);
+    aggregation='logit': sigmoide de base_score + soma das folhas (boosting).
+    A interface segue a dos classificadores do scikit-learn nos pontos usados
+    pelo ChurnPredictor (predict_proba retorna (n, 2)).
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray], aggregation: str,
+                 base_score: float = 0.0, max_depth: int = 0, n_features: int = 0):
+        if aggregation not in ('mean', 'logit'):
+            raise ValueError(f"Agregação não suportada: {aggregation}")
+
+        self.arrays = arrays
+        self.aggregation = aggregation
+        self.base_score = base_score
+        self.max_depth = max_depth
+        self.n_features_in_ = n_features
+        self.classes_ = np.array([0, 1])
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.arrays['roots'])
+
+    # Exportação
+
+    @classmethod
+    def from_model(cls, model) -> "NumpyTreeEnsemble":
+        """Converte RandomForestClassifier, XGBClassifier ou LGBMClassifier"""
+        if isinstance(model, cls):
+            return model
+
+        module = type(model).__module__
+        if module.startswith('sklearn'):
+            return cls.from_sklearn(model)
+        if module.startswith('xgboost'):
+            return cls.from_xgboost(model)
+        if module.startswith('lightgbm'):
+            return cls.from_lightgbm(model)
+        raise ValueError(f"Modelo não suportado: {type(model).__name__}")
+
+    @classmethod
+    def from_sklearn(cls, model) -> "NumpyTreeEnsemble":
+        """RandomForestClassifier binário: média da probabilidade da classe 1 das árvores"""
+        if len(getattr(model, 'classes_', [])) != 2:
+            raise ValueError("Apenas classificadores binários são suportados")
+
+        builder = _TreeBuilder()
+        max_depth = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            counts = tree.value[:, 0, :]
+            proba = counts[:, 1] / np.maximum(counts.sum(axis=1), np.finfo(float).tiny)
+            missing_left = getattr(tree, 'missing_go_to_left', np.ones(tree.node_count, dtype=bool))
+
+            nodes = [
+                {
+                    'feature': int(tree.feature[i]),
+                    'threshold': float(tree.threshold[i]),
+                    'left': int(tree.children_left[i]),
+                    'right': int(tree.children_right[i]),
+                    'default': int(tree.children_left[i] if missing_left[i] else tree.children_right[i]),
+                    'value': float(proba[i]),
+                    'cover': float(tree.weighted_n_node_samples[i])
+                }
+                for i in range(tree.node_count)
+            ]
+            builder.add_tree(nodes)
+            max_depth = max(max_depth, _tree_depth(nodes))
+
+        return cls(builder.arrays(), 'mean', max_depth=max_depth, n_features=model.n_features_in_)
+
+    @classmethod
+    def from_xgboost(cls, model) -> "NumpyTreeEnsemble":
+        """XGBClassifier binary:logistic"""
+        booster = model.get_booster()
+        config = json.loads(booster.save_config())
+        objective = config['learner']['objective']['name']
+        if objective != 'binary:logistic':
+            raise ValueError(f"Objetivo XGBoost não suportado: {objective}")
+
+        base_score = float(config['learner']['learner_model_param']['base_score'])
+        feature_names = booster.feature_names
+
+        # Com early stopping o XGBoost prevê só até a melhor iteração
+        best_iteration = booster.attr('best_iteration')
+        n_trees = int(best_iteration) + 1 if best_iteration is not None else None
+
+        df = booster.trees_to_dataframe()
+        builder = _TreeBuilder()
+        max_depth = 0
+        for tree_id, tree_df in df.groupby('Tree', sort=True):
+            if n_trees is not None and tree_id >= n_trees:
+                break
+            index = {node_id: i for i, node_id in enumerate(tree_df['ID'])}
+
+            nodes = []
+            for row in tree_df.itertuples(index=False):
+                if row.Feature == 'Leaf':
+                    nodes.append({'left': -1, 'right': -1, 'value': float(row.Gain), 'cover': float(row.Cover)})
+                    continue
+                if feature_names is not None:
+                    feature = feature_names.index(row.Feature)
+                else:
+                    feature = int(row.Feature[1:])
+                nodes.append({
+                    'feature': feature,
+                    # XGBoost usa `x < limiar`; o maior double abaixo equivale a `<=`
+                    'threshold': float(np.nextafter(np.float64(np.float32(row.Split)), -np.inf)),
+                    'left': index[row.Yes],
+                    'right': index[row.No],
+                    'default': index[row.Missing],
+                    'cover': float(row.Cover)
+                })
+            builder.add_tree(nodes)
+            max_depth = max(max_depth, _tree_depth(nodes))
+
+        return cls(
+            builder.arrays(), 'logit',
+            base_score=math.log(base_score / (1 - base_score)),
+            max_depth=max_depth, n_features=int(model.n_features_in_)
+        )
+
+    @classmethod
+    def from_lightgbm(cls, model) -> "NumpyTreeEnsemble":
+        """LGBMClassifier binary (até a melhor iteração, se houver)"""
+        dump = model.booster_.dump_model()
+        if not dump['objective'].startswith('binary') or dump.get('average_output'):
+            raise ValueError(f"Objetivo LightGBM não suportado: {dump['objective']}")
+
+        builder = _TreeBuilder()
+        max_depth = 0
+        for tree_info in dump['tree_info']:
+            nodes = []
+
+            def visit(node) -> int:
+                i = len(nodes)
+                if 'leaf_value' in node:
+                    nodes.append({
+                        'left': -1, 'right': -1,
+                        'value': float(node['leaf_value']),
+                        'cover': float(node.get('leaf_count', 0))
+                    })
+                    return i
+
+                if node['decision_type'] != '<=' or node['missing_type'] == 'Zero':
+                    raise ValueError("Divisões categóricas ou zero_as_missing não são suportadas")
+
+                nodes.append(None)
+                left = visit(node['left_child'])
+                right = visit(node['right_child'])
+                if node['missing_type'] == 'NaN':
+                    default = left if node['default_left'] else right
+                else:
+                    # Sem tratamento de ausentes o LightGBM usa NaN como 0
+                    default = left if 0.0 <= node['threshold'] else right
+                nodes[i] = {
+                    'feature': int(node['split_feature']),
+                    'threshold': float(node['threshold']),
+                    'left': left,
+                    'right': right,
+                    'default': default,
+                    'cover': float(node.get('internal_count', 0))
+                }
+                return i
+
+            visit(tree_info['tree_structure'])
+            builder.add_tree(nodes)
+            max_depth = max(max_depth, _tree_depth(nodes))
+
+        return cls(builder.arrays(), 'logit', max_depth=max_depth, n_features=int(model.n_features_in_))
+
+    # Persistência
+
+    def save(self, path: Union[str, Path]):
+        """Grava um .npy por array e os parâmetros em meta.json"""
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        for name, array in self.arrays.items():
+            np.save(path / f"{name}.npy", np.ascontiguousarray(array))
+        (path / META_FILE).write_text(json.dumps({
+            'aggregation': self.aggregation,
+            'base_score': self.base_score,
+            'max_depth': self.max_depth,
+            'n_features': self.n_features_in_
+        }))
+
+    @classmethod
+    def load(cls, path: Union[str, Path], mmap: bool = True) -> "NumpyTreeEnsemble":
+        """Carrega os arrays gravados por save (somente leitura, em mmap por padrão)"""
+        path = Path(path)
+        meta = json.loads((path / META_FILE).read_text())
+        arrays = {
+            name: np.load(path / f"{name}.npy", mmap_mode='r' if mmap else None)
+            for name in NODE_ARRAYS + ('roots',)
+        }
+        return cls(arrays, meta['aggregation'], meta['base_score'], meta['max_depth'], meta['n_features'])
+
+    # Inferência
+
+    def _leaf_values(self, X: np.ndarray) -> np.ndarray:
+        """Valor da folha alcançada em cada árvore: (n, n_árvores)"""
+        a = self.arrays
+        X = np.asarray(X, dtype=np.float32)
+        rows = np.arange(len(X))[:, None]
+        has_missing = np.isnan(X).any()
+
+        nodes = np.repeat(np.asarray(a['roots'])[None, :], len(X), axis=0)
+        for _ in range(self.max_depth):
+            x = X[rows, a['feature'][nodes]]
+            # float32 comparado em float64, como os modelos originais
+            nodes_next = np.where(x <= a['threshold'][nodes], a['left'][nodes], a['right'][nodes])
+            if has_missing:
+                nodes_next = np.where(np.isnan(x), a['default'][nodes], nodes_next)
+            nodes = nodes_next
+
+        return a['value'][nodes]
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        leaves = self._leaf_values(X)
+        if self.aggregation == 'mean':
+            proba = leaves.mean(axis=1)
+        else:
+            proba = 1.0 / (1.0 + np.exp(-(self.base_score + leaves.sum(axis=1))))
+        return np.column_stack([1.0 - proba, proba])
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        return (self.predict_proba(X)[:, 1] > 0.5).astype(int)
+
+    def to_shap(self) -> Dict[str, Any]:
+        """Estrutura no formato de dicionário aceito por shap.TreeExplainer"""
+        a = {name: np.asarray(array) for name, array in self.arrays.items()}
+        roots = list(a['roots']) + [len(a['feature'])]
+        scale = 1.0 / self.n_trees if self.aggregation == 'mean' else 1.0
+
+        trees = []
+        for start, end in zip(roots[:-1], roots[1:]):
+            leaf = a['left'][start:end] == np.arange(start, end)
+            trees.append({
+                'children_left': np.where(leaf, -1, a['left'][start:end] - start),
+                'children_right': np.where(leaf, -1, a['right'][start:end] - start),
+                'children_default': np.where(leaf, -1, a['default'][start:end] - start),
+                'features': np.where(leaf, -2, a['feature'][start:end]),
+                'thresholds': np.where(leaf, 0.0, a['threshold'][start:end]),
+                'values': (a['value'][start:end] * scale)[:, None],
+                'node_sample_weight': a['cover'][start:end]
+            })
+
+        return {
+            'trees': trees,
+            'base_offset': self.base_score,
+            'tree_output': 'probability' if self.aggregation == 'mean' else 'log_odds',
+            'objective': 'binary_crossentropy',
+            'input_dtype': np.float32,
+            'internal_dtype': np.float64
+        }
@@ -0,0 +1,221 @@
+"""
+Treino concorrente dos modelos base de churn
+
+Random Forest, XGBoost, LightGBM e a rede neural são treinados ao mesmo tempo,
+cada um em um processo do pool (contexto spawn, um processo por modelo). A
+matriz de treino balanceada é copiada uma única vez para memória compartilhada
+(multiprocessing.shared_memory); os processos a mapeiam em vez de receber
+cópias serializadas.
+
+Os núcleos (ML_TRAINING_N_JOBS, padrão: todos) são divididos entre os modelos:
+cada processo limita n_jobs do estimador, os pools de BLAS/OpenMP
+(threadpoolctl) e as threads do TensorFlow ao seu orçamento, para que os
+quatro juntos não disputem mais núcleos do que existem.
+
+Cada modelo é treinado por ml.model_fitting.fit_model (early stopping e prazo
+do treino), como no caminho sequencial. A rede neural é construída e treinada
+no processo filho e volta como pesos, aplicados ao modelo do processo principal. Épocas concluídas são publicadas
+no callback de progresso; se ele levantar exceção (cancelamento), a rede para
+ao fim da época e o treino é interrompido.
+"""
+import logging
+import os
+import queue
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import get_context, shared_memory
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+NEURAL_NETWORK = 'neural_network'
+
+# Intervalo de leitura dos eventos de época enquanto os modelos treinam
+POLL_SECONDS = 0.5
+
+
+class SharedArray:
+    """Array NumPy em um bloco de memória compartilhada"""
+
+    def __init__(self, array: np.ndarray):
+        array = np.ascontiguousarray(array)
+        self.shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        self.spec = (self.shm.name, array.shape, array.dtype.str)
+        np.ndarray(array.shape, dtype=array.dtype, buffer=self.shm.buf)[...] = array
+
+    @staticmethod
+    def attach(spec: Tuple[str, tuple, str]) -> Tuple[shared_memory.SharedMemory, np.ndarray]:
+        """Mapeia o array criado por outro processo (somente leitura)"""
+        name, shape, dtype = spec
+        shm = shared_memory.SharedMemory(name=name)
+        array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+        array.flags.writeable = False
+        return shm, array
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+def thread_budgets(names: List[str], total: Optional[int] = None) -> Dict[str, int]:
+    """
+    Divide os núcleos entre os modelos
+
+    Cada modelo recebe a mesma parte; o resto vai para os primeiros da lista.
+    Com menos núcleos que modelos, todos ficam com uma thread (e o pool roda
+    no máximo `total` modelos por vez).
+    """
+    total = total or os.cpu_count() or 1
+    share, extra = divmod(total, len(names))
+    return {name: max(1, share + (1 if i < extra else 0)) for i, name in enumerate(names)}
+
+
+def _fit_model(name: str, estimator, X_spec, y_spec, threads: int, eval_set,
+               deadline: Optional[float], nn_fit_kwargs: Dict[str, Any], events, cancel,
+               sample_weight: Optional[np.ndarray] = None):
+    """Treina um modelo no processo do pool; retorna (modelo ou pesos, info do treino)"""
+    from threadpoolctl import threadpool_limits
+    from ml.model_fitting import fit_model
+
+    shm_X, X = SharedArray.attach(X_spec)
+    shm_y, y = SharedArray.attach(y_spec)
+    try:
+        with threadpool_limits(limits=threads):
+            if name == NEURAL_NETWORK:
+                return _fit_neural_network(X, y, threads, deadline, nn_fit_kwargs, events, cancel,
+                                           sample_weight)
+
+            params = estimator.get_params()
+            n_jobs = params.get('n_jobs')
+            if 'n_jobs' in params:
+                estimator.set_params(n_jobs=threads)
+            info = fit_model(name, estimator, X, y, eval_set=eval_set, deadline=deadline,
+                             sample_weight=sample_weight)
+            if 'n_jobs' in params:
+                # O modelo salvo mantém a configuração original para inferência
+                estimator.set_params(n_jobs=n_jobs)
+            return estimator, info
+    finally:
+        del X, y
+        shm_X.close()
+        shm_y.close()
+
+
+def _fit_neural_network(X, y, threads: int, deadline: Optional[float],
+                        nn_fit_kwargs: Dict[str, Any], events, cancel,
+                        sample_weight: Optional[np.ndarray] = None):
+    import tensorflow as tf
+    from tensorflow import keras
+    from ml.churn_predictor import build_neural_network
+    from ml.model_fitting import fit_model
+
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+    callbacks = []
+    if events is not None:
+        def on_epoch_end(epoch, logs):
+            events.put((NEURAL_NETWORK, epoch + 1))
+            if cancel.is_set():
+                model.stop_training = True
+        callbacks.append(keras.callbacks.LambdaCallback(on_epoch_end=on_epoch_end))
+
+    model = build_neural_network(X.shape[1])
+    info = fit_model(NEURAL_NETWORK, model, X, y, deadline=deadline,
+                     nn_fit_kwargs=nn_fit_kwargs, callbacks=callbacks, sample_weight=sample_weight)
+    return model.get_weights(), info
+
+
+def fit_models_parallel(models: Dict[str, Any], X: np.ndarray, y: np.ndarray,
+                        eval_set: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+                        nn_fit_kwargs: Optional[Dict[str, Any]] = None,
+                        deadline: Optional[float] = None,
+                        progress: Optional[Callable[..., None]] = None,
+                        n_jobs: Optional[int] = None,
+                        sample_weight: Optional[np.ndarray] = None
+                        ) -> Tuple[Dict[str, Any], Dict[str, Dict[str, Any]]]:
+    """
+    Treina os modelos concorrentemente
+
+    Args:
+        models: Estimadores scikit-learn (não treinados) e, opcionalmente, a
+            rede neural em 'neural_network' (recebe os pesos treinados)
+        X, y: Matriz de treino (compartilhada entre os processos)
+        eval_set: (X_val, y_val) para early stopping dos boosters
+        nn_fit_kwargs: Argumentos de fit da rede neural (épocas, validação...)
+        deadline: Prazo do treino (time.time()), ver ml.model_fitting
+        progress: Recebe model:<nome> quando cada modelo termina e a cada
+            época da rede neural; exceções dele cancelam o treino
+        n_jobs: Núcleos disponíveis (padrão: todos)
+        sample_weight: Pesos por amostra (ver ml.model_fitting.fit_model)
+
+    Returns:
+        (modelos treinados com os mesmos nomes, info do treino de cada um)
+    """
+    budgets = thread_budgets(list(models), n_jobs)
+    context = get_context('spawn')
+
+    manager = context.Manager() if progress is not None else None
+    events = manager.Queue() if manager else None
+    cancel = manager.Event() if manager else None
+
+    shared_X, shared_y = SharedArray(X), SharedArray(y)
+    executor = ProcessPoolExecutor(
+        max_workers=min(len(models), n_jobs or os.cpu_count() or 1),
+        mp_context=context, max_tasks_per_child=1
+    )
+    fitted, infos = {}, {}
+    interrupted = False
+    try:
+        futures = {
+            executor.submit(
+                _fit_model, name, None if name == NEURAL_NETWORK else model,
+                shared_X.spec, shared_y.spec, budgets[name],
+                eval_set, deadline, nn_fit_kwargs or {}, events, cancel, sample_weight
+            ): name
+            for name, model in models.items()
+        }
+        logger.info(f"Treinando em paralelo: {budgets}")
+
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=POLL_SECONDS, return_when=FIRST_COMPLETED)
+            _drain_events(events, progress)
+
+            for future in done:
+                name = futures[future]
+                result, infos[name] = future.result()
+                if name == NEURAL_NETWORK:
+                    models[name].set_weights(result)
+                    result = models[name]
+                fitted[name] = result
+                if progress is not None:
+                    progress(f"model:{name}", done=True)
+
+        return fitted, infos
+
+    except BaseException:
+        # A rede neural para ao fim da época; modelos em árvore não são interrompíveis
+        interrupted = True
+        if cancel is not None:
+            cancel.set()
+        raise
+
+    finally:
+        executor.shutdown(wait=not interrupted, cancel_futures=interrupted)
+        shared_X.close()
+        shared_y.close()
+        if manager is not None:
+            manager.shutdown()
+
+
+def _drain_events(events, progress):
+    if events is None:
+        return
+    while True:
+        try:
+            name, epoch = events.get_nowait()
+        except queue.Empty:
+            return
+        progress(f"model:{name}", epoch=epoch)
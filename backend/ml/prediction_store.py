@@ -0,0 +1,148 @@
+"""
+Previsões dos folds da validação temporal em disco
+
+Validação temporal e busca de hiperparâmetros geram, para cada modelo (ou
+combinação de parâmetros) e fold, os vetores y_true, y_pred e y_pred_proba.
+Em vez de ficarem nos resultados em memória, eles são gravados por quem
+treinou o fold (inclusive nos processos do pool), um arquivo .npz colunar por
+fold, e só as métricas resumidas voltam ao processo principal:
+
+    models/churn/validation_runs/
+        <run>/
+            <chave>/
+                params.json          parâmetros da combinação (opcional)
+                fold-000.npz         val_idx, y_true, y_pred, y_pred_proba
+
+A chave é o nome do modelo na validação e um hash dos parâmetros na busca de
+hiperparâmetros (ver key_for). load/load_all recarregam os folds sob demanda.
+
+Quem cria a execução a marca como concluída (complete) ao terminar; só então
+as execuções antigas são limpas. Execuções concluídas além das `keep` mais
+recentes são removidas; execuções sem a marca só depois de
+ML_VALIDATION_RUN_GRACE_SECONDS sem escrita (processo que morreu), para não
+apagar uma validação ou busca ainda em andamento em outro processo.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+
+from config import ML_VALIDATION_STORE_DIR, ML_VALIDATION_RUNS_KEEP, ML_VALIDATION_RUN_GRACE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = ('val_idx', 'y_true', 'y_pred', 'y_pred_proba')
+PARAMS_FILE = "params.json"
+COMPLETE_FILE = ".complete"
+
+
+class FoldPredictionStore:
+    """Previsões por (run, chave, fold) em arquivos .npz"""
+
+    def __init__(self, root: Union[str, Path] = ML_VALIDATION_STORE_DIR,
+                 run_id: Optional[str] = None, keep: int = ML_VALIDATION_RUNS_KEEP):
+        """
+        Args:
+            root: Diretório das execuções
+            run_id: Execução existente a consultar ou continuar (padrão: nova)
+            keep: Execuções concluídas mantidas pela limpeza (ver complete)
+        """
+        self.root = Path(root)
+        self.keep = keep
+        if run_id is None:
+            run_id = f"{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:6]}"
+            (self.root / run_id).mkdir(parents=True, exist_ok=True)
+        self.run_id = run_id
+
+    @property
+    def run_dir(self) -> Path:
+        return self.root / self.run_id
+
+    @staticmethod
+    def key_for(params: Dict[str, Any]) -> str:
+        """Chave estável de uma combinação de parâmetros"""
+        encoded = json.dumps(params, sort_keys=True, default=str).encode()
+        return f"params-{hashlib.sha256(encoded).hexdigest()[:12]}"
+
+    def put(self, key: str, fold_id: int, predictions: Dict[str, Any],
+            params: Optional[Dict[str, Any]] = None) -> Path:
+        """Grava as previsões de um fold (escrita atômica)"""
+        path = self.run_dir / key
+        path.mkdir(parents=True, exist_ok=True)
+        if params is not None and not (path / PARAMS_FILE).exists():
+            (path / PARAMS_FILE).write_text(json.dumps(params, sort_keys=True, default=str))
+
+        target = path / f"fold-{int(fold_id):03d}.npz"
+        staging = path / f".{target.stem}-{uuid.uuid4().hex[:6]}.npz"
+        np.savez(staging, **{column: np.asarray(predictions[column]) for column in COLUMNS})
+        os.replace(staging, target)
+        return target
+
+    def keys(self) -> List[str]:
+        if not self.run_dir.exists():
+            return []
+        return sorted(path.name for path in self.run_dir.iterdir() if path.is_dir())
+
+    def folds(self, key: str) -> List[int]:
+        return sorted(int(path.stem.split('-')[1]) for path in (self.run_dir / key).glob("fold-*.npz"))
+
+    def params(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self.run_dir / key / PARAMS_FILE
+        return json.loads(path.read_text()) if path.exists() else None
+
+    def load(self, key: str, fold_id: int) -> Dict[str, Any]:
+        """Previsões de um fold, no formato de results['predictions'] da validação"""
+        path = self.run_dir / key / f"fold-{int(fold_id):03d}.npz"
+        if not path.exists():
+            raise KeyError(f"Sem previsões para {self.run_id}/{key} fold {fold_id}")
+        with np.load(path) as data:
+            return {'fold_id': int(fold_id), **{column: data[column] for column in COLUMNS}}
+
+    def load_all(self, key: str) -> List[Dict[str, Any]]:
+        """Previsões de todos os folds da chave, em ordem de fold"""
+        return [self.load(key, fold_id) for fold_id in self.folds(key)]
+
+    def complete(self):
+        """Marca a execução como concluída e limpa as execuções antigas"""
+        (self.run_dir / COMPLETE_FILE).write_text(datetime.now().isoformat())
+        self.prune()
+
+    def prune(self, grace_seconds: float = ML_VALIDATION_RUN_GRACE_SECONDS):
+        """
+        Remove execuções concluídas além das `keep` mais recentes (incluindo
+        esta) e execuções não concluídas sem escrita há mais de grace_seconds
+        """
+        if not self.root.exists():
+            return
+        completed, abandoned = [], []
+        cutoff = time.time() - grace_seconds
+        for path in self.root.iterdir():
+            if not path.is_dir() or path.name == self.run_id:
+                continue
+            marker = path / COMPLETE_FILE
+            if marker.exists():
+                completed.append((marker.stat().st_mtime, path))
+            elif _last_write(path) < cutoff:
+                abandoned.append(path)
+
+        completed.sort(reverse=True)
+        for path in [path for _, path in completed[max(self.keep - 1, 0):]] + abandoned:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def _last_write(run_dir: Path) -> float:
+    """Última escrita na execução (cada fold gravado altera o diretório da chave)"""
+    try:
+        return max([run_dir.stat().st_mtime] +
+                   [entry.stat().st_mtime for entry in os.scandir(run_dir) if entry.is_dir()])
+    except FileNotFoundError:
+        return time.time()
+
@@ -0,0 +1,196 @@
+"""
+Balanceamento das classes antes do treino, com cache em disco
+
+O SMOTE é uma busca de vizinhos sobre todo o conjunto de treino e quase
+dobra a matriz; até aqui era refeito a cada treino, igual para todos os
+modelos e trials. O Resampler aplica a estratégia configurada
+(ML_RESAMPLING_STRATEGY) e grava o resultado como .npy, reaberto com mmap
+nos usos seguintes:
+
+    smote         sobreamostragem sintética da classe minoritária (padrão)
+    undersample   RandomUnderSampler: descarta amostras da classe majoritária
+    class_weight  sem reamostragem; pesos 'balanced' por amostra (sample_weight)
+    none          sem balanceamento
+
+A chave do cache é a impressão digital (hash) das linhas de treino do fold
+mais a estratégia: o mesmo snapshot dos dados e o mesmo fold (padrão, final
+ou temporal) reutilizam a matriz, em qualquer processo. Cada chamada retorna
+o tempo e a memória da matriz balanceada, reportados junto às métricas.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+import numpy as np
+
+from config import ML_RESAMPLING_STRATEGY, ML_RESAMPLING_CACHE_DIR, ML_RESAMPLING_CACHE_KEEP
+
+logger = logging.getLogger(__name__)
+
+STRATEGIES = ('smote', 'undersample', 'class_weight', 'none')
+
+# Estratégias que geram uma matriz nova (e por isso vão para o cache)
+CACHED_STRATEGIES = ('smote', 'undersample')
+
+META_FILE = "meta.json"
+
+
+class ResampledData:
+    """Matriz de treino balanceada, pesos por amostra (ou None) e info da etapa"""
+
+    def __init__(self, X: np.ndarray, y: np.ndarray, sample_weight: Optional[np.ndarray],
+                 info: Dict[str, Any]):
+        self.X = X
+        self.y = y
+        self.sample_weight = sample_weight
+        self.info = info
+
+
+def fingerprint(X: np.ndarray, y: np.ndarray) -> str:
+    """Hash do conteúdo das linhas de treino"""
+    digest = hashlib.blake2b(digest_size=12)
+    digest.update(str((X.shape, X.dtype.str, y.dtype.str)).encode())
+    digest.update(np.ascontiguousarray(X).data)
+    digest.update(np.ascontiguousarray(y).data)
+    return digest.hexdigest()
+
+
+def sample_weight_for(model, sample_weight: Optional[np.ndarray]) -> Optional[np.ndarray]:
+    """
+    Pesos a passar no fit do modelo
+
+    Estimadores já configurados com class_weight (Random Forest, LightGBM)
+    balanceiam sozinhos; receber os pesos também contaria o balanceamento duas vezes.
+    """
+    if sample_weight is None:
+        return None
+    if hasattr(model, 'get_params') and model.get_params().get('class_weight') is not None:
+        return None
+    return sample_weight
+
+
+class Resampler:
+    """
+    Estratégia de balanceamento com cache por (dados do fold, estratégia)
+
+    Uso:
+        data = Resampler().resample(X_train, y_train, fold='standard')
+        model.fit(data.X, data.y, sample_weight=sample_weight_for(model, data.sample_weight))
+    """
+
+    def __init__(self, strategy: str = ML_RESAMPLING_STRATEGY,
+                 cache_dir: Optional[Union[str, Path]] = ML_RESAMPLING_CACHE_DIR,
+                 keep: int = ML_RESAMPLING_CACHE_KEEP, random_state: int = 42):
+        """
+        Args:
+            strategy: 'smote', 'undersample', 'class_weight' ou 'none'
+            cache_dir: Diretório do cache (None desativa o cache)
+            keep: Matrizes mantidas no cache
+            random_state: Semente do SMOTE/RandomUnderSampler
+        """
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Estratégia de balanceamento desconhecida: {strategy}")
+        self.strategy = strategy
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else None
+        self.keep = keep
+        self.random_state = random_state
+
+    def resample(self, X: np.ndarray, y: np.ndarray, fold: str = 'train') -> ResampledData:
+        """
+        Balanceia as linhas de treino de um fold
+
+        Args:
+            X, y: Linhas de treino
+            fold: Rótulo do fold para logs e info (standard, final, fold-<id>)
+        """
+        start = time.perf_counter()
+        cached = False
+        sample_weight = None
+
+        if self.strategy in CACHED_STRATEGIES:
+            key = f"{self.strategy}-{self.random_state}-{fingerprint(X, y)}"
+            loaded = self._get(key)
+            if loaded is not None:
+                X_out, y_out = loaded
+                cached = True
+            else:
+                X_out, y_out = self._sampler().fit_resample(X, y)
+                self._put(key, X_out, y_out)
+        else:
+            X_out, y_out = X, y
+            if self.strategy == 'class_weight':
+                from sklearn.utils.class_weight import compute_class_weight
+                classes = np.unique(y)
+                weights = compute_class_weight('balanced', classes=classes, y=y)
+                sample_weight = weights[np.searchsorted(classes, y)]
+
+        info = {
+            'strategy': self.strategy,
+            'fold': fold,
+            'cached': cached,
+            'seconds': round(time.perf_counter() - start, 3),
+            'rows_in': int(len(y)),
+            'rows_out': int(len(y_out)),
+            'memory_mb': round((X_out.nbytes + y_out.nbytes) / 1e6, 2),
+            'positive_rate': round(float(np.mean(y_out)), 4) if len(y_out) else 0.0
+        }
+        logger.info(f"Balanceamento {self.strategy} ({fold}): {info['rows_in']} -> {info['rows_out']} "
+                   f"linhas em {info['seconds']:.2f}s{' (cache)' if cached else ''}")
+        return ResampledData(X_out, y_out, sample_weight, info)
+
+    def _sampler(self):
+        if self.strategy == 'smote':
+            from imblearn.over_sampling import SMOTE
+            return SMOTE(random_state=self.random_state)
+        from imblearn.under_sampling import RandomUnderSampler
+        return RandomUnderSampler(random_state=self.random_state)
+
+    def _get(self, key: str):
+        if self.cache_dir is None:
+            return None
+        path = self.cache_dir / key
+        if not (path / META_FILE).exists():
+            return None
+        try:
+            arrays = (np.load(path / "X.npy", mmap_mode='r'), np.load(path / "y.npy", mmap_mode='r'))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Matriz balanceada {key} ilegível, recalculando: {e}")
+            return None
+        os.utime(path)  # usada recentemente: preservada pela limpeza
+        return arrays
+
+    def _put(self, key: str, X: np.ndarray, y: np.ndarray):
+        """Grava em um diretório temporário e o renomeia (atômico)"""
+        if self.cache_dir is None:
+            return
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        staging = self.cache_dir / f".staging-{uuid.uuid4().hex[:8]}"
+        staging.mkdir()
+        try:
+            np.save(staging / "X.npy", X)
+            np.save(staging / "y.npy", y)
+            (staging / META_FILE).write_text(json.dumps({'strategy': self.strategy, 'rows': int(len(y))}))
+            try:
+                os.replace(staging, self.cache_dir / key)
+            except OSError:
+                # Outro processo gravou a mesma matriz antes
+                shutil.rmtree(staging, ignore_errors=True)
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        self._prune()
+
+    def _prune(self):
+        entries = sorted(
+            (path for path in self.cache_dir.iterdir()
+             if path.is_dir() and not path.name.startswith('.')),
+            key=lambda path: path.stat().st_mtime, reverse=True
+        )
+        for path in entries[self.keep:]:
+            shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,230 @@
+"""
+Job de scoring de risco de churn (execução noturna)
+
+Calcula o risco de todos os clientes ativos com a versão atual dos modelos e
+grava o resultado em churn_risk_score, que é a fonte das leituras de
+/ml/churn/insights e /ml/churn/clients/risk-analysis.
+
+Com vários workers uvicorn, cada um agenda o scoring, mas só um executa a
+rodada do dia: o primeiro a reivindicá-la (SET NX EX no Redis ou, sem Redis,
+um arquivo criado com O_EXCL em ML_MODEL_PATH/risk_scoring, válido para
+workers da mesma máquina). Alternativa: desligar o agendador interno
+(ML_RISK_SCORING_ENABLED = False) e rodar via cron:
+    python -m ml.risk_scoring
+
+Clientes cujos dados mudam ao longo do dia podem ser re-pontuados em
+background pela RescoreQueue (ver ml.cache_invalidation).
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Any, Iterable, Optional
+
+from config import (
+    ML_MODEL_PATH,
+    ML_RISK_SCORING_HOUR,
+    ML_RISK_SCORING_CHUNK_SIZE,
+    ML_RISK_SCORING_TOP_FEATURES,
+    ML_RESCORE_DEBOUNCE_SECONDS
+)
+from ml.service import get_ml_service
+
+logger = logging.getLogger(__name__)
+
+# Rodada diária reivindicada por um único worker (a chave expira antes da próxima)
+RUN_CLAIM_KEY = "ml_risk_scoring:run:{day}"
+RUN_CLAIM_TTL_SECONDS = 23 * 3600
+RUN_CLAIM_DIR = Path(ML_MODEL_PATH) / "risk_scoring"
+RUN_CLAIM_KEEP_DAYS = 7
+
+
+def run_risk_scoring(ml_service, chunk_size: int = ML_RISK_SCORING_CHUNK_SIZE,
+                     top_features: int = ML_RISK_SCORING_TOP_FEATURES) -> Dict[str, Any]:
+    """
+    Executa o scoring de todos os clientes ativos em uma sessão própria
+
+    Args:
+        ml_service: Instância de ChurnMLService com modelos treinados
+        chunk_size: Clientes processados por bloco
+        top_features: Features mais relevantes guardadas por cliente
+    """
+    from database.connection import get_db_sync
+
+    db = get_db_sync()
+    try:
+        return ml_service.score_active_clients(
+            db, chunk_size=chunk_size, top_features=top_features
+        )
+    finally:
+        db.close()
+
+
+def run_rescoring(ml_service, cliente_ids: Iterable, chunk_size: int = ML_RISK_SCORING_CHUNK_SIZE,
+                  top_features: int = ML_RISK_SCORING_TOP_FEATURES) -> Dict[str, Any]:
+    """Re-pontua apenas os clientes informados em uma sessão própria"""
+    from database.connection import get_db_sync
+    
+    db = get_db_sync()
+    try:
+        return ml_service.rescore_clients(
+            db, cliente_ids, chunk_size=chunk_size, top_features=top_features
+        )
+    finally:
+        db.close()
+
+
+class RescoreQueue:
+    """
+    Fila de clientes a re-pontuar após alterações nos dados de entrada
+    
+    Os IDs enfileirados são agrupados por `debounce_seconds` e processados em
+    lote por uma thread daemon, de modo que uma sequência de commits do mesmo
+    cliente gera um único re-scoring. Sem `ml_service`, usa o serviço
+    compartilhado do processo (ml.service).
+    """
+    
+    def __init__(self, ml_service=None, debounce_seconds: float = ML_RESCORE_DEBOUNCE_SECONDS):
+        self.ml_service = ml_service
+        self.debounce_seconds = debounce_seconds
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def enqueue(self, cliente_ids: Iterable):
+        """Agenda o re-scoring dos clientes"""
+        with self._lock:
+            self._pending.update(cliente_ids)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="churn-rescore", daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+    
+    def drain(self) -> Dict[str, Any]:
+        """Processa imediatamente os clientes pendentes"""
+        with self._lock:
+            cliente_ids, self._pending = self._pending, set()
+        
+        if not cliente_ids:
+            return {"total_scored": 0, "failed": []}
+        
+        result = run_rescoring(self.ml_service or get_ml_service(), cliente_ids)
+        if "error" in result:
+            logger.debug(f"Re-scoring não executado: {result['error']}")
+        else:
+            logger.info(f"Re-scoring de {result['total_scored']} clientes (modelo {result['model_version']})")
+        return result
+    
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            time.sleep(self.debounce_seconds)
+            try:
+                self.drain()
+            except Exception as e:
+                logger.error(f"Erro no re-scoring em background: {e}")
+
+
+def seconds_until_next_run(hour: int, now: Optional[datetime] = None) -> float:
+    """Segundos até a próxima execução no horário `hour` (hora cheia)"""
+    now = now or datetime.now()
+    next_run = now.replace(hour=hour, minute=0, second=0, microsecond=0)
+    if next_run <= now:
+        next_run += timedelta(days=1)
+    return (next_run - now).total_seconds()
+
+
+def claim_scheduled_run(day: str, redis_client=None,
+                        claim_dir: Path = RUN_CLAIM_DIR) -> bool:
+    """
+    Reivindica a rodada de scoring do dia; True apenas para o primeiro worker
+
+    Usa SET NX EX no Redis quando disponível; sem Redis (ou se ele falhar),
+    um arquivo por dia criado com O_EXCL em `claim_dir`.
+    """
+    if redis_client is not None:
+        try:
+            return bool(redis_client.set(
+                RUN_CLAIM_KEY.format(day=day), os.getpid(), nx=True, ex=RUN_CLAIM_TTL_SECONDS
+            ))
+        except Exception as e:
+            logger.warning(f"Redis indisponível para reivindicar o scoring, usando arquivo: {e}")
+    
+    claim_dir.mkdir(parents=True, exist_ok=True)
+    try:
+        fd = os.open(claim_dir / f"{day}.claim", os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return False
+    os.write(fd, str(os.getpid()).encode())
+    os.close(fd)
+    
+    # Remove reivindicações de dias antigos
+    cutoff = time.time() - RUN_CLAIM_KEEP_DAYS * 86400
+    for path in claim_dir.glob("*.claim"):
+        if path.stat().st_mtime < cutoff:
+            path.unlink(missing_ok=True)
+    return True
+
+
+async def risk_scoring_scheduler(ml_service=None, hour: int = ML_RISK_SCORING_HOUR):
+    """
+    Agenda o scoring diariamente no horário configurado
+
+    O scoring roda em uma thread para não bloquear o event loop. Execuções
+    sem modelos treinados são apenas registradas no log. Sem `ml_service`,
+    usa o serviço compartilhado do processo (ml.service). Entre vários
+    workers, só o que reivindicar a rodada do dia a executa
+    (ver claim_scheduled_run).
+    """
+    from ml.model_cache import model_cache
+    
+    while True:
+        await asyncio.sleep(seconds_until_next_run(hour))
+
+        day = datetime.now().strftime('%Y-%m-%d')
+        if not claim_scheduled_run(day, model_cache.redis_client):
+            logger.info(f"Scoring de risco de {day} já executado por outro worker")
+            continue
+
+        try:
+            result = await asyncio.to_thread(
+                lambda: run_risk_scoring(ml_service or get_ml_service())
+            )
+            if "error" in result:
+                logger.warning(f"Scoring de risco não executado: {result['error']}")
+        except Exception as e:
+            logger.error(f"Erro no scoring de risco agendado: {e}")
+
+
+def main():
+    """Executa o scoring uma vez com os modelos salvos em ML_MODEL_PATH"""
+    from database.connection import init_db, close_db
+    from ml.churn_predictor import ChurnMLService
+
+    logging.basicConfig(level=logging.INFO)
+
+    ml_service = ChurnMLService(ML_MODEL_PATH)
+
+    asyncio.run(init_db())
+    try:
+        result = run_risk_scoring(ml_service)
+    finally:
+        asyncio.run(close_db())
+
+    if "error" in result:
+        logger.error(f"Scoring de risco não executado: {result['error']}")
+        raise SystemExit(1)
+
+    logger.info(
+        f"Scoring concluído: {result['total_scored']} clientes "
+        f"(modelo {result['model_version']})"
+    )
+
+
+if __name__ == "__main__":
+    main()
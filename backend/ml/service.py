@@ -0,0 +1,82 @@
+"""
+Instância compartilhada do ChurnMLService, criada sob demanda
+
+Importar ml.churn_predictor (sklearn, pandas) e carregar os modelos leva
+segundos; por isso a API não cria o serviço na importação dos endpoints. Ele
+é criado na primeira requisição de ML ou pelo warm-up em background disparado
+no startup (ML_WARMUP_ON_STARTUP), o que ocorrer primeiro.
+
+A cada ML_MODEL_REFRESH_SECONDS uma requisição dispara, em background, a
+verificação do registro de modelos: versões promovidas por outro worker são
+carregadas sem bloquear as previsões.
+
+O treino roda em processo separado (ml.training_jobs); o TrainingJobRunner do
+processo é criado sob demanda por get_training_runner.
+"""
+import asyncio
+import logging
+import threading
+import time
+
+from config import ML_MODEL_PATH, ML_MODEL_REFRESH_SECONDS
+
+logger = logging.getLogger(__name__)
+
+_ml_service = None
+_ml_service_lock = threading.Lock()
+_last_refresh = 0.0
+_training_runner = None
+
+
+def get_ml_service():
+    """Retorna o ChurnMLService do processo, criando-o no primeiro uso"""
+    global _ml_service, _last_refresh
+
+    if _ml_service is None:
+        with _ml_service_lock:
+            if _ml_service is None:
+                start = time.perf_counter()
+                from ml.churn_predictor import ChurnMLService
+                _ml_service = ChurnMLService(ML_MODEL_PATH)
+                logger.info(f"Serviço de ML inicializado em {time.perf_counter() - start:.2f}s")
+                # Acabou de carregar a versão promovida
+                _last_refresh = time.monotonic()
+
+    _schedule_refresh(_ml_service)
+    return _ml_service
+
+
+def _schedule_refresh(service):
+    """Verifica em background se há nova versão promovida no registro"""
+    global _last_refresh
+
+    now = time.monotonic()
+    if now - _last_refresh < ML_MODEL_REFRESH_SECONDS:
+        return
+    _last_refresh = now
+
+    threading.Thread(target=service.refresh_models, name="ml-model-refresh", daemon=True).start()
+
+
+def get_training_runner():
+    """Retorna o TrainingJobRunner do processo, criando-o no primeiro uso"""
+    global _training_runner
+
+    if _training_runner is None:
+        with _ml_service_lock:
+            if _training_runner is None:
+                from ml.training_jobs import TrainingJobRunner
+                # Job iniciado por este worker: serve a nova versão sem esperar o refresh
+                _training_runner = TrainingJobRunner(
+                    ML_MODEL_PATH, on_success=lambda job: get_ml_service().refresh_models()
+                )
+
+    return _training_runner
+
+
+async def warm_up_ml_service():
+    """Cria o serviço em uma thread, sem bloquear o event loop"""
+    try:
+        await asyncio.to_thread(get_ml_service)
+    except Exception as e:
+        logger.error(f"Erro no warm-up do serviço de ML: {e}")
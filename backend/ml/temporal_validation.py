@@ -1,13 +1,18 @@
 """
 Sistema de Validação Cruzada Temporal para Modelos de Churn
+
+Cada par (modelo, fold) é treinado e avaliado de forma independente; com
+n_jobs != 1 os pares rodam em um pool de processos (contexto spawn) que lê X e
+y da memória compartilhada, e os resultados são agregados por modelo no mesmo
+formato da execução sequencial.
 """
 import numpy as np
 import pandas as pd
 from typing import List, Tuple, Dict, Any, Optional
 from datetime import datetime, timedelta
 import logging
+import os
 from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score, roc_auc_score
-from sklearn.model_selection import ParameterGrid
 from sklearn.inspection import permutation_importance
 import joblib
 from pathlib import Path
@@ -15,6 +20,124 @@ from pathlib import Path
 logger = logging.getLogger(__name__)
 
 
+def _resolve_workers(n_jobs: Optional[int], n_tasks: int) -> int:
+    """Processos para n_tasks tarefas independentes (n_jobs 0, -1 ou None = todos os núcleos)"""
+    n_jobs = n_jobs if n_jobs not in (None, 0, -1) else (os.cpu_count() or 1)
+    return max(1, min(n_jobs, n_tasks))
+
+
+def _validate_fold(model, X: np.ndarray, y: np.ndarray, split: Dict[str, Any],
+                   fit_params: Dict, resampler=None) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Treina um clone do modelo no período de treino de um fold e avalia na validação
+    
+    Com resampler (ml.resampling.Resampler), as linhas de treino do fold são
+    balanceadas antes do fit; a matriz balanceada vem do cache quando outro
+    modelo ou trial já balanceou o mesmo fold.
+    
+    Returns:
+        (métricas do fold, previsões de validação)
+    """
+    from sklearn.base import clone
+    
+    fold_id = split['fold_id']
+    train_idx = split['train_idx']
+    val_idx = split['val_idx']
+    
+    # Treina modelo no período de treino
+    X_train = X[train_idx]
+    y_train = y[train_idx]
+    
+    # Clona modelo para evitar interferência entre folds
+    model_fold = clone(model)
+    
+    resampling = None
+    if resampler is not None:
+        from .resampling import sample_weight_for
+        
+        balanced = resampler.resample(X_train, y_train, fold=f"fold-{fold_id}")
+        sample_weight = sample_weight_for(model_fold, balanced.sample_weight)
+        if sample_weight is not None:
+            fit_params = {**fit_params, 'sample_weight': sample_weight}
+        model_fold.fit(balanced.X, balanced.y, **fit_params)
+        resampling = balanced.info
+    else:
+        model_fold.fit(X_train, y_train, **fit_params)
+    
+    # Avalia no período de validação
+    X_val = X[val_idx]
+    y_val = y[val_idx]
+    
+    if hasattr(model_fold, 'predict_proba'):
+        y_val_pred_proba = model_fold.predict_proba(X_val)[:, 1]
+    else:
+        y_val_pred_proba = model_fold.decision_function(X_val)
+    
+    y_val_pred = model_fold.predict(X_val)
+    
+    # Calcula métricas
+    metrics = {
+        'fold_id': fold_id,
+        'accuracy': accuracy_score(y_val, y_val_pred),
+        'precision': precision_score(y_val, y_val_pred, zero_division=0),
+        'recall': recall_score(y_val, y_val_pred, zero_division=0),
+        'f1': f1_score(y_val, y_val_pred, zero_division=0),
+        'auc': roc_auc_score(y_val, y_val_pred_proba) if len(np.unique(y_val)) > 1 else 0,
+        'train_period': split['train_period'],
+        'val_period': split['val_period'],
+        'train_size': len(y_train),
+        'val_size': len(y_val),
+        'churn_rate_train': y_train.mean(),
+        'churn_rate_val': y_val.mean(),
+        'resampling': resampling
+    }
+    
+    predictions = {
+        'fold_id': fold_id,
+        'val_idx': val_idx,
+        'y_true': y_val,
+        'y_pred': y_val_pred,
+        'y_pred_proba': y_val_pred_proba
+    }
+    
+    return metrics, predictions
+
+
+def _validate_and_store(model, X: np.ndarray, y: np.ndarray, split: Dict[str, Any],
+                        fit_params: Dict, store=None, key: Optional[str] = None,
+                        resampler=None) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+    """_validate_fold; com store, as previsões vão para o disco e não são retornadas"""
+    metrics, predictions = _validate_fold(model, X, y, split, fit_params, resampler)
+    if store is None:
+        return metrics, predictions
+    store.put(key, metrics['fold_id'], predictions)
+    return metrics, None
+
+
+def _validate_fold_task(model, X_spec, y_spec, split: Dict[str, Any], fit_params: Dict,
+                        threads: int, store=None, key: Optional[str] = None,
+                        resampler=None) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+    """_validate_and_store em um processo do pool, com X e y em memória compartilhada"""
+    from threadpoolctl import threadpool_limits
+    from sklearn.base import clone
+    from ml.parallel_training import SharedArray
+    
+    # Cada processo usa só a sua parte dos núcleos
+    model = clone(model)
+    if 'n_jobs' in model.get_params():
+        model.set_params(n_jobs=threads)
+    
+    shm_X, X = SharedArray.attach(X_spec)
+    shm_y, y = SharedArray.attach(y_spec)
+    try:
+        with threadpool_limits(limits=threads):
+            return _validate_and_store(model, X, y, split, fit_params, store, key, resampler)
+    finally:
+        del X, y
+        shm_X.close()
+        shm_y.close()
+
+
 class TemporalCrossValidator:
     """
     Implementa validação cruzada temporal específica para dados de churn
@@ -24,7 +147,10 @@ class TemporalCrossValidator:
                  train_months: int = 12,
                  validation_months: int = 3,
                  test_months: int = 1,
-                 step_months: int = 1):
+                 step_months: int = 1,
+                 n_jobs: int = 1,
+                 prediction_store=None,
+                 resampler=None):
         """
         Inicializa o validador temporal
         
@@ -33,11 +159,20 @@ class TemporalCrossValidator:
             validation_months: Meses para validação
             test_months: Meses para teste
             step_months: Passo entre folds (em meses)
+            n_jobs: Processos para validar pares (modelo, fold) em paralelo
+                (1 = sequencial, -1 = todos os núcleos)
+            prediction_store: FoldPredictionStore para gravar as previsões dos
+                folds em disco em vez de mantê-las nos resultados
+            resampler: Resampler para balancear o treino de cada fold (com
+                cache por fold e estratégia); sem ele, treina sem balancear
         """
         self.train_months = train_months
         self.validation_months = validation_months
         self.test_months = test_months
         self.step_months = step_months
+        self.n_jobs = n_jobs
+        self.prediction_store = prediction_store
+        self.resampler = resampler
     
     def create_temporal_splits(self, 
                               data: pd.DataFrame, 
@@ -46,6 +181,12 @@ class TemporalCrossValidator:
         """
         Cria splits temporais para validação cruzada
         
+        As datas são ordenadas uma vez (como int64) e os limites de todos os
+        folds localizados com um único searchsorted. Os índices de cada fold
+        são posições das linhas em `data` (as mesmas de X), em ordem de data,
+        e são views de um único array de ordenação compartilhado por todos os
+        folds. O DataFrame recebido não é alterado.
+        
         Args:
             data: DataFrame com os dados
             date_column: Nome da coluna de data
@@ -56,16 +197,22 @@ class TemporalCrossValidator:
         """
         splits = []
         
-        # Converte datas se necessário
-        if data[date_column].dtype == 'object':
-            data[date_column] = pd.to_datetime(data[date_column])
+        # Datas como int64 (ns); linhas sem data ficam fora de todos os folds
+        dates = pd.to_datetime(data[date_column]).to_numpy(dtype='datetime64[ns]')
+        order = np.flatnonzero(~np.isnat(dates))
+        keys = dates[order].view(np.int64)
+        
+        # Ordena por data (dados já ordenados dispensam o argsort)
+        if len(keys) > 1 and np.any(keys[1:] < keys[:-1]):
+            by_date = np.argsort(keys, kind='stable')
+            order, keys = order[by_date], keys[by_date]
         
-        # Ordena por data
-        data_sorted = data.sort_values(date_column).reset_index(drop=True)
+        if len(keys) == 0:
+            raise ValueError("Dados insuficientes. Nenhuma data válida")
         
         # Encontra período total dos dados
-        start_date = data_sorted[date_column].min()
-        end_date = data_sorted[date_column].max()
+        start_date = pd.Timestamp(keys[0])
+        end_date = pd.Timestamp(keys[-1])
         
         # Calcula total de meses disponíveis
         total_months = ((end_date.year - start_date.year) * 12 + 
@@ -78,60 +225,54 @@ class TemporalCrossValidator:
             raise ValueError(f"Dados insuficientes. Necessário {min_months_needed} meses, "
                            f"disponível {total_months} meses")
         
-        # Cria folds temporais
+        # Limites de cada fold: início do treino, início da validação, início do teste, fim do teste
+        periods = []
         current_start = start_date
-        fold_id = 0
-        
         while True:
-            # Define períodos do fold atual
-            train_start = current_start
-            train_end = train_start + pd.DateOffset(months=self.train_months)
-            
-            val_start = train_end
-            val_end = val_start + pd.DateOffset(months=self.validation_months)
-            
-            test_start = val_end
-            test_end = test_start + pd.DateOffset(months=self.test_months)
+            train_end = current_start + pd.DateOffset(months=self.train_months)
+            val_end = train_end + pd.DateOffset(months=self.validation_months)
+            test_end = val_end + pd.DateOffset(months=self.test_months)
             
             # Verifica se ainda temos dados suficientes
             if test_end > end_date:
                 break
             
-            # Filtra dados por período
-            train_mask = ((data_sorted[date_column] >= train_start) & 
-                         (data_sorted[date_column] < train_end))
-            val_mask = ((data_sorted[date_column] >= val_start) & 
-                       (data_sorted[date_column] < val_end))
-            test_mask = ((data_sorted[date_column] >= test_start) & 
-                        (data_sorted[date_column] < test_end))
-            
-            train_idx = data_sorted[train_mask].index.tolist()
-            val_idx = data_sorted[val_mask].index.tolist()
-            test_idx = data_sorted[test_mask].index.tolist()
-            
-            # Verifica se há amostras suficientes
-            if (len(train_idx) >= min_samples_per_fold and 
-                len(val_idx) >= min_samples_per_fold and 
-                len(test_idx) >= min_samples_per_fold):
-                
-                splits.append({
-                    'fold_id': fold_id,
-                    'train_idx': train_idx,
-                    'val_idx': val_idx,
-                    'test_idx': test_idx,
-                    'train_period': (train_start, train_end),
-                    'val_period': (val_start, val_end),
-                    'test_period': (test_start, test_end),
-                    'train_size': len(train_idx),
-                    'val_size': len(val_idx),
-                    'test_size': len(test_idx)
-                })
-                
-                fold_id += 1
+            periods.append((current_start, train_end, val_end, test_end))
             
             # Avança para próximo fold
             current_start = current_start + pd.DateOffset(months=self.step_months)
         
+        if not periods:
+            logger.info("Criados 0 folds temporais")
+            return splits
+        
+        # Posição do primeiro registro >= cada limite: [início, fim) de cada período
+        bounds = np.array([[boundary.value for boundary in period] for period in periods], dtype=np.int64)
+        positions = np.searchsorted(keys, bounds, side='left')
+        sizes = np.diff(positions, axis=1)
+        
+        fold_id = 0
+        for (train_start, train_end, val_end, test_end), (lo, train_hi, val_hi, test_hi), fold_sizes in zip(
+                periods, positions, sizes):
+            # Verifica se há amostras suficientes
+            if fold_sizes.min() < min_samples_per_fold:
+                continue
+            
+            splits.append({
+                'fold_id': fold_id,
+                'train_idx': order[lo:train_hi],
+                'val_idx': order[train_hi:val_hi],
+                'test_idx': order[val_hi:test_hi],
+                'train_period': (train_start, train_end),
+                'val_period': (train_end, val_end),
+                'test_period': (val_end, test_end),
+                'train_size': int(fold_sizes[0]),
+                'val_size': int(fold_sizes[1]),
+                'test_size': int(fold_sizes[2])
+            })
+            
+            fold_id += 1
+        
         logger.info(f"Criados {len(splits)} folds temporais")
         return splits
     
@@ -154,74 +295,97 @@ class TemporalCrossValidator:
         Returns:
             Resultados da validação
         """
+        return self.validate_models({'model': model}, X, y, splits, fit_params)['model']
+    
+    def validate_models(self,
+                        models: Dict[str, Any],
+                        X: np.ndarray,
+                        y: np.ndarray,
+                        splits: List[Dict[str, Any]],
+                        fit_params: Optional[Dict] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Executa a validação temporal de vários modelos
+        
+        Cada par (modelo, fold) é independente: com n_jobs != 1 os pares são
+        distribuídos em um pool de processos que lê X e y da memória
+        compartilhada (ver ml.parallel_training.SharedArray).
+        
+        Args:
+            models: Dicionário {nome: modelo scikit-learn}
+            X: Features
+            y: Target
+            splits: Splits temporais
+            fit_params: Parâmetros para fit (os mesmos para todos os modelos)
+            
+        Returns:
+            {nome: resultados da validação}, no formato de validate_model; com
+            prediction_store, 'predictions' dá lugar a 'prediction_key' (a
+            chave das previsões no store, o nome do modelo)
+        """
         if fit_params is None:
             fit_params = {}
         
+        n_workers = _resolve_workers(self.n_jobs, len(models) * len(splits))
+        if n_workers > 1:
+            folds = self._validate_folds_parallel(models, X, y, splits, fit_params, n_workers)
+        else:
+            folds = {
+                name: [_validate_and_store(model, X, y, split, fit_params,
+                                           self.prediction_store, name, self.resampler)
+                       for split in splits]
+                for name, model in models.items()
+            }
+        
+        results = {}
+        for name, model_folds in folds.items():
+            for metrics, _ in model_folds:
+                logger.info(f"{name} fold {metrics['fold_id']}: AUC={metrics['auc']:.3f}, "
+                           f"F1={metrics['f1']:.3f}, Acc={metrics['accuracy']:.3f}")
+            results[name] = self._aggregate_folds(model_folds)
+            if self.prediction_store is not None:
+                results[name]['prediction_key'] = name
+        
+        return results
+    
+    def _validate_folds_parallel(self, models, X, y, splits, fit_params,
+                                 n_workers: int) -> Dict[str, List[Tuple[Dict, Dict]]]:
+        """Distribui os pares (modelo, fold) em um pool de processos"""
+        from concurrent.futures import ProcessPoolExecutor
+        from multiprocessing import get_context
+        from .parallel_training import SharedArray
+        
+        threads = max(1, (os.cpu_count() or 1) // n_workers)
+        shared_X, shared_y = SharedArray(X), SharedArray(y)
+        try:
+            with ProcessPoolExecutor(max_workers=n_workers, mp_context=get_context('spawn')) as executor:
+                futures = {
+                    name: [
+                        executor.submit(
+                            _validate_fold_task, model, shared_X.spec, shared_y.spec,
+                            split, fit_params, threads, self.prediction_store, name,
+                            self.resampler
+                        )
+                        for split in splits
+                    ]
+                    for name, model in models.items()
+                }
+                logger.info(f"Validação temporal: {len(models) * len(splits)} pares "
+                           f"(modelo, fold) em {n_workers} processos")
+                return {name: [future.result() for future in model_futures]
+                        for name, model_futures in futures.items()}
+        finally:
+            shared_X.close()
+            shared_y.close()
+    
+    def _aggregate_folds(self, folds: List[Tuple[Dict[str, Any], Dict[str, Any]]]) -> Dict[str, Any]:
+        """Agrega métricas e previsões dos folds de um modelo"""
         results = {
-            'fold_results': [],
+            'fold_results': [metrics for metrics, _ in folds],
             'mean_metrics': {},
             'std_metrics': {},
             'temporal_stability': {}
         }
-        
-        fold_metrics = []
-        fold_predictions = []
-        
-        for split in splits:
-            fold_id = split['fold_id']
-            train_idx = split['train_idx']
-            val_idx = split['val_idx']
-            test_idx = split['test_idx']
-            
-            # Treina modelo no período de treino
-            X_train = X[train_idx]
-            y_train = y[train_idx]
-            
-            # Clona modelo para evitar interferência entre folds
-            from sklearn.base import clone
-            model_fold = clone(model)
-            model_fold.fit(X_train, y_train, **fit_params)
-            
-            # Avalia no período de validação
-            X_val = X[val_idx]
-            y_val = y[val_idx]
-            
-            if hasattr(model_fold, 'predict_proba'):
-                y_val_pred_proba = model_fold.predict_proba(X_val)[:, 1]
-            else:
-                y_val_pred_proba = model_fold.decision_function(X_val)
-            
-            y_val_pred = model_fold.predict(X_val)
-            
-            # Calcula métricas
-            metrics = {
-                'fold_id': fold_id,
-                'accuracy': accuracy_score(y_val, y_val_pred),
-                'precision': precision_score(y_val, y_val_pred, zero_division=0),
-                'recall': recall_score(y_val, y_val_pred, zero_division=0),
-                'f1': f1_score(y_val, y_val_pred, zero_division=0),
-                'auc': roc_auc_score(y_val, y_val_pred_proba) if len(np.unique(y_val)) > 1 else 0,
-                'train_period': split['train_period'],
-                'val_period': split['val_period'],
-                'train_size': len(train_idx),
-                'val_size': len(val_idx),
-                'churn_rate_train': y_train.mean(),
-                'churn_rate_val': y_val.mean()
-            }
-            
-            fold_metrics.append(metrics)
-            fold_predictions.append({
-                'fold_id': fold_id,
-                'val_idx': val_idx,
-                'y_true': y_val,
-                'y_pred': y_val_pred,
-                'y_pred_proba': y_val_pred_proba
-            })
-            
-            results['fold_results'].append(metrics)
-            
-            logger.info(f"Fold {fold_id}: AUC={metrics['auc']:.3f}, "
-                       f"F1={metrics['f1']:.3f}, Acc={metrics['accuracy']:.3f}")
+        fold_metrics = results['fold_results']
         
         # Calcula métricas agregadas
         metric_names = ['accuracy', 'precision', 'recall', 'f1', 'auc']
@@ -233,8 +397,9 @@ class TemporalCrossValidator:
         # Analisa estabilidade temporal
         results['temporal_stability'] = self._analyze_temporal_stability(fold_metrics)
         
-        # Salva predições para análise posterior
-        results['predictions'] = fold_predictions
+        # Salva predições para análise posterior (a menos que estejam no store)
+        if self.prediction_store is None:
+            results['predictions'] = [predictions for _, predictions in folds]
         
         return results
     
@@ -284,71 +449,58 @@ class TemporalCrossValidator:
                                      y: np.ndarray,
                                      splits: List[Dict[str, Any]],
                                      scoring: str = 'auc',
-                                     n_jobs: int = 1) -> Dict[str, Any]:
+                                     n_jobs: Optional[int] = None,
+                                     n_trials: Optional[int] = None,
+                                     timeout: Optional[float] = None,
+                                     sampler: Optional[str] = None,
+                                     pruner: Optional[str] = None) -> Dict[str, Any]:
         """
         Otimização de hiperparâmetros com validação temporal
         
+        Trials do Optuna avaliados fold a fold, com pruning dos que ficam
+        abaixo da mediana (ou ASHA) e estudo persistido em SQLite para retomar
+        buscas interrompidas (ver ml.hyperparameter_search).
+        
         Args:
             model: Modelo base
-            param_grid: Grid de parâmetros
+            param_grid: Espaço de busca (listas de valores ou intervalos (low, high[, 'log']))
             X: Features
             y: Target
             splits: Splits temporais
             scoring: Métrica para otimização
-            n_jobs: Jobs paralelos
+            n_jobs: Processos com trials em paralelo (padrão: n_jobs do validador)
+            n_trials: Número de trials (padrão: tamanho da grade)
+            timeout: Segundos desta execução
+            sampler: 'tpe', 'random' ou 'grid' (padrão: 'grid' para grades só de
+                listas, senão ML_HPO_SAMPLER)
+            pruner: 'median', 'asha' ou 'none' (padrão: ML_HPO_PRUNER)
             
         Returns:
-            Melhores parâmetros e resultados
+            Melhores parâmetros e resultados (só métricas; as previsões de cada
+            trial ficam no prediction_store, se houver, em 'prediction_key')
         """
-        best_score = -np.inf
-        best_params = None
-        all_results = []
+        from .hyperparameter_search import TemporalHyperparameterSearch
         
-        # Gera combinações de parâmetros
-        param_combinations = list(ParameterGrid(param_grid))
+        options = {key: value for key, value in (('sampler', sampler), ('pruner', pruner))
+                   if value is not None}
+        search = TemporalHyperparameterSearch(
+            n_jobs=self.n_jobs if n_jobs is None else n_jobs, **options
+        )
+        results = search.run(model, param_grid, X, y, splits, scoring=scoring,
+                             n_trials=n_trials, timeout=timeout,
+                             prediction_store=self.prediction_store,
+                             resampler=self.resampler)
         
-        logger.info(f"Testando {len(param_combinations)} combinações de parâmetros")
+        logger.info(f"Busca {results['study_name']}: {results['n_combinations_tested']} trials "
+                   f"({results['n_pruned']} podados), melhor {scoring}: {results['best_score']:.3f}")
         
-        for i, params in enumerate(param_combinations):
-            # Configura modelo com parâmetros
-            from sklearn.base import clone
-            model_test = clone(model)
-            model_test.set_params(**params)
-            
-            # Executa validação temporal
-            results = self.validate_model(model_test, X, y, splits)
-            
-            # Obtém score
-            score = results['mean_metrics'][scoring]
-            
-            result_entry = {
-                'params': params,
-                'score': score,
-                'score_std': results['std_metrics'][scoring],
-                'stability': results['temporal_stability'],
-                'detailed_results': results
-            }
-            
-            all_results.append(result_entry)
-            
-            # Atualiza melhor resultado
-            if score > best_score:
-                best_score = score
-                best_params = params
-            
-            if (i + 1) % 10 == 0:
-                logger.info(f"Progresso: {i + 1}/{len(param_combinations)} "
-                          f"(melhor {scoring}: {best_score:.3f})")
-        
-        # Ordena resultados por score
-        all_results.sort(key=lambda x: x['score'], reverse=True)
-        
-        return {
-            'best_params': best_params,
-            'best_score': best_score,
-            'all_results': all_results,
-            'n_combinations_tested': len(param_combinations)
-        }
+        return results
+    
+    def fold_predictions(self, results: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Previsões por fold de um resultado, da memória ou do prediction_store"""
+        if 'predictions' in results:
+            return results['predictions']
+        return self.prediction_store.load_all(results['prediction_key'])
     
     def save_validation_results(self, 
                                results: Dict[str, Any], 
@@ -407,16 +559,13 @@ class TemporalModelSelector:
         Returns:
             Resultados da comparação
         """
-        results = {}
+        logger.info(f"Avaliando modelos: {', '.join(models)}")
         
-        for model_name, model in models.items():
-            logger.info(f"Avaliando modelo: {model_name}")
-            
-            model_results = self.validator.validate_model(model, X, y, splits)
-            results[model_name] = model_results
-            
-            # Salva para comparação posterior
-            self.model_results[model_name] = model_results
+        # Todos os pares (modelo, fold) de uma vez (em paralelo se o validador usar n_jobs)
+        results = self.validator.validate_models(models, X, y, splits)
+        
+        # Salva para comparação posterior
+        self.model_results.update(results)
         
         # Cria ranking
         ranking = self._create_model_ranking(results)
@@ -0,0 +1,221 @@
+"""
+Cache em disco da matriz de treino de churn
+
+Extrair as tabelas e calcular features e normalização é a parte fixa de todo
+treino, validação temporal ou busca de hiperparâmetros. A matriz já
+normalizada (X), os rótulos (y), a data de referência de cada cliente e o
+scaler ficam gravados como .npy em um diretório por snapshot dos dados e são
+abertos com mmap_mode='r' nos usos seguintes:
+
+    models/churn/training_cache/
+        <snapshot>/
+            X.npy, y.npy, data_referencia.npy, cliente_ids.npy
+            scaler.pkl, meta.json
+
+O snapshot é um hash de, para cada tabela de origem, o número de linhas e o
+maior data_ultima_atualizacao, mais a lista de features e o dia de
+referência (features como dias até o vencimento mudam com a data). Qualquer
+inserção, alteração ou remoção nas tabelas gera um snapshot novo; a matriz é
+recalculada só nesse caso.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, List, Optional, Union
+
+import joblib
+import numpy as np
+
+from config import ML_TRAINING_CACHE_DIR, ML_TRAINING_CACHE_KEEP
+
+logger = logging.getLogger(__name__)
+
+ARRAYS = ('X', 'y', 'data_referencia', 'cliente_ids')
+META_FILE = "meta.json"
+
+
+def _source_models():
+    from models.cliente import Cliente
+    from models.contrato import Contrato
+    from models.renovacao import Renovacao
+    from models.health_score_snapshot import HealthScoreSnapshot
+    from models.csat_resposta import CSATResposta
+    from models.evento_cs import EventoCS
+
+    return [Cliente, Contrato, Renovacao, HealthScoreSnapshot, CSATResposta, EventoCS]
+
+
+def reference_day(now: Optional[datetime] = None) -> datetime:
+    """Início do dia: data de referência das features de uma matriz em cache"""
+    return (now or datetime.now()).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def dataset_snapshot_id(db_session, feature_names: List[str],
+                        reference_date: Optional[datetime] = None) -> str:
+    """
+    Identifica o estado atual dos dados de treino (uma query por tabela)
+
+    Args:
+        db_session: Sessão SQLAlchemy
+        feature_names: Features da matriz (mudanças de código invalidam o cache)
+        reference_date: Data de referência das features (padrão: hoje)
+    """
+    from sqlalchemy import func
+
+    state = {
+        'features': feature_names,
+        'reference_date': reference_day(reference_date).isoformat()
+    }
+    for model in _source_models():
+        count, last_update = db_session.query(
+            func.count(), func.max(model.data_ultima_atualizacao)
+        ).select_from(model).one()
+        state[model.__tablename__] = [count, str(last_update)]
+
+    return hashlib.sha256(json.dumps(state, sort_keys=True).encode()).hexdigest()[:16]
+
+
+class TrainingMatrix:
+    """Matriz de treino normalizada de um snapshot dos dados"""
+
+    def __init__(self, X: np.ndarray, y: np.ndarray, data_referencia: np.ndarray,
+                 cliente_ids: np.ndarray, scaler, snapshot_id: Optional[str] = None):
+        self.X = X
+        self.y = y
+        self.data_referencia = data_referencia
+        self.cliente_ids = cliente_ids
+        self.scaler = scaler
+        self.snapshot_id = snapshot_id
+
+    def temporal_data(self):
+        """DataFrame com 'data_referencia', no formato de train_models(temporal_data=...)"""
+        import pandas as pd
+        return pd.DataFrame({'data_referencia': self.data_referencia})
+
+
+class TrainingMatrixCache:
+    """
+    Matrizes de treino em disco, uma por snapshot dos dados
+
+    Uso:
+        matrix = TrainingMatrixCache().get_or_build(db_session, trainer)
+        trainer.train_models(matrix.X, matrix.y)
+    """
+
+    def __init__(self, cache_dir: Union[str, Path] = ML_TRAINING_CACHE_DIR,
+                 keep: int = ML_TRAINING_CACHE_KEEP):
+        self.cache_dir = Path(cache_dir)
+        self.keep = keep
+
+    def get(self, snapshot_id: str) -> Optional[TrainingMatrix]:
+        """Matriz do snapshot com arrays em mmap, ou None se não houver"""
+        path = self.cache_dir / snapshot_id
+        if not (path / META_FILE).exists():
+            return None
+
+        try:
+            arrays = {name: np.load(path / f"{name}.npy", mmap_mode='r') for name in ARRAYS}
+            scaler = joblib.load(path / "scaler.pkl")
+        except (OSError, ValueError) as e:
+            logger.warning(f"Matriz de treino {snapshot_id} ilegível, recalculando: {e}")
+            return None
+
+        os.utime(path)  # usada recentemente: preservada pela limpeza
+        return TrainingMatrix(scaler=scaler, snapshot_id=snapshot_id, **arrays)
+
+    def put(self, matrix: TrainingMatrix) -> Path:
+        """Grava a matriz em um diretório temporário e o renomeia (atômico)"""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        staging = self.cache_dir / f".staging-{uuid.uuid4().hex[:8]}"
+        staging.mkdir()
+        try:
+            for name in ARRAYS:
+                np.save(staging / f"{name}.npy", np.asarray(getattr(matrix, name)))
+            joblib.dump(matrix.scaler, staging / "scaler.pkl")
+            (staging / META_FILE).write_text(json.dumps({
+                'snapshot_id': matrix.snapshot_id,
+                'n_samples': int(len(matrix.y)),
+                'n_features': int(matrix.X.shape[1]),
+                'created_at': datetime.now().isoformat()
+            }))
+
+            path = self.cache_dir / matrix.snapshot_id
+            try:
+                os.replace(staging, path)
+            except OSError:
+                # Outro processo gravou o mesmo snapshot antes
+                shutil.rmtree(staging, ignore_errors=True)
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        self.prune()
+        return path
+
+    def prune(self):
+        """Remove snapshots além dos `keep` usados mais recentemente"""
+        snapshots = sorted(
+            (path for path in self.cache_dir.iterdir()
+             if path.is_dir() and not path.name.startswith('.')),
+            key=lambda path: path.stat().st_mtime, reverse=True
+        )
+        for path in snapshots[self.keep:]:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def get_or_build(self, db_session, trainer,
+                     progress: Optional[Callable[..., None]] = None) -> TrainingMatrix:
+        """
+        Matriz do snapshot atual: do cache, ou extraída e calculada uma vez
+
+        Args:
+            db_session: Sessão SQLAlchemy
+            trainer: ChurnPredictor que receberá o scaler da matriz
+            progress: Callback de etapas (extract, features)
+        """
+        progress = progress or (lambda stage, **info: None)
+        reference_date = reference_day()
+        snapshot_id = dataset_snapshot_id(db_session, trainer.feature_names, reference_date)
+
+        matrix = self.get(snapshot_id)
+        if matrix is not None:
+            progress('extract', cached=True)
+            progress('features', cached=True, clientes=len(matrix.y))
+            logger.info(f"Matriz de treino em cache: snapshot {snapshot_id} ({len(matrix.y)} clientes)")
+        else:
+            matrix = self._build(db_session, trainer, snapshot_id, reference_date, progress)
+            self.put(matrix)
+            logger.info(f"Matriz de treino calculada: snapshot {snapshot_id} ({len(matrix.y)} clientes)")
+
+        trainer.scaler = matrix.scaler
+        return matrix
+
+    @staticmethod
+    def _build(db_session, trainer, snapshot_id: str, reference_date: datetime,
+               progress: Callable[..., None]) -> TrainingMatrix:
+        import pandas as pd
+        from .data_loader import ChurnDataLoader
+
+        # Todas as tabelas em um número fixo de queries
+        progress('extract')
+        tables = ChurnDataLoader().load_tables(db_session, reference_date=reference_date)
+        clientes = tables['clientes']
+
+        progress('features', clientes=len(clientes))
+        X, y = trainer.prepare_training_data_batch(
+            clientes, tables['contratos'], tables['health_scores'],
+            tables['csat_respostas'], tables['eventos'],
+            reference_date=reference_date
+        )
+
+        return TrainingMatrix(
+            X=X, y=y,
+            data_referencia=pd.to_datetime(clientes['data_ultima_atualizacao']).to_numpy(dtype='datetime64[ns]'),
+            cliente_ids=clientes['id'].to_numpy(),
+            scaler=trainer.scaler,
+            snapshot_id=snapshot_id
+        )
@@ -0,0 +1,381 @@
+"""
+Jobs de treino dos modelos de churn em processo separado
+
+O treino (balanceamento, quatro modelos, rede neural) roda em um processo filho, com
+prioridade reduzida e sessão de banco própria; os workers da API apenas
+iniciam, acompanham e cancelam. O estado de cada job fica em um JSON em
+ML_TRAINING_JOBS_DIR, legível por qualquer worker e preservado entre
+reinícios:
+
+    queued -> running -> succeeded | failed | cancelled
+
+Etapas publicadas em `stage`: extract, features, model:<nome>, ensemble,
+explainers e save. O cancelamento é cooperativo (arquivo <job>.cancel,
+verificado a cada etapa e a cada época da rede neural); se o processo não
+parar em ML_TRAINING_CANCEL_GRACE_SECONDS, o worker que o iniciou o encerra.
+Um único job roda por vez (arquivo ACTIVE, criado com O_EXCL).
+"""
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from config import (
+    settings, ML_MODEL_PATH, ML_TRAINING_JOBS_DIR, ML_TRAINING_NICE,
+    ML_TRAINING_CANCEL_GRACE_SECONDS
+)
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ('queued', 'running')
+TERMINAL_STATUSES = ('succeeded', 'failed', 'cancelled')
+
+# Etapas de um treino padrão, para o percentual de progresso
+STAGES = [
+    'extract', 'features', 'model:random_forest', 'model:xgboost', 'model:lightgbm',
+    'model:neural_network', 'ensemble', 'explainers', 'save'
+]
+
+ACTIVE_FILE = "ACTIVE"
+
+# Job enfileirado cujo processo não registrou o pid há mais que isso foi
+# perdido (worker reiniciado antes de iniciar o processo)
+QUEUED_TIMEOUT_SECONDS = 300
+
+
+class TrainingCancelled(Exception):
+    """Cancelamento solicitado durante o treino"""
+
+
+def _json_default(value):
+    # Métricas chegam como escalares NumPy
+    return value.item() if hasattr(value, 'item') else str(value)
+
+
+def _pid_alive(pid: Optional[int]) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class TrainingJobStore:
+    """Estado dos jobs de treino em arquivos JSON (um por job)"""
+    
+    def __init__(self, jobs_dir: Union[str, Path] = ML_TRAINING_JOBS_DIR):
+        self.jobs_dir = Path(jobs_dir)
+        self.active_file = self.jobs_dir / ACTIVE_FILE
+    
+    def _path(self, job_id: str) -> Path:
+        return self.jobs_dir / f"{job_id}.json"
+    
+    def _cancel_path(self, job_id: str) -> Path:
+        return self.jobs_dir / f"{job_id}.cancel"
+    
+    def _write(self, job: Dict[str, Any]):
+        tmp = self.jobs_dir / f".{job['job_id']}.{uuid.uuid4().hex[:8]}"
+        tmp.write_text(json.dumps(job, default=_json_default))
+        os.replace(tmp, self._path(job['job_id']))
+    
+    def _read(self, job_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            return json.loads(self._path(job_id).read_text())
+        except (FileNotFoundError, ValueError):
+            return None
+    
+    def create(self, **fields) -> Dict[str, Any]:
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        now = datetime.now().isoformat()
+        job = {
+            'job_id': uuid.uuid4().hex[:12],
+            'status': 'queued',
+            'stage': None,
+            'progress': 0.0,
+            'stages': [],
+            'created_at': now,
+            'updated_at': now,
+            'started_at': None,
+            'finished_at': None,
+            'pid': None,
+            'model_version': None,
+            'results': None,
+            'error': None,
+            **fields
+        }
+        self._write(job)
+        return job
+    
+    def update(self, job_id: str, **fields) -> Dict[str, Any]:
+        """
+        Atualiza campos de um job
+        
+        Só o processo de treino escreve enquanto o job roda (inclusive o
+        próprio pid, ao passar a running); a API escreve antes (criação) e
+        depois (processo encerrado), sem concorrência.
+        """
+        job = self._read(job_id) or {'job_id': job_id}
+        job.update(fields, updated_at=datetime.now().isoformat())
+        self._write(job)
+        return job
+    
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Estado do job; jobs cujo processo morreu são marcados como falhos"""
+        job = self._read(job_id)
+        if job is None or job['status'] not in ACTIVE_STATUSES:
+            return job
+        
+        if job['status'] == 'running' and not _pid_alive(job.get('pid')):
+            return self._mark_lost(job, "Processo de treino encerrado inesperadamente")
+        
+        if job['status'] == 'queued' and not job.get('pid'):
+            age = (datetime.now() - datetime.fromisoformat(job['created_at'])).total_seconds()
+            if age > QUEUED_TIMEOUT_SECONDS:
+                return self._mark_lost(job, "Job não foi iniciado")
+        
+        return job
+    
+    def _mark_lost(self, job: Dict[str, Any], error: str) -> Dict[str, Any]:
+        job = self.update(
+            job['job_id'], status='failed', error=error, finished_at=datetime.now().isoformat()
+        )
+        self.release_active(job['job_id'])
+        return job
+    
+    def list(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Jobs mais recentes primeiro"""
+        if not self.jobs_dir.exists():
+            return []
+        
+        jobs = [self.get(path.stem) for path in self.jobs_dir.glob('*.json')]
+        jobs = sorted((job for job in jobs if job), key=lambda job: job['created_at'], reverse=True)
+        return jobs[:limit]
+    
+    def latest(self, status: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        for job in self.list(limit=None):
+            if status is None or job['status'] == status:
+                return job
+        return None
+    
+    def request_cancel(self, job_id: str):
+        self._cancel_path(job_id).touch()
+    
+    def cancel_requested(self, job_id: str) -> bool:
+        return self._cancel_path(job_id).exists()
+    
+    def acquire_active(self, job_id: str) -> Optional[str]:
+        """
+        Reserva a vaga de job ativo
+        
+        Returns:
+            None se reservou; senão o ID do job que já está ativo
+        """
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        for _ in range(2):
+            try:
+                fd = os.open(self.active_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                active_id = self.active_file.read_text().strip()
+                active = self.get(active_id) if active_id else None
+                if active and active['status'] in ACTIVE_STATUSES:
+                    return active_id
+                # Vaga presa por um job já encerrado
+                self.release_active(active_id)
+                continue
+            with os.fdopen(fd, 'w') as f:
+                f.write(job_id)
+            return None
+        return self.active_file.read_text().strip()
+    
+    def release_active(self, job_id: str):
+        try:
+            if self.active_file.read_text().strip() in (job_id, ''):
+                self.active_file.unlink()
+        except FileNotFoundError:
+            pass
+        try:
+            self._cancel_path(job_id).unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _run_job(job_id: str, jobs_dir: str, model_path: str, database_url: str,
+             validation_split: float):
+    """Ponto de entrada do processo de treino"""
+    logging.basicConfig(level=logging.INFO)
+    store = TrainingJobStore(jobs_dir)
+    
+    try:
+        os.nice(ML_TRAINING_NICE)
+    except (AttributeError, OSError):
+        pass
+    
+    stages: List[Dict[str, Any]] = []
+    
+    def progress(stage: str, **info):
+        if store.cancel_requested(job_id):
+            raise TrainingCancelled()
+        
+        if not stages or stages[-1]['stage'] != stage:
+            stages.append({'stage': stage, 'started_at': datetime.now().isoformat()})
+        done = sum(1 for s in STAGES if any(entry['stage'] == s for entry in stages[:-1]))
+        store.update(
+            job_id, stage=stage, stage_info=info, stages=stages,
+            progress=round(min(done / len(STAGES), 0.99), 3)
+        )
+    
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    
+    engine = create_engine(database_url, pool_pre_ping=True)
+    session = sessionmaker(bind=engine)()
+    try:
+        store.update(job_id, status='running', pid=os.getpid(), started_at=datetime.now().isoformat())
+        
+        from ml.churn_predictor import train_predictor
+        trainer, results = train_predictor(session, progress, validation_split=validation_split)
+        
+        progress('save')
+        trainer.save_models(model_path)
+        
+        store.update(
+            job_id, status='succeeded', stage=None, progress=1.0, results=results,
+            model_version=trainer.model_version, finished_at=datetime.now().isoformat()
+        )
+        logger.info(f"Job de treino {job_id} concluído: versão {trainer.model_version}")
+    
+    except TrainingCancelled:
+        store.update(job_id, status='cancelled', finished_at=datetime.now().isoformat())
+        logger.info(f"Job de treino {job_id} cancelado")
+    
+    except Exception as e:
+        logger.exception(f"Erro no job de treino {job_id}")
+        store.update(job_id, status='failed', error=str(e), finished_at=datetime.now().isoformat())
+    
+    finally:
+        session.close()
+        engine.dispose()
+        store.release_active(job_id)
+
+
+class TrainingJobRunner:
+    """
+    Inicia e acompanha jobs de treino em processos separados
+    
+    Uso:
+        runner = TrainingJobRunner(on_success=lambda job: service.refresh_models())
+        job, created = runner.start()
+        runner.get(job['job_id'])['progress']
+        runner.cancel(job['job_id'])
+    """
+    
+    def __init__(self,
+                 model_path: str = ML_MODEL_PATH,
+                 jobs_dir: Union[str, Path] = ML_TRAINING_JOBS_DIR,
+                 database_url: Optional[str] = None,
+                 on_success: Optional[Callable[[Dict[str, Any]], None]] = None):
+        """
+        Args:
+            model_path: Registro onde a nova versão é publicada
+            jobs_dir: Diretório com o estado dos jobs
+            database_url: Banco lido pelo treino (padrão: settings.DATABASE_URL)
+            on_success: Chamado neste processo quando um job iniciado aqui termina
+                com sucesso (ex: carregar a nova versão sem esperar o refresh)
+        """
+        self.model_path = model_path
+        self.store = TrainingJobStore(jobs_dir)
+        self.database_url = database_url or settings.DATABASE_URL
+        self.on_success = on_success
+        # spawn: o filho não herda threads, event loop nem conexões da API
+        self._context = multiprocessing.get_context('spawn')
+    
+    def start(self, validation_split: float = 0.2) -> Tuple[Dict[str, Any], bool]:
+        """
+        Inicia um job, ou retorna o que já está em andamento
+        
+        Returns:
+            (job, True se foi criado agora)
+        """
+        job = self.store.create(validation_split=validation_split)
+        active_id = self.store.acquire_active(job['job_id'])
+        if active_id is not None:
+            self.store._path(job['job_id']).unlink()
+            return self.store.get(active_id), False
+        
+        try:
+            process = self._context.Process(
+                target=_run_job,
+                args=(job['job_id'], str(self.store.jobs_dir), self.model_path,
+                      self.database_url, validation_split),
+                name=f"churn-training-{job['job_id']}"
+            )
+            process.start()
+        except Exception as e:
+            self.store.update(job['job_id'], status='failed', error=str(e),
+                              finished_at=datetime.now().isoformat())
+            self.store.release_active(job['job_id'])
+            raise
+        
+        # O pid é gravado pelo próprio processo (ver _run_job); gravá-lo daqui
+        # poderia sobrescrever o status 'running' escrito pelo filho
+        job = {**job, 'pid': process.pid}
+        threading.Thread(
+            target=self._monitor, args=(job['job_id'], process),
+            name=f"churn-training-monitor-{job['job_id']}", daemon=True
+        ).start()
+        
+        logger.info(f"Job de treino {job['job_id']} iniciado (pid {process.pid})")
+        return job, True
+    
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.store.get(job_id)
+    
+    def list(self, limit: int = 20) -> List[Dict[str, Any]]:
+        return self.store.list(limit)
+    
+    def latest(self, status: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        return self.store.latest(status)
+    
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Solicita o cancelamento; o job para na próxima etapa ou época"""
+        job = self.store.get(job_id)
+        if job is not None and job['status'] in ACTIVE_STATUSES:
+            self.store.request_cancel(job_id)
+            job['cancel_requested'] = True
+        return job
+    
+    def _monitor(self, job_id: str, process):
+        """Aguarda o processo, aplica o prazo de cancelamento e notifica o sucesso"""
+        cancel_deadline = None
+        while process.is_alive():
+            process.join(timeout=1.0)
+            
+            if cancel_deadline is None and self.store.cancel_requested(job_id):
+                cancel_deadline = time.monotonic() + ML_TRAINING_CANCEL_GRACE_SECONDS
+            
+            if cancel_deadline is not None and time.monotonic() > cancel_deadline and process.is_alive():
+                logger.warning(f"Job de treino {job_id} não parou após o cancelamento; encerrando")
+                process.terminate()
+                process.join()
+                self.store.update(job_id, status='cancelled', finished_at=datetime.now().isoformat())
+                self.store.release_active(job_id)
+        
+        job = self.store.get(job_id)
+        if job and job['status'] in ACTIVE_STATUSES:
+            # Processo encerrado antes de registrar o resultado (ex: erro na importação)
+            job = self.store._mark_lost(job, "Processo de treino encerrado inesperadamente")
+        if job and job['status'] == 'succeeded' and self.on_success:
+            try:
+                self.on_success(job)
+            except Exception as e:
+                logger.error(f"Erro ao aplicar resultado do job de treino {job_id}: {e}")
@@ -18,6 +18,7 @@ from .churn_evento import ChurnEvento
 from .assessor import Assessor
 from .health_score_snapshot import HealthScoreSnapshot
 from .csat_resposta import CSATResposta
+from .churn_risk_score import ChurnRiskScore
 
 __all__ = [
     "Base",
@@ -36,4 +37,5 @@ __all__ = [
     "Assessor",
     "HealthScoreSnapshot",
     "CSATResposta",
+    "ChurnRiskScore",
 ] 
\ No newline at end of file
@@ -0,0 +1,60 @@
+"""
+Modelo de score de risco de churn pré-calculado
+"""
+from sqlalchemy import Column, String, Integer, Float, DateTime, JSON, ForeignKey, Index
+from sqlalchemy.orm import relationship
+from .base import Base, TimestampMixin
+
+
+class ChurnRiskScore(Base, TimestampMixin):
+    """Score de risco de churn por cliente, calculado pelo job noturno de scoring"""
+
+    __tablename__ = "churn_risk_score"
+
+    # Primary key
+    id = Column(Integer, primary_key=True, index=True)
+
+    # Campo de identificação (um score vigente por cliente)
+    cliente_id = Column(ForeignKey("cliente.id"), nullable=False, unique=True, index=True)
+
+    # Resultado do scoring
+    risk_score = Column(Float, nullable=False, index=True)
+    risk_level = Column(String(20), nullable=False)
+    top_features = Column(JSON)
+    recommendations = Column(JSON)
+
+    # Features de contexto exibidas na análise de risco
+    health_score = Column(Float)
+    dias_vencimento = Column(Integer)
+    csat_medio = Column(Float)
+
+    # Geração de modelos e momento do cálculo
+    model_version = Column(String(64), nullable=False, index=True)
+    data_calculo = Column(DateTime, nullable=False, index=True)
+
+    # Relacionamentos
+    cliente = relationship("Cliente", back_populates="churn_risk_score")
+
+    # Índices compostos
+    __table_args__ = (
+        Index('idx_churn_risk_score_nivel_score', 'risk_level', risk_score.desc()),
+    )
+
+    def __repr__(self):
+        return f"<ChurnRiskScore(cliente_id={self.cliente_id}, risk_level='{self.risk_level}', risk_score={self.risk_score})>"
+
+    @property
+    def is_risco_alto(self) -> bool:
+        """Verifica se o cliente está em risco alto ou crítico"""
+        return self.risk_level in ("alto", "critico")
+
+    def to_dict(self, include_relationships: bool = False) -> dict:
+        """Converte o score de risco para dicionário"""
+        data = super().to_dict()
+
+        data["is_risco_alto"] = self.is_risco_alto
+
+        if include_relationships:
+            data["cliente"] = self.cliente.to_dict() if self.cliente else None
+
+        return data
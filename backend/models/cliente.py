@@ -44,6 +44,7 @@ class Cliente(Base, TimestampMixin):
     churn_eventos = relationship("ChurnEvento", back_populates="cliente")
     health_scores = relationship("HealthScoreSnapshot", back_populates="cliente")
     csat_respostas = relationship("CSATResposta", back_populates="cliente")
+    churn_risk_score = relationship("ChurnRiskScore", back_populates="cliente", uselist=False)
     
     # Índices compostos
     __table_args__ = (
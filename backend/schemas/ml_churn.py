@@ -98,6 +98,7 @@ class ChurnPredictionBatch(BaseModel):
     cliente_ids: List[str] = Field(..., description="Lista de IDs de clientes")
     include_features: bool = Field(True, description="Incluir análise de features")
     include_recommendations: bool = Field(True, description="Incluir recomendações")
+    chunk_size: int = Field(500, ge=1, le=5000, description="Clientes processados por bloco")
 
 
 class ChurnPredictionBatchResponse(BaseModel):
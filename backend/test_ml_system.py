@@ -81,6 +81,401 @@ def test_feature_engineering():
         print(f"❌ Feature Engineering - ERRO: {e}")
         return False
 
+def _synthetic_clients(n_clients=60, seed=42):
+    """Gera clientes sintéticos com contratos, health scores, CSAT e eventos"""
+    rng = np.random.RandomState(seed)
+    base = datetime(2024, 1, 1)
+
+    def random_date(max_days=900):
+        return (base - timedelta(days=int(rng.randint(-180, max_days)))).strftime('%Y-%m-%d')
+
+    def unique_dates(n):
+        offsets = rng.choice(np.arange(-180, 900), size=n, replace=False)
+        return [(base - timedelta(days=int(d))).strftime('%Y-%m-%d') for d in offsets]
+
+    clientes = []
+    for i in range(n_clients):
+        cliente = {
+            'id': i + 1,
+            'ltv_meses': int(rng.randint(0, 48)),
+            'ltv_valor': float(rng.uniform(0, 200000)),
+            'jornada_iniciada_em': random_date() if rng.rand() > 0.1 else None,
+            'status_cliente': rng.choice(['ativo', 'inativo', 'potencial', 'churn', 'desconhecido']),
+            'contratos': [
+                {
+                    'cliente_id': i + 1,
+                    'status_contrato': rng.choice(['ativo', 'vencido', 'encerrado']),
+                    'valor_mensal': float(rng.uniform(500, 8000)),
+                    'ciclo_atual': int(rng.randint(1, 5)),
+                    'data_fim': random_date() if rng.rand() > 0.1 else None,
+                    'renovacoes': int(rng.randint(0, 3)),
+                    'auto_renovacao': bool(rng.rand() > 0.5)
+                }
+                for _ in range(rng.randint(0, 4))
+            ],
+            'health_scores': [
+                {
+                    'id_cliente': i + 1,
+                    'health_score_total': int(rng.randint(0, 100)),
+                    'nivel_risco': rng.choice(['baixo', 'medio', 'alto', 'critico']),
+                    'componentes_baixos': ['engajamento'] * int(rng.randint(0, 3)),
+                    'data_avaliacao': data
+                }
+                for data in unique_dates(rng.randint(0, 4))
+            ],
+            'csat_respostas': [
+                {
+                    'id_cliente': i + 1,
+                    'avaliacao_call': int(rng.randint(1, 6)),
+                    'tem_feedback_negativo': bool(rng.rand() > 0.7),
+                    'data_resposta': data
+                }
+                for data in unique_dates(rng.randint(0, 4))
+            ],
+            'eventos_cs': [
+                {
+                    'cliente_id': i + 1,
+                    'data_evento': random_date(),
+                    'is_recente': bool(rng.rand() > 0.5),
+                    'is_atrasado': bool(rng.rand() > 0.7),
+                    'is_urgente': bool(rng.rand() > 0.8)
+                }
+                for _ in range(rng.randint(0, 5))
+            ]
+        }
+        clientes.append(cliente)
+
+    return clientes
+
+def test_batch_feature_parity():
+    """Testa paridade entre o modo em lote e o caminho por cliente"""
+    try:
+        from ml.churn_predictor import ChurnFeatureEngineer
+        import pandas as pd
+
+        engineer = ChurnFeatureEngineer()
+        clientes = _synthetic_clients()
+
+        # Empates: registros com a mesma data do mais recente, antes e depois dele
+        for i, cliente in enumerate(clientes[:12]):
+            for rows, date_field, changes in (
+                (cliente['health_scores'], 'data_avaliacao',
+                 lambda r: {'health_score_total': (r['health_score_total'] + 37) % 100,
+                            'nivel_risco': 'critico', 'componentes_baixos': []}),
+                (cliente['csat_respostas'], 'data_resposta',
+                 lambda r: {'avaliacao_call': r['avaliacao_call'] % 5 + 1})
+            ):
+                if rows:
+                    latest = max(rows, key=lambda r: r[date_field])
+                    rows.insert(0 if i % 2 else len(rows), {**latest, **changes(latest)})
+
+        # Caminho por cliente
+        feature_names = engineer.get_feature_names()
+        X_expected = np.array([
+            [engineer.create_features(
+                c, c['contratos'], c['health_scores'], c['csat_respostas'], c['eventos_cs']
+            ).get(name, 0) for name in feature_names]
+            for c in clientes
+        ], dtype=np.float32)
+
+        # Modo em lote (uma tabela por entidade)
+        tabela_clientes = pd.DataFrame([
+            {k: v for k, v in c.items() if not isinstance(v, list)} for c in clientes
+        ])
+        X_batch = engineer.create_features_batch(
+            tabela_clientes,
+            pd.DataFrame([r for c in clientes for r in c['contratos']]),
+            pd.DataFrame([r for c in clientes for r in c['health_scores']]),
+            pd.DataFrame([r for c in clientes for r in c['csat_respostas']]),
+            pd.DataFrame([r for c in clientes for r in c['eventos_cs']]),
+            reference_date=datetime.now()
+        )
+
+        if X_batch.dtype != np.float32 or X_batch.shape != X_expected.shape:
+            print(f"❌ Batch Features - formato inesperado: {X_batch.dtype} {X_batch.shape}")
+            return False
+
+        mismatches = ~np.isclose(X_batch, X_expected, rtol=1e-5, atol=1e-4)
+        if mismatches.any():
+            columns = sorted({feature_names[j] for j in np.where(mismatches)[1]})
+            print(f"❌ Batch Features - divergência nas features: {columns}")
+            return False
+
+        print(f"✅ Batch Features - OK ({X_batch.shape[0]} clientes x {X_batch.shape[1]} features)")
+        return True
+
+    except Exception as e:
+        print(f"❌ Batch Features - ERRO: {e}")
+        return False
+
+def test_batch_prediction():
+    """Testa previsão em lote contra a previsão cliente a cliente"""
+    try:
+        from ml.churn_predictor import ChurnPredictor
+        from sklearn.ensemble import RandomForestClassifier
+
+        predictor = ChurnPredictor()
+        clientes = _synthetic_clients(n_clients=30, seed=7)
+
+        # Treino rápido apenas com Random Forest
+        X, y = predictor.prepare_training_data(clientes)
+        y[:2] = [0, 1]  # Garante as duas classes
+        predictor.models = {
+            'random_forest': RandomForestClassifier(n_estimators=10, random_state=42).fit(X, y)
+        }
+
+        batch = predictor.predict_churn_batch(clientes)
+        for cliente, result in zip(clientes, batch):
+            single = predictor.predict_churn(
+                cliente, cliente['contratos'], cliente['health_scores'],
+                cliente['csat_respostas'], cliente['eventos_cs']
+            )
+            if result['cliente_id'] != cliente['id'] or not np.isclose(
+                result['risk_score'], single['risk_score'], atol=1e-5
+            ):
+                print(f"❌ Batch Prediction - divergência no cliente {cliente['id']}")
+                return False
+            if not np.allclose(
+                [result['features_importance'][name] for name in predictor.feature_names],
+                [single['features_importance'][name] for name in predictor.feature_names],
+                atol=1e-4
+            ):
+                print(f"❌ Batch Prediction - importância SHAP divergente no cliente {cliente['id']}")
+                return False
+
+        # Explicador SHAP construído uma vez e reutilizado entre previsões
+        explainer = predictor._get_shap_explainer()
+        if explainer is None or predictor._get_shap_explainer() is not explainer:
+            print("❌ Batch Prediction - explicador SHAP não reutilizado")
+            return False
+
+        print(f"✅ Batch Prediction - OK ({len(batch)} previsões)")
+        return True
+
+    except Exception as e:
+        print(f"❌ Batch Prediction - ERRO: {e}")
+        return False
+
+def _sqlite_session(n_clients=40, seed=3, url="sqlite://"):
+    """Cria um banco SQLite (padrão: em memória) com clientes e relacionamentos"""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    import models
+    from models.base import Base
+
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+
+    rng = np.random.RandomState(seed)
+    base = datetime.now()
+    componentes = [
+        'aprofundar_processos', 'interesse_genuino', 'comunicacao_ativa',
+        'clareza_objetivos', 'aceita_sugestoes', 'condicoes_financeiras',
+        'equipe_estrutura', 'maturidade_processos', 'delega_confianca', 'relacionamento'
+    ]
+
+    session.add(models.Assessor(id=1, nome="Assessor", email="assessor@teste.com"))
+    for i in range(1, n_clients + 1):
+        session.add(models.Cliente(
+            id=i, nome_principal=f"Cliente {i}",
+            status_cliente=rng.choice(['ativo', 'churn', 'inativo']),
+            jornada_iniciada_em=(base - timedelta(days=int(rng.randint(30, 900)))).date(),
+            ltv_meses=int(rng.randint(0, 40)), ltv_valor=float(rng.uniform(0, 100000))
+        ))
+        for _ in range(rng.randint(0, 3)):
+            session.add(models.Contrato(
+                cliente_id=i, data_inicio=(base - timedelta(days=365)).date(),
+                data_fim=(base + timedelta(days=int(rng.randint(-100, 300)))).date(),
+                duracao_meses=12, valor_mensal=float(rng.uniform(500, 5000)),
+                ciclo_atual=int(rng.randint(1, 4)), auto_renovacao=bool(rng.rand() > 0.5)
+            ))
+        for k in range(rng.randint(0, 4)):
+            session.add(models.HealthScoreSnapshot(
+                id_cliente=i, id_assessor=1, data_avaliacao=base - timedelta(days=30 * k + 1),
+                health_score_total=int(rng.randint(0, 100)),
+                nivel_risco=rng.choice(['baixo', 'medio', 'alto', 'critico']),
+                **{nome: int(rng.randint(1, 6)) for nome in componentes}
+            ))
+        for k in range(rng.randint(0, 4)):
+            session.add(models.CSATResposta(
+                id_cliente=i, id_consultor=1, data_resposta=base - timedelta(days=30 * k + 1),
+                avaliacao_call=int(rng.randint(1, 6)),
+                comentarios_gerais=rng.choice([None, ' ', 'Poderia melhorar'])
+            ))
+        for _ in range(rng.randint(0, 4)):
+            session.add(models.EventoCS(
+                cliente_id=i, tipo='call', titulo='Call',
+                data_evento=base + timedelta(days=int(rng.randint(-20, 20)), hours=1),
+                status=rng.choice(['agendado', 'realizado', 'cancelado'])
+            ))
+    session.commit()
+
+    return engine, session
+
+def test_bulk_data_loader():
+    """Testa o carregamento em lote (número constante de queries)"""
+    try:
+        from sqlalchemy import event
+        from ml.data_loader import ChurnDataLoader
+        import models
+
+        engine, session = _sqlite_session()
+        statements = []
+        event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+        tables = ChurnDataLoader().load_tables(session, status_cliente='ativo')
+        if len(statements) != 5:
+            print(f"❌ Bulk Loader - {len(statements)} queries (esperado 5)")
+            return False
+
+        # Indicadores derivados devem seguir as propriedades dos modelos
+        eventos = {
+            (e.cliente_id, e.data_evento): (e.is_atrasado, e.is_urgente)
+            for e in session.query(models.EventoCS).all()
+        }
+        for row in tables['eventos'].itertuples():
+            if eventos[(row.cliente_id, row.data_evento.to_pydatetime())] != (row.is_atrasado, row.is_urgente):
+                print("❌ Bulk Loader - indicadores de evento divergentes")
+                return False
+
+        feedback = {
+            (c.id_cliente, c.data_resposta): bool(c.tem_feedback_negativo)
+            for c in session.query(models.CSATResposta).all()
+        }
+        for row in tables['csat_respostas'].itertuples():
+            if feedback[(row.id_cliente, row.data_resposta.to_pydatetime())] != row.tem_feedback_negativo:
+                print("❌ Bulk Loader - feedback negativo divergente")
+                return False
+
+        print(f"✅ Bulk Loader - OK ({len(tables['clientes'])} clientes em 5 queries)")
+        return True
+
+    except Exception as e:
+        print(f"❌ Bulk Loader - ERRO: {e}")
+        return False
+
+def test_risk_scoring_job():
+    """Testa o scoring persistido e a leitura paginada de churn_risk_score"""
+    try:
+        from ml.churn_predictor import ChurnMLService
+        from ml.data_loader import ChurnDataLoader
+        from sklearn.ensemble import RandomForestClassifier
+
+        engine, session = _sqlite_session(n_clients=60)
+
+        # Treino rápido apenas com Random Forest sobre os dados do banco
+        service = ChurnMLService()
+        tables = ChurnDataLoader().load_tables(session)
+        X = service.predictor.feature_engineer.create_features_batch(
+            tables['clientes'], tables['contratos'], tables['health_scores'],
+            tables['csat_respostas'], tables['eventos']
+        )
+        y = (tables['clientes']['status_cliente'] == 'churn').to_numpy()
+        X_scaled = service.predictor.scaler.fit_transform(X)
+        service.predictor.models = {
+            'random_forest': RandomForestClassifier(n_estimators=10, random_state=42).fit(X_scaled, y)
+        }
+        service.predictor.model_version = 'teste'
+        service.is_trained = True
+
+        result = service.score_active_clients(session, chunk_size=16)
+        live = service.analyze_clients_risk(session, limit=1000, risk_threshold=0.0)
+        if result['total_scored'] != live['total_analyzed']:
+            print(f"❌ Risk Scoring - {result['total_scored']} scores gravados, esperado {live['total_analyzed']}")
+            return False
+
+        pages = [
+            service.get_stored_risk_analysis(session, limit=10, offset=offset, risk_threshold=0.0)
+            for offset in range(0, result['total_scored'], 10)
+        ]
+        stored = [c for page in pages for c in page['high_risk_clients']]
+        scores = [c['risk_score'] for c in stored]
+        if len(stored) != result['total_scored'] or scores != sorted(scores, reverse=True):
+            print("❌ Risk Scoring - paginação fora de ordem ou incompleta")
+            return False
+
+        insights = service.get_churn_insights(session)
+        live_insights = service.get_churn_insights(session, live=True)
+        if insights != live_insights:
+            print("❌ Risk Scoring - insights persistidos divergem do scoring ao vivo")
+            return False
+
+        # Re-scoring parcial (em blocos) substitui apenas os clientes informados
+        service.predictor.model_version = 'teste-2'
+        rescored = service.rescore_clients(session, [c['cliente_id'] for c in stored[:3]], chunk_size=2)
+        after = service.get_stored_risk_analysis(session, risk_threshold=0.0)
+        if rescored['total_scored'] != 3 or after['total_analyzed'] != result['total_scored']:
+            print(f"❌ Risk Scoring - re-scoring parcial inconsistente: {rescored} / {after['total_analyzed']}")
+            return False
+        if after['model_version'] != 'teste' or after['scored_at'] != pages[0]['scored_at']:
+            print("❌ Risk Scoring - geração reportada mudou com o re-scoring parcial")
+            return False
+        service.predictor.model_version = 'teste'
+
+        # Bloco com falha mantém os scores anteriores desses clientes
+        previous = {c['cliente_id']: c['risk_score'] for c in stored}
+        predict_tables = service._predict_tables
+        failing = set(sorted(previous)[:16])
+
+        def flaky_predict(tables, **kwargs):
+            if failing & set(tables['clientes']['id']):
+                raise RuntimeError("falha simulada")
+            return predict_tables(tables, **kwargs)
+
+        service._predict_tables = flaky_predict
+        partial = service.score_active_clients(session, chunk_size=16)
+        service._predict_tables = predict_tables
+        kept = {
+            c['cliente_id']: c['risk_score']
+            for c in service.get_stored_risk_analysis(session, limit=1000, risk_threshold=0.0)['high_risk_clients']
+        }
+        if not failing <= set(partial['failed']) or len(kept) != len(previous) or \
+                any(kept[cliente_id] != previous[cliente_id] for cliente_id in failing):
+            print("❌ Risk Scoring - bloco com falha removeu os scores anteriores")
+            return False
+
+        print(f"✅ Risk Scoring - OK ({result['total_scored']} clientes, modelo {pages[0]['model_version']})")
+        return True
+
+    except Exception as e:
+        print(f"❌ Risk Scoring - ERRO: {e}")
+        return False
+
+def test_risk_scoring_claim():
+    """Testa que só um worker executa a rodada diária do scoring"""
+    try:
+        import tempfile
+        from pathlib import Path
+        from ml.risk_scoring import claim_scheduled_run
+
+        class FakeRedis:
+            def __init__(self):
+                self.keys = {}
+
+            def set(self, key, value, nx=False, ex=None):
+                if nx and key in self.keys:
+                    return None
+                self.keys[key] = value
+                return True
+
+        redis_client = FakeRedis()
+        with tempfile.TemporaryDirectory() as tmp:
+            claims = [claim_scheduled_run('2024-01-01', redis_client, Path(tmp)) for _ in range(3)]
+            file_claims = [claim_scheduled_run('2024-01-01', None, Path(tmp)) for _ in range(3)]
+            next_day = claim_scheduled_run('2024-01-02', None, Path(tmp))
+
+        if claims != [True, False, False] or file_claims != [True, False, False] or not next_day:
+            print(f"❌ Scoring Único - reivindicações inesperadas: {claims} / {file_claims}")
+            return False
+
+        print("✅ Scoring Único - OK")
+        return True
+
+    except Exception as e:
+        print(f"❌ Scoring Único - ERRO: {e}")
+        return False
+
 def test_model_cache():
     """Testa sistema de cache"""
     try:
@@ -108,6 +503,889 @@ def test_model_cache():
         print(f"❌ Model Cache - ERRO: {e}")
         return False
 
+def test_model_cache_bounds():
+    """Testa os limites (entradas e bytes) do cache em memória"""
+    try:
+        from ml.model_cache import LRUCache
+
+        cache = LRUCache(max_entries=3, max_bytes=250, ttl=60)
+        for i in range(5):
+            cache.set(f"k{i}", {'valor': i}, size=50)
+        cache.get("k2")  # k2 passa a ser o mais recente
+        cache.set("k5", {'valor': 5}, size=120)
+
+        stats = cache.get_stats()
+        if cache.keys() != ["k4", "k2", "k5"] or stats['bytes'] != 220 or stats['evictions'] != 3:
+            print(f"❌ Model Cache Limites - estado inesperado: {cache.keys()} {stats}")
+            return False
+
+        cache.set("expira", 1, size=1, ttl=-1)
+        if cache.get("expira") is not None or cache.get_stats()['expirations'] != 1:
+            print("❌ Model Cache Limites - entrada expirada retornada")
+            return False
+
+        print("✅ Model Cache Limites - OK")
+        return True
+
+    except Exception as e:
+        print(f"❌ Model Cache Limites - ERRO: {e}")
+        return False
+
+def test_model_cache_tags():
+    """Testa a invalidação por tags (cliente e versão de modelo)"""
+    try:
+        from ml.model_cache import ModelCache
+
+        cache = ModelCache()
+        cache.cache_features('c1', {'f': 1.0})
+        cache.cache_features('c2', {'f': 2.0})
+        cache.cache_model_prediction('ensemble', 'h1', {'risk_score': 0.1}, cliente_id='c1', model_version='v1')
+        cache.cache_model_prediction('ensemble', 'h2', {'risk_score': 0.2}, cliente_id='c2', model_version='v1')
+
+        cache.invalidate_client_cache('c1')
+        if cache.get_cached_features('c1') is not None or cache.get_cached_prediction('ensemble', 'h1') is not None:
+            print("❌ Model Cache Tags - entradas do cliente não invalidadas")
+            return False
+        if cache.get_cached_features('c2') is None:
+            print("❌ Model Cache Tags - invalidou entradas de outro cliente")
+            return False
+
+        cache.invalidate_model_cache('v1')
+        if cache.get_cached_prediction('ensemble', 'h2') is not None or cache.get_cached_features('c2') is None:
+            print("❌ Model Cache Tags - invalidação por modelo incorreta")
+            return False
+
+        cache.clear_all_cache()
+        print("✅ Model Cache Tags - OK")
+        return True
+
+    except Exception as e:
+        print(f"❌ Model Cache Tags - ERRO: {e}")
+        return False
+
+def test_model_cache_pubsub():
+    """Testa a propagação das invalidações para o nível em memória de outros workers"""
+    try:
+        from ml.model_cache import ModelCache, INVALIDATION_CHANNEL
+
+        class FakePipeline:
+            def __init__(self):
+                self.results = []
+            def __enter__(self):
+                return self
+            def __exit__(self, *args):
+                return False
+            def smembers(self, key):
+                self.results.append(set())
+            def delete(self, *keys):
+                self.results.append(0)
+            def execute(self):
+                results, self.results = self.results, []
+                return results
+
+        class FakeRedis:
+            def __init__(self):
+                self.published = []
+            def pipeline(self):
+                return FakePipeline()
+            def publish(self, channel, message):
+                self.published.append((channel, message))
+            def scan_iter(self, **kwargs):
+                return iter(())
+            def delete(self, *keys):
+                return 0
+
+        worker_a, worker_b = ModelCache(), ModelCache()
+        worker_a.redis_client = FakeRedis()
+        worker_b.cache_features('c1', {'f': 1.0})
+        worker_b.cache_features('c2', {'f': 2.0})
+        key_c1 = worker_b._get_cache_key("features", 'c1')
+        key_c2 = worker_b._get_cache_key("features", 'c2')
+
+        worker_a.invalidate_client_cache('c1')
+        channel, message = worker_a.redis_client.published[-1]
+        if channel != INVALIDATION_CHANNEL or worker_a._apply_invalidation(message) != 0:
+            print("❌ Invalidação entre Workers - mensagem não publicada ou reaplicada na origem")
+            return False
+
+        worker_b._apply_invalidation(message)
+        if worker_b._memory_cache.get(key_c1) is not None or worker_b._memory_cache.get(key_c2) is None:
+            print("❌ Invalidação entre Workers - nível em memória do outro worker não invalidado")
+            return False
+
+        worker_a.clear_all_cache()
+        worker_b._apply_invalidation(worker_a.redis_client.published[-1][1])
+        if len(worker_b._memory_cache) != 0:
+            print("❌ Invalidação entre Workers - limpeza total não propagada")
+            return False
+
+        print("✅ Invalidação entre Workers - OK")
+        return True
+
+    except Exception as e:
+        print(f"❌ Invalidação entre Workers - ERRO: {e}")
+        return False
+
+def test_model_cache_versions():
+    """Testa previsões cacheadas por versão de modelo e o despejo da versão anterior"""
+    try:
+        import time
+        from ml.model_cache import ModelCache
+
+        cache = ModelCache()
+        cache.cache_model_prediction('ensemble', 'h1', {'risk_score': 0.1}, cliente_id='c1', model_version='v1')
+        if cache.get_cached_prediction('ensemble', 'h1', model_version='v1') is None:
+            print("❌ Model Cache Versão - previsão não encontrada")
+            return False
+
+        # Nova versão: não serve a previsão antiga e despeja a geração v1 em background
+        if cache.get_cached_prediction('ensemble', 'h1', model_version='v2') is not None:
+            print("❌ Model Cache Versão - previsão de outra versão servida")
+            return False
+
+        deadline = time.time() + 2
+        while cache._memory_cache.get_stats()['tags'] and time.time() < deadline:
+            time.sleep(0.01)
+
+        if len(cache._memory_cache):
+            print("❌ Model Cache Versão - geração antiga não despejada")
+            return False
+
+        print("✅ Model Cache Versão - OK")
+        return True
+
+    except Exception as e:
+        print(f"❌ Model Cache Versão - ERRO: {e}")
+        return False
+
+def test_model_cache_single_flight():
+    """Testa single-flight e stale-while-revalidate do get_or_compute"""
+    try:
+        import time
+        import threading
+        from ml.model_cache import ModelCache
+
+        cache = ModelCache()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return {'risk_score': 0.5}
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(cache.get_or_compute("ml_cache:sf", compute)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if len(calls) != 1 or results != [{'risk_score': 0.5}] * 8:
+            print(f"❌ Single-flight - {len(calls)} cálculos para 8 chamadas")
+            return False
+
+        # Entrada vencida dentro da janela stale: serve o valor antigo e recalcula em background
+        cache._memory_cache.set("ml_cache:swr", 'antigo', 1, 60, fresh_until=time.time() - 1)
+        if cache.get_or_compute("ml_cache:swr", lambda: 'novo') != 'antigo':
+            print("❌ Single-flight - valor stale não servido")
+            return False
+
+        deadline = time.time() + 2
+        while cache._get("ml_cache:swr") != 'novo' and time.time() < deadline:
+            time.sleep(0.01)
+
+        if cache._get("ml_cache:swr") != 'novo':
+            print("❌ Single-flight - entrada stale não recalculada")
+            return False
+
+        print("✅ Single-flight - OK")
+        return True
+
+    except Exception as e:
+        print(f"❌ Single-flight - ERRO: {e}")
+        return False
+
+def test_cache_invalidation_hooks():
+    """Testa a invalidação do cache de churn disparada pelos commits"""
+    try:
+        import models
+        from ml.cache_invalidation import ChurnCacheInvalidator
+
+        class RecordingCache:
+            def __init__(self):
+                self.calls = []
+
+            def invalidate_clients_cache(self, cliente_ids):
+                self.calls.append(sorted(cliente_ids))
+                return True
+
+        engine, session = _sqlite_session(n_clients=6)
+        cache = RecordingCache()
+        queued = []
+        invalidator = ChurnCacheInvalidator(cache=cache, on_invalidate=queued.append)
+        invalidator.register(session)
+
+        # Alterações em duas tabelas de entrada, um único lote após o commit
+        contrato = session.query(models.Contrato).first()
+        contrato.valor_mensal = 1.0
+        session.add(models.EventoCS(cliente_id=6, tipo='call', titulo='Call', data_evento=datetime.now()))
+        session.flush()
+        session.add(models.CSATResposta(id_cliente=5, id_consultor=1, data_resposta=datetime.now(), avaliacao_call=1))
+        session.commit()
+
+        expected = sorted({contrato.cliente_id, 5, 6})
+        if cache.calls != [expected] or len(queued) != 1:
+            print(f"❌ Invalidação por Commit - lotes inesperados: {cache.calls}")
+            return False
+
+        # Rollback descarta os clientes coletados
+        session.get(models.Cliente, 2).ltv_meses = 99
+        session.flush()
+        session.rollback()
+        session.commit()
+        if len(cache.calls) != 1:
+            print("❌ Invalidação por Commit - invalidou transação desfeita")
+            return False
+
+        invalidator.unregister(session)
+        print("✅ Invalidação por Commit - OK")
+        return True
+
+    except Exception as e:
+        print(f"❌ Invalidação por Commit - ERRO: {e}")
+        return False
+
+def test_cache_codec():
+    """Testa o codec binário (vetor float32 e msgpack) e o hash das features"""
+    try:
+        import pickle
+        from ml.model_cache import ModelCache
+        from ml.cache_codec import decode_entry, encode_entry
+
+        cache = ModelCache()
+        names = ['health_score_atual', 'csat_medio', 'dias_vencimento_proximo']
+        features = {'health_score_atual': 3.5, 'csat_medio': 4.25, 'dias_vencimento_proximo': 30.0}
+
+        cache.cache_features('codec', features, names)
+        # Sem Redis o nível em memória guarda o vetor; simula a leitura do Redis
+        key = cache._get_cache_key("features", 'codec')
+        stored = cache._memory_cache.get(key)
+        raw = cache._serialize_data(stored, ['client:codec'])
+        cache._memory_cache.set(key, cache._deserialize_data(raw), len(raw))
+        if len(raw) > 64:
+            print(f"❌ Cache Codec - vetor de features com {len(raw)} bytes")
+            return False
+
+        raw = cache._serialize_data({'risk_score': np.float64(0.75), 'predictions': {'rf': np.float32(0.5)}}, ['client:c1'])
+        entry = cache._deserialize_entry(raw)
+        if entry['data'] != {'risk_score': 0.75, 'predictions': {'rf': 0.5}} or entry['tags'] != ['client:c1']:
+            print(f"❌ Cache Codec - previsão divergente: {entry}")
+            return False
+
+        if cache.get_cached_features('codec', names) != features:
+            print("❌ Cache Codec - vetor de features divergente")
+            return False
+        if cache.get_cached_features('codec', list(reversed(names))) is not None:
+            print("❌ Cache Codec - vetor servido com outro schema")
+            return False
+
+        legacy = pickle.dumps({'data': {'a': 1}, 'timestamp': 'x', 'type': 'dict'})
+        if decode_entry(legacy) != {'data': {'a': 1}, 'tags': [], 'fresh_until': None}:
+            print("❌ Cache Codec - entrada antiga ilegível")
+            return False
+
+        h1 = cache.create_features_hash(features, names)
+        if h1 != cache.create_features_hash(dict(features), names) or \
+                h1 == cache.create_features_hash({**features, 'csat_medio': 4.0}, names):
+            print("❌ Cache Codec - hash de features inconsistente")
+            return False
+
+        print("✅ Cache Codec - OK")
+        return True
+
+    except Exception as e:
+        print(f"❌ Cache Codec - ERRO: {e}")
+        return False
+
+def test_numpy_network_parity():
+    """Testa a inferência NumPy da rede neural contra o Keras"""
+    try:
+        import tempfile
+        from pathlib import Path
+        from ml.churn_predictor import ChurnPredictor
+        from ml.numpy_network import NumpyDenseNetwork
+
+        predictor = ChurnPredictor()
+        predictor._initialize_models()
+        keras_model = predictor.models['neural_network']
+        X = np.random.RandomState(0).randn(64, len(predictor.feature_names)).astype(np.float32)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            NumpyDenseNetwork.from_keras(keras_model).save(Path(tmp) / "neural_network.npz")
+            network = NumpyDenseNetwork.load(Path(tmp) / "neural_network.npz")
+
+        diff = np.abs(keras_model.predict(X, verbose=0) - network.predict(X)).max()
+        if diff > 1e-5:
+            print(f"❌ NumPy NN - divergência de {diff:.2e} em relação ao Keras")
+            return False
+
+        # Mesma versão de modelos com qualquer backend de inferência
+        version = predictor._compute_model_version()
+        predictor.models['neural_network'] = network
+        if predictor._compute_model_version() != version:
+            print("❌ NumPy NN - versão dos modelos muda com o backend")
+            return False
+
+        print(f"✅ NumPy NN - OK (diferença máxima {diff:.1e})")
+        return True
+
+    except Exception as e:
+        print(f"❌ NumPy NN - ERRO: {e}")
+        return False
+
+def test_model_registry():
+    """Testa o registro versionado de modelos e a troca atômica do bundle"""
+    try:
+        import tempfile
+        import threading
+        from pathlib import Path
+        from ml.churn_predictor import ChurnPredictor
+        from ml.model_registry import ModelRegistry
+        from sklearn.ensemble import RandomForestClassifier
+
+        clientes = _synthetic_clients(n_clients=30, seed=11)
+
+        def train(seed):
+            trainer = ChurnPredictor()
+            X, y = trainer.prepare_training_data(clientes)
+            y[:2] = [0, 1]
+            trainer.models = {
+                'random_forest': RandomForestClassifier(n_estimators=10, random_state=seed).fit(X, y)
+            }
+            trainer.model_version = trainer._compute_model_version()
+            return trainer
+
+        with tempfile.TemporaryDirectory() as tmp:
+            registry = ModelRegistry(tmp)
+            first, second = train(1), train(2)
+
+            first.save_models(tmp)
+            if registry.current_version() != first.model_version:
+                print("❌ Registro de Modelos - versão não promovida")
+                return False
+
+            serving = ChurnPredictor(tmp)
+            if serving.model_version != first.model_version:
+                print("❌ Registro de Modelos - versão carregada diferente da promovida")
+                return False
+
+            expected = {
+                bundle.model_version: [r['risk_score'] for r in trainer.predict_churn_batch(clientes, include_features=False)]
+                for trainer, bundle in ((first, first.bundle), (second, second.bundle))
+            }
+
+            # Previsões concorrentes com trocas de versão: cada lote usa uma só versão
+            mixed = []
+            stop = threading.Event()
+
+            def score():
+                while not stop.is_set():
+                    scores = [r['risk_score'] for r in serving.predict_churn_batch(clientes, include_features=False)]
+                    if scores not in expected.values():
+                        mixed.append(scores)
+
+            workers = [threading.Thread(target=score) for _ in range(3)]
+            for worker in workers:
+                worker.start()
+            for i in range(40):
+                serving.swap_bundle((second if i % 2 == 0 else first).bundle)
+            stop.set()
+            for worker in workers:
+                worker.join()
+
+            if mixed:
+                print("❌ Registro de Modelos - lote previsto com versões misturadas")
+                return False
+
+            # Nova versão publicada por outro processo é carregada sob demanda
+            serving.swap_bundle(first.bundle)
+            second.save_models(tmp)
+            if not serving.reload_if_updated(tmp) or serving.model_version != second.model_version:
+                print("❌ Registro de Modelos - nova versão não carregada")
+                return False
+            if serving.reload_if_updated(tmp):
+                print("❌ Registro de Modelos - recarga sem nova versão")
+                return False
+
+            # Rollback para a versão anterior e recusa de artefatos corrompidos
+            if {m['version'] for m in registry.list_versions()} != {first.model_version, second.model_version}:
+                print("❌ Registro de Modelos - versões publicadas incompletas")
+                return False
+            registry.promote(first.model_version)
+
+            scaler_path = Path(registry.version_path(second.model_version)) / "scaler.pkl"
+            scaler_path.write_bytes(scaler_path.read_bytes() + b"x")
+            try:
+                registry.promote(second.model_version)
+                print("❌ Registro de Modelos - versão corrompida promovida")
+                return False
+            except ValueError:
+                pass
+            if registry.current_version() != first.model_version:
+                print("❌ Registro de Modelos - ponteiro alterado por promoção inválida")
+                return False
+
+        print("✅ Registro de Modelos - OK")
+        return True
+
+    except Exception as e:
+        print(f"❌ Registro de Modelos - ERRO: {e}")
+        return False
+
+def test_numpy_trees_parity():
+    """Testa a inferência das florestas em arrays NumPy (mmap) contra os modelos originais"""
+    try:
+        import tempfile
+        import xgboost as xgb
+        import lightgbm as lgb
+        from sklearn.ensemble import RandomForestClassifier
+        from ml.numpy_trees import NumpyTreeEnsemble
+        from ml.explainability import ChurnExplainer
+
+        rs = np.random.RandomState(3)
+        X = rs.randn(400, 12).astype(np.float32)
+        y = (X[:, 0] + X[:, 1] * X[:, 2] + rs.randn(400) * 0.3 > 0).astype(int)
+        X_test = rs.randn(200, 12).astype(np.float32)
+        X_test[:5, 0] = np.nan  # ausentes seguem o filho padrão
+
+        models = {
+            'random_forest': RandomForestClassifier(n_estimators=20, max_depth=6, random_state=42).fit(X, y),
+            'xgboost': xgb.XGBClassifier(n_estimators=20, max_depth=4, random_state=42).fit(X, y),
+            'lightgbm': lgb.LGBMClassifier(n_estimators=20, max_depth=4, random_state=42, verbose=-1).fit(X, y)
+        }
+
+        with tempfile.TemporaryDirectory() as tmp:
+            for name, model in models.items():
+                NumpyTreeEnsemble.from_model(model).save(f"{tmp}/{name}.trees")
+                forest = NumpyTreeEnsemble.load(f"{tmp}/{name}.trees")
+
+                if not isinstance(forest.arrays['threshold'], np.memmap):
+                    print(f"❌ NumPy Trees - {name} carregado sem mmap")
+                    return False
+
+                # Random Forest do scikit-learn 1.3 não aceita NaN na previsão
+                X_eval = X_test[5:] if name == 'random_forest' else X_test
+                diff = np.abs(model.predict_proba(X_eval)[:, 1] - forest.predict_proba(X_eval)[:, 1]).max()
+                if diff > 1e-6:
+                    print(f"❌ NumPy Trees - {name} diverge em {diff:.2e}")
+                    return False
+
+            # SHAP do Random Forest igual ao do modelo scikit-learn
+            forest = NumpyTreeEnsemble.load(f"{tmp}/random_forest.trees")
+            expected = ChurnExplainer(models['random_forest'], [], 'tree').explainer.shap_values(X_test[5:25])
+            expected = expected[1] if isinstance(expected, list) else expected[:, :, 1]
+            actual = ChurnExplainer(forest, [], 'tree').explainer.shap_values(X_test[5:25])
+            if np.abs(np.asarray(actual) - expected).max() > 1e-9:
+                print("❌ NumPy Trees - valores SHAP divergentes")
+                return False
+
+        print("✅ NumPy Trees - OK")
+        return True
+
+    except Exception as e:
+        print(f"❌ NumPy Trees - ERRO: {e}")
+        return False
+
+def test_lazy_ml_imports():
+    """Testa que a API sobe sem importar as dependências pesadas de ML"""
+    try:
+        import subprocess
+
+        code = (
+            "import sys, main\n"
+            "heavy = ['tensorflow', 'shap', 'xgboost', 'lightgbm', 'optuna', 'imblearn',\n"
+            "         'firebase_admin', 'ml.churn_predictor']\n"
+            "print(','.join(m for m in heavy if m in sys.modules))"
+        )
+        proc = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            env=dict(os.environ, LOG_FILE=""), capture_output=True, text=True
+        )
+        if proc.returncode != 0:
+            print(f"❌ Imports Sob Demanda - import de main falhou: {proc.stderr.strip().splitlines()[-1]}")
+            return False
+
+        loaded = proc.stdout.strip().splitlines()[-1] if proc.stdout.strip() else ""
+        if loaded:
+            print(f"❌ Imports Sob Demanda - carregados no startup: {loaded}")
+            return False
+
+        print("✅ Imports Sob Demanda - OK")
+        return True
+
+    except Exception as e:
+        print(f"❌ Imports Sob Demanda - ERRO: {e}")
+        return False
+
+def test_parallel_training():
+    """Testa o treino concorrente dos modelos base contra o treino sequencial"""
+    try:
+        import lightgbm as lgb
+        from sklearn.base import clone
+        from sklearn.ensemble import RandomForestClassifier
+        from ml.parallel_training import fit_models_parallel, thread_budgets
+
+        budgets = thread_budgets(['a', 'b', 'c', 'd'], 10)
+        if budgets != {'a': 3, 'b': 3, 'c': 2, 'd': 2} or set(thread_budgets(['a', 'b'], 1).values()) != {1}:
+            print(f"❌ Treino Paralelo - divisão de núcleos inesperada: {budgets}")
+            return False
+
+        rs = np.random.RandomState(5)
+        X = rs.randn(300, 8)
+        y = (X[:, 0] - X[:, 3] + rs.randn(300) * 0.5 > 0).astype(int)
+        models = {
+            'random_forest': RandomForestClassifier(n_estimators=20, random_state=42),
+            'lightgbm': lgb.LGBMClassifier(n_estimators=20, random_state=42, verbose=-1)
+        }
+
+        fitted, infos = fit_models_parallel({name: clone(m) for name, m in models.items()}, X, y, n_jobs=2)
+        if infos['random_forest']['iterations'] != 20:
+            print(f"❌ Treino Paralelo - iterações não reportadas: {infos}")
+            return False
+        for name, model in models.items():
+            expected = model.fit(X, y).predict_proba(X)[:, 1]
+            if not np.allclose(fitted[name].predict_proba(X)[:, 1], expected):
+                print(f"❌ Treino Paralelo - {name} diverge do treino sequencial")
+                return False
+            if fitted[name].get_params()['n_jobs'] != model.get_params()['n_jobs']:
+                print(f"❌ Treino Paralelo - n_jobs de {name} não restaurado")
+                return False
+
+        print("✅ Treino Paralelo - OK")
+        return True
+
+    except Exception as e:
+        print(f"❌ Treino Paralelo - ERRO: {e}")
+        return False
+
+def test_early_stopping():
+    """Testa early stopping dos boosters e o prazo do treino"""
+    try:
+        import time
+        import xgboost as xgb
+        import lightgbm as lgb
+        from sklearn.ensemble import RandomForestClassifier
+        from ml.model_fitting import fit_model
+
+        rs = np.random.RandomState(4)
+        X = rs.randn(600, 6)
+        y = (X[:, 0] + rs.randn(600) > 0).astype(int)
+        eval_set = (X[400:], y[400:])
+
+        boosters = {
+            'xgboost': xgb.XGBClassifier(n_estimators=400, learning_rate=0.3, random_state=42),
+            'lightgbm': lgb.LGBMClassifier(n_estimators=400, learning_rate=0.3, random_state=42, verbose=-1)
+        }
+        for name, model in boosters.items():
+            info = fit_model(name, model, X[:400], y[:400], eval_set=eval_set)
+            if info['stopped'] != 'early_stopping' or not info['iterations'] < 400:
+                print(f"❌ Early Stopping - {name} não parou antes do teto: {info}")
+                return False
+        if boosters['xgboost'].get_params()['callbacks'] is not None:
+            print("❌ Early Stopping - callbacks mantidos no modelo salvo")
+            return False
+
+        # Prazo vencido: o Random Forest para no primeiro bloco de árvores
+        forest = RandomForestClassifier(n_estimators=50, random_state=42)
+        info = fit_model('random_forest', forest, X, y, deadline=time.time() - 1)
+        if info['stopped'] != 'time_budget' or len(forest.estimators_) != info['iterations'] or info['iterations'] >= 50:
+            print(f"❌ Early Stopping - prazo ignorado pelo Random Forest: {info}")
+            return False
+        if forest.get_params()['n_estimators'] != 50 or forest.get_params()['warm_start']:
+            print(f"❌ Early Stopping - configuração do Random Forest alterada: {forest.get_params()}")
+            return False
+
+        # Novo treino do mesmo modelo já treinado (caminho sequencial) usa o teto completo
+        info = fit_model('random_forest', forest, X, y)
+        if info['iterations'] != 50 or len(forest.estimators_) != 50:
+            print(f"❌ Early Stopping - retreino do Random Forest incompleto: {info}")
+            return False
+
+        print("✅ Early Stopping - OK")
+        return True
+
+    except Exception as e:
+        print(f"❌ Early Stopping - ERRO: {e}")
+        return False
+
+def test_prefit_ensemble():
+    """Testa o ensemble ponderado sobre modelos já treinados (sem retreino)"""
+    try:
+        import tempfile
+        from sklearn.ensemble import RandomForestClassifier
+        from ml.churn_predictor import ChurnPredictor
+        from ml.ensemble import PrefitSoftVotingEnsemble
+
+        rs = np.random.RandomState(9)
+        y = rs.randint(0, 2, 400)
+        good = np.clip(y * 0.6 + rs.rand(400) * 0.4, 0, 1)
+        noise = rs.rand(400)
+
+        for method in ('auc', 'stacking'):
+            ensemble = PrefitSoftVotingEnsemble.fit({'good': good, 'noise': noise}, y, method)
+            if ensemble.weights['good'] <= ensemble.weights['noise'] or abs(sum(ensemble.weights.values()) - 1) > 1e-9:
+                print(f"❌ Ensemble Pré-treinado - pesos {method} inesperados: {ensemble.weights}")
+                return False
+
+        # Modelo ausente: pesos renormalizados entre os demais
+        if not np.allclose(ensemble.combine({'good': good}), good):
+            print("❌ Ensemble Pré-treinado - renormalização sem um modelo")
+            return False
+
+        # Os modelos base não são tocados pelo ensemble
+        clientes = _synthetic_clients(n_clients=30, seed=13)
+        predictor = ChurnPredictor()
+        X, y = predictor.prepare_training_data(clientes)
+        y[:2] = [0, 1]
+        forest = RandomForestClassifier(n_estimators=10, random_state=1).fit(X, y)
+        predictor.models = {'random_forest': forest}
+        estimators_before = list(forest.estimators_)
+        predictor._setup_ensemble({'random_forest': forest.predict_proba(X)[:, 1]}, y)
+        if forest.estimators_ != estimators_before:
+            print("❌ Ensemble Pré-treinado - modelo base retreinado")
+            return False
+        predictor.model_version = predictor._compute_model_version()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            predictor.save_models(tmp)
+            loaded = ChurnPredictor(tmp)
+            if loaded.models.get('ensemble').weights != predictor.models['ensemble'].weights:
+                print("❌ Ensemble Pré-treinado - pesos não preservados no registro")
+                return False
+
+        result = predictor.predict_churn_batch(clientes[:5], include_features=False)[0]
+        if abs(result['risk_score'] - result['predictions']['random_forest']) > 1e-9:
+            print("❌ Ensemble Pré-treinado - risk_score difere da combinação")
+            return False
+
+        print("✅ Ensemble Pré-treinado - OK")
+        return True
+
+    except Exception as e:
+        print(f"❌ Ensemble Pré-treinado - ERRO: {e}")
+        return False
+
+def test_temporal_ensemble_weights():
+    """Testa que a validação temporal aprende os pesos do ensemble com as previsões out-of-fold"""
+    class ConstantModel:
+        """Modelo sem get_params (como a rede Keras): fica fora da validação temporal"""
+        def fit(self, X, y, **kwargs):
+            return self
+
+        def predict_proba(self, X):
+            return np.full((len(X), 2), 0.5)
+
+    try:
+        import tempfile
+        import pandas as pd
+        import lightgbm as lgb
+        from sklearn.ensemble import RandomForestClassifier
+        import ml.churn_predictor as churn_predictor
+        from ml.churn_predictor import ChurnPredictor
+        from ml.resampling import Resampler
+
+        rs = np.random.RandomState(21)
+        n = 1500
+        X = rs.randn(n, 6)
+        y = (X[:, 0] + rs.randn(n) * 0.8 > 0.8).astype(int)
+        temporal_data = pd.DataFrame({
+            'data_referencia': pd.Timestamp('2023-01-01') + pd.to_timedelta(np.sort(rs.randint(0, 540, n)), unit='D')
+        })
+
+        predictor = ChurnPredictor()
+        predictor.models = {
+            'random_forest': RandomForestClassifier(n_estimators=10, max_depth=2, random_state=1),
+            'lightgbm': lgb.LGBMClassifier(n_estimators=30, random_state=1, verbose=-1),
+            'constant': ConstantModel(),
+            'ensemble': None
+        }
+        predictor.resampler = Resampler(cache_dir=None)
+
+        parallel, cwd = churn_predictor.ML_TRAINING_PARALLEL, os.getcwd()
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)  # previsões dos folds gravadas no diretório temporário
+            churn_predictor.ML_TRAINING_PARALLEL = False
+            try:
+                predictor._train_with_temporal_validation(X, y, temporal_data)
+            finally:
+                churn_predictor.ML_TRAINING_PARALLEL = parallel
+                os.chdir(cwd)
+
+        weights = predictor.models['ensemble'].weights
+        if set(weights) != {'random_forest', 'lightgbm'}:
+            print(f"❌ Pesos do Ensemble Temporal - modelos inesperados: {weights}")
+            return False
+        if np.isclose(weights['random_forest'], weights['lightgbm']):
+            print(f"❌ Pesos do Ensemble Temporal - pesos uniformes: {weights}")
+            return False
+
+        print(f"✅ Pesos do Ensemble Temporal - OK ({predictor.models['ensemble']})")
+        return True
+
+    except Exception as e:
+        print(f"❌ Pesos do Ensemble Temporal - ERRO: {e}")
+        return False
+
+def test_training_matrix_cache():
+    """Testa o cache da matriz de treino por snapshot dos dados"""
+    try:
+        import tempfile
+        import models
+        from ml.churn_predictor import ChurnPredictor
+        from ml.training_data import TrainingMatrixCache
+
+        engine, session = _sqlite_session(n_clients=25, seed=8)
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = TrainingMatrixCache(tmp, keep=2)
+
+            first = cache.get_or_build(session, ChurnPredictor())
+            trainer = ChurnPredictor()
+            second = cache.get_or_build(session, trainer)
+            if second.snapshot_id != first.snapshot_id or not isinstance(second.X, np.memmap):
+                print("❌ Cache da Matriz de Treino - matriz não reaproveitada em mmap")
+                return False
+            if not np.allclose(second.X, first.X) or not np.array_equal(second.y, first.y):
+                print("❌ Cache da Matriz de Treino - matriz em cache diferente da calculada")
+                return False
+            if not np.allclose(trainer.scaler.mean_, first.scaler.mean_) or len(second.data_referencia) != 25:
+                print("❌ Cache da Matriz de Treino - scaler ou datas de referência ausentes")
+                return False
+
+            # Alteração nos dados gera um novo snapshot
+            session.add(models.CSATResposta(
+                id_cliente=1, id_consultor=1, data_resposta=datetime.now(), avaliacao_call=1
+            ))
+            session.commit()
+            third = cache.get_or_build(session, ChurnPredictor())
+            if third.snapshot_id == first.snapshot_id:
+                print("❌ Cache da Matriz de Treino - snapshot não mudou com os dados")
+                return False
+
+        session.close()
+        engine.dispose()
+
+        print("✅ Cache da Matriz de Treino - OK")
+        return True
+
+    except Exception as e:
+        print(f"❌ Cache da Matriz de Treino - ERRO: {e}")
+        return False
+
+def test_resampling_cache():
+    """Testa as estratégias de balanceamento e o cache por fold"""
+    try:
+        import tempfile
+        from sklearn.ensemble import RandomForestClassifier
+        from sklearn.linear_model import LogisticRegression
+        from ml.resampling import Resampler, sample_weight_for
+
+        rs = np.random.RandomState(12)
+        X = rs.randn(300, 6)
+        y = (rs.rand(300) < 0.15).astype(int)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            smote = Resampler('smote', cache_dir=tmp)
+            first = smote.resample(X, y, fold='standard')
+            second = smote.resample(X, y, fold='standard')
+            if first.info['cached'] or not second.info['cached'] or \
+                    not np.array_equal(np.asarray(first.X), np.asarray(second.X)):
+                print(f"❌ Balanceamento - cache não reutilizado: {second.info}")
+                return False
+            if first.info['rows_out'] <= len(y) or abs(float(np.mean(first.y)) - 0.5) > 1e-9:
+                print(f"❌ Balanceamento - SMOTE não balanceou: {first.info}")
+                return False
+            if smote.resample(X[:-1], y[:-1], fold='outro').info['cached']:
+                print("❌ Balanceamento - fold diferente reutilizou a matriz em cache")
+                return False
+
+            under = Resampler('undersample', cache_dir=tmp).resample(X, y)
+            if under.info['rows_out'] != 2 * int(y.sum()):
+                print(f"❌ Balanceamento - undersample inesperado: {under.info}")
+                return False
+
+        weighted = Resampler('class_weight', cache_dir=None).resample(X, y)
+        if weighted.info['rows_out'] != len(y) or \
+                not np.isclose(weighted.sample_weight[y == 1].sum(), weighted.sample_weight[y == 0].sum()):
+            print("❌ Balanceamento - pesos por classe não balanceados")
+            return False
+        if sample_weight_for(RandomForestClassifier(class_weight='balanced'), weighted.sample_weight) is not None or \
+                sample_weight_for(LogisticRegression(), weighted.sample_weight) is None:
+            print("❌ Balanceamento - pesos aplicados a modelo com class_weight")
+            return False
+
+        print("✅ Balanceamento - OK")
+        return True
+
+    except Exception as e:
+        print(f"❌ Balanceamento - ERRO: {e}")
+        return False
+
+def test_training_jobs():
+    """Testa os jobs de treino em processo separado: vaga única, cancelamento e processo perdido"""
+    try:
+        import tempfile
+        import time
+        from ml.training_jobs import TrainingJobRunner, TrainingJobStore
+
+        with tempfile.TemporaryDirectory() as tmp:
+            url = f"sqlite:///{tmp}/train.db"
+            engine, session = _sqlite_session(n_clients=30, url=url)
+            session.close()
+            engine.dispose()
+
+            runner = TrainingJobRunner(f"{tmp}/models", jobs_dir=f"{tmp}/jobs", database_url=url)
+            job, created = runner.start()
+            again, created_again = runner.start()
+            if not created or created_again or again['job_id'] != job['job_id']:
+                print("❌ Jobs de Treino - segundo job iniciado em paralelo")
+                return False
+
+            runner.cancel(job['job_id'])
+            deadline = time.time() + 120
+            while runner.get(job['job_id'])['status'] in ('queued', 'running') and time.time() < deadline:
+                time.sleep(0.5)
+
+            final = runner.get(job['job_id'])
+            if final['status'] != 'cancelled':
+                print(f"❌ Jobs de Treino - status após cancelamento: {final['status']}")
+                return False
+            if final.get('pid') != job['pid']:
+                print("❌ Jobs de Treino - pid não registrado pelo processo de treino")
+                return False
+            if (runner.store.jobs_dir / "ACTIVE").exists():
+                print("❌ Jobs de Treino - vaga de job ativo não liberada")
+                return False
+
+            # Job marcado como em execução por um processo que não existe mais
+            store = TrainingJobStore(f"{tmp}/jobs")
+            lost = store.create()
+            store.acquire_active(lost['job_id'])
+            store.update(lost['job_id'], status='running', pid=2 ** 22 + 1)
+            if store.get(lost['job_id'])['status'] != 'failed' or store.active_file.exists():
+                print("❌ Jobs de Treino - job sem processo não marcado como falho")
+                return False
+
+        print("✅ Jobs de Treino - OK")
+        return True
+
+    except Exception as e:
+        print(f"❌ Jobs de Treino - ERRO: {e}")
+        return False
+
 def test_churn_predictor_basic():
     """Testa funcionalidades básicas do ChurnPredictor"""
     try:
@@ -115,6 +1393,9 @@ def test_churn_predictor_basic():
         
         # Inicializa predictor
         predictor = ChurnPredictor()
+        if predictor.models:
+            print("❌ ChurnPredictor Inicialização - modelos treináveis criados fora do treino")
+            return False
         
         print("✅ ChurnPredictor Inicialização - OK")
         
@@ -181,6 +1462,214 @@ def test_temporal_validation():
         print(f"❌ Temporal Validation - ERRO: {e}")
         return False
 
+def test_temporal_splits_indices():
+    """Testa que os índices dos splits apontam para as linhas originais, sem alterar o DataFrame"""
+    try:
+        import pandas as pd
+        from ml.temporal_validation import TemporalCrossValidator
+
+        validator = TemporalCrossValidator(train_months=3, validation_months=1, test_months=1, step_months=1)
+        rs = np.random.RandomState(3)
+        dates = pd.date_range(start='2023-01-01', end='2024-06-30', freq='12H')
+        shuffled = pd.DataFrame({'data_referencia': dates[rs.permutation(len(dates))].strftime('%Y-%m-%d %H:%M')})
+        original = shuffled.copy()
+
+        splits = validator.create_temporal_splits(shuffled, min_samples_per_fold=10)
+        if not splits or not shuffled.equals(original):
+            print("❌ Splits Temporais - DataFrame alterado ou nenhum split criado")
+            return False
+
+        parsed = pd.to_datetime(shuffled['data_referencia'])
+        for split in splits:
+            for part in ('train', 'val', 'test'):
+                idx = split[f'{part}_idx']
+                start, end = split[f'{part}_period']
+                in_period = ((parsed >= start) & (parsed < end)).to_numpy()
+                if not isinstance(idx, np.ndarray) or len(idx) != split[f'{part}_size'] or \
+                        set(idx.tolist()) != set(np.flatnonzero(in_period).tolist()):
+                    print(f"❌ Splits Temporais - fold {split['fold_id']} ({part}) com linhas erradas")
+                    return False
+
+        print(f"✅ Splits Temporais - OK ({len(splits)} folds)")
+        return True
+
+    except Exception as e:
+        print(f"❌ Splits Temporais - ERRO: {e}")
+        return False
+
+def test_parallel_temporal_validation():
+    """Testa a validação temporal paralela contra a sequencial"""
+    try:
+        import lightgbm as lgb
+        from sklearn.linear_model import LogisticRegression
+        from ml.temporal_validation import TemporalCrossValidator, TemporalModelSelector
+
+        rs = np.random.RandomState(7)
+        X = rs.randn(240, 6)
+        y = (X[:, 0] + X[:, 2] + rs.randn(240) * 0.5 > 0).astype(int)
+        splits = [
+            {'fold_id': i, 'train_idx': np.arange(0, 80 + 40 * i), 'val_idx': np.arange(80 + 40 * i, 120 + 40 * i),
+             'train_period': (None, None), 'val_period': (None, None)}
+            for i in range(3)
+        ]
+        models = {
+            'logistic': LogisticRegression(max_iter=200),
+            'lightgbm': lgb.LGBMClassifier(n_estimators=20, random_state=42, verbose=-1)
+        }
+
+        serial = TemporalCrossValidator(n_jobs=1).validate_models(models, X, y, splits)
+        parallel = TemporalModelSelector(TemporalCrossValidator(n_jobs=2)).compare_models(models, X, y, splits)
+
+        for name in models:
+            result = parallel['individual_results'][name]
+            if [fold['fold_id'] for fold in result['fold_results']] != [0, 1, 2]:
+                print(f"❌ Validação Temporal Paralela - folds fora de ordem em {name}")
+                return False
+            for metric, value in serial[name]['mean_metrics'].items():
+                if not np.isclose(result['mean_metrics'][metric], value):
+                    print(f"❌ Validação Temporal Paralela - {name}/{metric} diverge do sequencial")
+                    return False
+            if result['temporal_stability'].keys() != serial[name]['temporal_stability'].keys():
+                print(f"❌ Validação Temporal Paralela - estabilidade ausente em {name}")
+                return False
+
+        print("✅ Validação Temporal Paralela - OK")
+        return True
+
+    except Exception as e:
+        print(f"❌ Validação Temporal Paralela - ERRO: {e}")
+        return False
+
+def test_hyperparameter_search():
+    """Testa a busca de hiperparâmetros com pruning e retomada do estudo"""
+    try:
+        import tempfile
+        from sklearn.linear_model import LogisticRegression
+        from ml.hyperparameter_search import TemporalHyperparameterSearch
+
+        rs = np.random.RandomState(9)
+        X = rs.randn(240, 6)
+        y = (X[:, 1] - X[:, 4] + rs.randn(240) * 0.5 > 0).astype(int)
+        splits = [
+            {'fold_id': i, 'train_idx': np.arange(0, 80 + 40 * i), 'val_idx': np.arange(80 + 40 * i, 120 + 40 * i),
+             'train_period': (None, None), 'val_period': (None, None)}
+            for i in range(3)
+        ]
+        space = {'C': (1e-4, 10.0, 'log'), 'fit_intercept': [True, False]}
+        model = LogisticRegression(max_iter=200)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            storage = os.path.join(tmp, 'studies.db')
+            first = TemporalHyperparameterSearch(storage, pruner='median', n_jobs=1).run(
+                model, space, X, y, splits, n_trials=8
+            )
+            # Mesma busca: retoma o estudo, agora com dois processos
+            resumed = TemporalHyperparameterSearch(storage, pruner='median', n_jobs=2).run(
+                model, space, X, y, splits, n_trials=12
+            )
+
+        if first['n_combinations_tested'] != 8 or resumed['study_name'] != first['study_name']:
+            print(f"❌ Busca de Hiperparâmetros - estudo não retomado: {first['study_name']} / {resumed['study_name']}")
+            return False
+        if resumed['n_combinations_tested'] < 12 or resumed['best_score'] < first['best_score']:
+            print(f"❌ Busca de Hiperparâmetros - trials retomados inesperados: {resumed['n_combinations_tested']}")
+            return False
+        complete = [r for r in resumed['all_results'] if not r['pruned']]
+        if any(r['folds_evaluated'] != len(splits) for r in complete) or \
+                any(r['folds_evaluated'] >= len(splits) for r in resumed['all_results'] if r['pruned']):
+            print("❌ Busca de Hiperparâmetros - folds avaliados inconsistentes com o pruning")
+            return False
+
+        # Grade só de listas, sem sampler: cada combinação avaliada exatamente uma vez
+        grid = {'C': [0.01, 0.1, 1.0], 'fit_intercept': [True, False]}
+        with tempfile.TemporaryDirectory() as tmp:
+            exhaustive = TemporalHyperparameterSearch(os.path.join(tmp, 'grid.db'), pruner='none').run(
+                model, grid, X, y, splits
+            )
+        tested = sorted((r['params']['C'], r['params']['fit_intercept']) for r in exhaustive['all_results'])
+        if tested != sorted((c, f) for c in grid['C'] for f in grid['fit_intercept']):
+            print(f"❌ Busca de Hiperparâmetros - grade não exaustiva: {tested}")
+            return False
+
+        # Outros dados ou outros parâmetros fixos nunca retomam o mesmo estudo
+        name = TemporalHyperparameterSearch.study_name(model, space, X, y, splits, 'auc')
+        if name == TemporalHyperparameterSearch.study_name(model, space, X + 1, y, splits, 'auc') or \
+                name == TemporalHyperparameterSearch.study_name(
+                    LogisticRegression(max_iter=200, class_weight='balanced'), space, X, y, splits, 'auc'):
+            print("❌ Busca de Hiperparâmetros - estudo não distingue dados ou parâmetros fixos")
+            return False
+
+        print(f"✅ Busca de Hiperparâmetros - OK ({resumed['n_pruned']} trials podados)")
+        return True
+
+    except Exception as e:
+        print(f"❌ Busca de Hiperparâmetros - ERRO: {e}")
+        return False
+
+def test_fold_prediction_store():
+    """Testa a gravação das previsões dos folds em disco e a consulta sob demanda"""
+    try:
+        import tempfile
+        from sklearn.linear_model import LogisticRegression
+        from ml.prediction_store import FoldPredictionStore
+        from ml.temporal_validation import TemporalCrossValidator
+
+        rs = np.random.RandomState(11)
+        X = rs.randn(200, 5)
+        y = (X[:, 0] + rs.randn(200) * 0.5 > 0).astype(int)
+        splits = [
+            {'fold_id': i, 'train_idx': np.arange(0, 80 + 40 * i), 'val_idx': np.arange(80 + 40 * i, 120 + 40 * i),
+             'train_period': (None, None), 'val_period': (None, None)}
+            for i in range(2)
+        ]
+        models = {'logistic': LogisticRegression(max_iter=200)}
+        in_memory = TemporalCrossValidator().validate_models(models, X, y, splits)['logistic']
+
+        with tempfile.TemporaryDirectory() as tmp:
+            completed = []
+            for n_jobs in (1, 2):
+                store = FoldPredictionStore(tmp, keep=2)
+                validator = TemporalCrossValidator(n_jobs=n_jobs, prediction_store=store)
+                stored = validator.validate_models(models, X, y, splits)['logistic']
+                if 'predictions' in stored or store.folds('logistic') != [0, 1]:
+                    print(f"❌ Store de Previsões - previsões mantidas em memória (n_jobs={n_jobs})")
+                    return False
+
+                reopened = FoldPredictionStore(tmp, run_id=store.run_id)
+                for expected in in_memory['predictions']:
+                    fold = reopened.load('logistic', expected['fold_id'])
+                    if not np.allclose(fold['y_pred_proba'], expected['y_pred_proba']) or \
+                            not np.array_equal(fold['val_idx'], expected['val_idx']):
+                        print(f"❌ Store de Previsões - fold {expected['fold_id']} diverge")
+                        return False
+                if len(validator.fold_predictions(stored)) != len(splits):
+                    print("❌ Store de Previsões - fold_predictions incompleto")
+                    return False
+                store.complete()
+                completed.append(store.run_id)
+
+            # Execução em andamento (sem marca) não é removida por outra que conclui
+            running = FoldPredictionStore(tmp, keep=2)
+            running.put('logistic', 0, in_memory['predictions'][0])
+            finished = FoldPredictionStore(tmp, keep=2)
+            finished.complete()
+            if sorted(os.listdir(tmp)) != sorted([completed[1], running.run_id, finished.run_id]):
+                print("❌ Store de Previsões - limpeza das execuções incorreta")
+                return False
+
+            # Sem escrita além da carência, a execução é tida como abandonada
+            finished.prune(grace_seconds=-1)
+            if running.run_id in os.listdir(tmp):
+                print("❌ Store de Previsões - execução abandonada não removida")
+                return False
+
+        print("✅ Store de Previsões - OK")
+        return True
+
+    except Exception as e:
+        print(f"❌ Store de Previsões - ERRO: {e}")
+        return False
+
 def test_explainability():
     """Testa sistema de explicabilidade"""
     try:
@@ -220,9 +1709,36 @@ def run_all_tests():
     
     tests = [
         ("Feature Engineering", test_feature_engineering),
+        ("Batch Features", test_batch_feature_parity),
+        ("Batch Prediction", test_batch_prediction),
+        ("Bulk Loader", test_bulk_data_loader),
+        ("Risk Scoring", test_risk_scoring_job),
+        ("Scoring Único", test_risk_scoring_claim),
         ("Model Cache", test_model_cache), 
+        ("Model Cache Limites", test_model_cache_bounds),
+        ("Model Cache Tags", test_model_cache_tags),
+        ("Invalidação entre Workers", test_model_cache_pubsub),
+        ("Model Cache Versão", test_model_cache_versions),
+        ("Cache Codec", test_cache_codec),
+        ("Single-flight", test_model_cache_single_flight),
+        ("Invalidação por Commit", test_cache_invalidation_hooks),
+        ("NumPy NN", test_numpy_network_parity),
+        ("NumPy Trees", test_numpy_trees_parity),
+        ("Imports Sob Demanda", test_lazy_ml_imports),
+        ("Registro de Modelos", test_model_registry),
+        ("Treino Paralelo", test_parallel_training),
+        ("Early Stopping", test_early_stopping),
+        ("Ensemble Pré-treinado", test_prefit_ensemble),
+        ("Pesos do Ensemble Temporal", test_temporal_ensemble_weights),
+        ("Cache da Matriz de Treino", test_training_matrix_cache),
+        ("Balanceamento", test_resampling_cache),
+        ("Jobs de Treino", test_training_jobs),
         ("ChurnPredictor Básico", test_churn_predictor_basic),
         ("Temporal Validation", test_temporal_validation),
+        ("Splits Temporais", test_temporal_splits_indices),
+        ("Validação Temporal Paralela", test_parallel_temporal_validation),
+        ("Busca de Hiperparâmetros", test_hyperparameter_search),
+        ("Store de Previsões", test_fold_prediction_store),
         ("Explainability", test_explainability)
     ]
     
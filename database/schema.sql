@@ -252,6 +252,32 @@ CREATE TABLE csat_resposta (
     data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- =====================================================
+-- MACHINE LEARNING
+-- =====================================================
+
+-- Tabela de scores de risco de churn (recalculada pelo job noturno)
+CREATE TABLE churn_risk_score (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    cliente_id UUID UNIQUE NOT NULL REFERENCES cliente(id),
+    
+    -- Resultado do scoring
+    risk_score DOUBLE PRECISION NOT NULL CHECK (risk_score >= 0 AND risk_score <= 1),
+    risk_level VARCHAR(20) NOT NULL CHECK (risk_level IN ('baixo', 'medio', 'alto', 'critico')),
+    top_features JSONB,
+    recommendations JSONB,
+    
+    -- Features de contexto
+    health_score DOUBLE PRECISION,
+    dias_vencimento INTEGER,
+    csat_medio DOUBLE PRECISION,
+    
+    model_version VARCHAR(64) NOT NULL,
+    data_calculo TIMESTAMP NOT NULL,
+    data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    data_ultima_atualizacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
 -- =====================================================
 -- ÍNDICES PARA PERFORMANCE
 -- =====================================================
@@ -280,6 +306,11 @@ CREATE INDEX idx_health_score_data_avaliacao ON health_score_snapshot(data_avali
 CREATE INDEX idx_csat_cliente_id ON csat_resposta(id_cliente);
 CREATE INDEX idx_csat_data_resposta ON csat_resposta(data_resposta);
 
+-- Índices para scores de risco de churn
+CREATE INDEX idx_churn_risk_score_nivel_score ON churn_risk_score(risk_level, risk_score DESC);
+CREATE INDEX idx_churn_risk_score_score ON churn_risk_score(risk_score DESC);
+CREATE INDEX idx_churn_risk_score_model_version ON churn_risk_score(model_version);
+
 -- =====================================================
 -- FUNÇÕES E TRIGGERS
 -- =====================================================
@@ -378,4 +409,5 @@ COMMENT ON TABLE cliente IS 'Tabela central de clientes para todos os módulos';
 COMMENT ON TABLE venda IS 'Registro de vendas realizadas pelos vendedores';
 COMMENT ON TABLE contrato IS 'Contratos dos clientes com gestão de ciclos e renovação';
 COMMENT ON TABLE health_score_snapshot IS 'Snapshots de Health Score dos clientes';
-COMMENT ON TABLE csat_resposta IS 'Respostas de satisfação dos clientes (CSAT)'; 
\ No newline at end of file
+COMMENT ON TABLE csat_resposta IS 'Respostas de satisfação dos clientes (CSAT)';
+COMMENT ON TABLE churn_risk_score IS 'Scores de risco de churn pré-calculados pelo job noturno'; 
\ No newline at end of file